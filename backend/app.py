@@ -1,25 +1,80 @@
 # backend/app.py
 
 import os
-import shutil
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks, HTTPException, Query
-from fastapi.responses import FileResponse
+from typing import Optional
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request, BackgroundTasks
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-from src.pipeline import run_pipeline
+from src.jobs import enqueue_job, cancel_job, pipeline_cache_key, find_cached_job
+from src.datasets import (
+    register_upload,
+    convert_and_index,
+    get_dataset,
+    find_dataset_by_hash,
+    list_dataset_page,
+    training_path,
+    reconcile_datasets,
+)
+import hashlib
 import uuid
-from src.database import engine
+from src.database import engine, sync_schema
 from src.models import Base
 from fastapi import Depends
 from sqlalchemy.orm import Session
 from src.database import SessionLocal
 from src.models import Report
+from src.model_cache import model_cache
+from src.batching import MicroBatcher
+from starlette.concurrency import run_in_threadpool
+from src.scoring import (
+    CHUNK_SIZE,
+    detect_format,
+    iter_examples,
+    iter_frames,
+    start_predictions,
+    to_ndjson,
+    to_csv,
+    format_prediction,
+)
+import threading
 import pandas as pd
 import numpy as np
-import mlflow
+import pyarrow.parquet as pq
 
 app = FastAPI(title="AutoML Service")
 
-Base.metadata.create_all(bind=engine)
+sync_schema(Base, engine)
+
+predict_batcher = MicroBatcher(
+    max_wait=float(os.getenv("PREDICT_BATCH_WAIT_MS", 2)) / 1000,
+    max_rows=int(os.getenv("PREDICT_BATCH_MAX_ROWS", 256)),
+)
+
+
+@app.on_event("startup")
+def reconcile_data_dir():
+    # Файлы, загруженные до появления таблицы datasets, индексируются в фоне
+    def run():
+        db = SessionLocal()
+        try:
+            reconcile_datasets(db)
+        except Exception as e:
+            print(f"Failed to reconcile datasets: {e}")
+        finally:
+            db.close()
+
+    if os.getenv("RECONCILE_DATASETS", "1") == "1":
+        threading.Thread(target=run, daemon=True).start()
+
+
+@app.on_event("startup")
+def warm_up_model_cache():
+    # Подгружаем последние обученные модели в фоне, не задерживая старт API
+    limit = int(os.getenv("MODEL_CACHE_WARMUP", 3))
+    threading.Thread(
+        target=model_cache.warm_up, args=("models", limit), daemon=True
+    ).start()
 
 
 class PipelineParams(BaseModel):
@@ -27,6 +82,31 @@ class PipelineParams(BaseModel):
     task_type: str = 'classification'
     sep: str = ','
     dataset_name: str = 'dataset'
+    selection_strategy: str = 'successive_halving'
+    halving_eta: int = 2
+    halving_min_resources: int = 1000
+    screening_confidence: float = 0.95
+    screening_margin: float = 0.01
+    pruner: str = 'median'
+    n_trials: int = 50
+    tuning_workers: int = 1
+    tuning_timeout: Optional[float] = None
+    n_cores: Optional[int] = None
+    study_storage: str = 'journal'
+    streaming: bool = False
+    chunk_size: int = 100000
+    use_fold_cache: bool = True
+    native_categorical: bool = False
+    time_budget: Optional[float] = None
+    adaptive_search: bool = True
+    ensemble: bool = False
+    compile_trees: bool = False
+    downcast_dtypes: bool = True
+    lossy_float32: bool = False
+    sparse_onehot: bool = False
+    onehot_max_levels: int = 32
+    priority: int = 0
+    force_refresh: bool = False
 
 class InputData(BaseModel):
     features: list
@@ -34,9 +114,6 @@ class InputData(BaseModel):
     task_type: str = Query('classification', description="Тип задачи: classification или regression")
 
 
-tasks_status = {}
-
-
 def get_db():
     db = SessionLocal()
     try:
@@ -46,59 +123,97 @@ def get_db():
 
 
 @app.post("/upload_data")
-async def upload_data(file: UploadFile = File(...)):
+def upload_data(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    sep: str = Query(',', description="Разделитель CSV"),
+    db: Session = Depends(get_db),
+):
+    # Обычный def: FastAPI выполняет его в пуле потоков, и копирование,
+    # хэширование и запрос к БД не блокируют цикл событий
     file_id = str(uuid.uuid4())
+    # Пишем во временный файл и считаем хэш по ходу записи: имя файла
+    # становится известно только после того, как ясно, не дубликат ли это
+    partial_location = f"data/.upload-{file_id}.part"
+    digest = hashlib.sha256()
+    with open(partial_location, "wb+") as file_object:
+        for block in iter(lambda: file.file.read(1 << 20), b""):
+            digest.update(block)
+            file_object.write(block)
+    content_hash = digest.hexdigest()
+
+    existing = find_dataset_by_hash(db, content_hash)
+    if existing is not None and os.path.exists(existing.path):
+        os.remove(partial_location)
+        return {
+            "file_id": existing.file_id,
+            "filename": existing.filename,
+            "content_hash": content_hash,
+            "deduplicated": True,
+        }
+
     file_location = f"data/{file_id}_{file.filename}"
-    with open(file_location, "wb+") as file_object:
-        shutil.copyfileobj(file.file, file_object)
-    return {"file_id": file_id, "filename": file.filename}
+    os.replace(partial_location, file_location)
+    register_upload(db, file_id, file.filename, file_location, content_hash, sep)
+    # Конвертация в Parquet + метаданные — после ответа клиенту
+    background_tasks.add_task(convert_and_index, file_id)
+    return {"file_id": file_id, "filename": file.filename, "content_hash": content_hash, "deduplicated": False}
 
 
 @app.get("/list_datasets")
-def list_datasets():
-    datasets = []
-    data_dir = 'data'
-
-    if os.path.exists(data_dir):
-        for f in os.listdir(data_dir):
-            if '_' in f:
-                parts = f.split('_', 1)
-                if len(parts) == 2:
-                    file_id, filename = parts
-                    datasets.append({"file_id": file_id, "filename": filename})
-
-    return {"datasets": datasets}
+def list_datasets(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    total, rows = list_dataset_page(db, offset, limit)
+    datasets = [
+        {
+            "file_id": d.file_id,
+            "filename": d.filename,
+            "format": d.format,
+            "size": d.size,
+            "num_rows": d.num_rows,
+            "status": d.status,
+            "created_at": d.created_at.isoformat() if d.created_at else None,
+        }
+        for d in rows
+    ]
+    return {"datasets": datasets, "total": total, "offset": offset, "limit": limit}
 
 
 @app.get("/get_dataset_info")
-def get_dataset_info(file_id: str):
-
-    data_dir = 'data'
-    if not os.path.exists(data_dir):
-        raise HTTPException(status_code=404, detail="Data directory not found")
-    matched_files = []
-    for f in os.listdir(data_dir):
-        if f.startswith(file_id + "_"):
-            matched_files.append(f)
-
-    if not matched_files:
+def get_dataset_info(file_id: str, db: Session = Depends(get_db)):
+    dataset = get_dataset(db, file_id)
+    if dataset is None:
         raise HTTPException(
             status_code=404, detail="File not found for given file_id")
 
-    print(matched_files)
-    filename = matched_files[0]
+    if dataset.schema is not None:
+        return {
+            "columns": [c["name"] for c in dataset.schema],
+            "num_rows": dataset.num_rows,
+            "schema": dataset.schema,
+            "content_hash": dataset.content_hash,
+            "columnar": True,
+        }
 
-    full_path = os.path.join(data_dir, filename)
-    print(filename)
+    # Конвертация ещё не закончилась — читаем только заголовок исходного файла
     try:
-        df = pd.read_parquet(full_path) if 'parquet' in full_path else pd.read_csv(full_path, snrows=0) 
-        # df = pd.read_csv(full_path, nrows=0)
-        columns = list(df.columns)
+        if dataset.format == 'parquet':
+            columns = pq.read_schema(dataset.path).names
+        else:
+            columns = list(pd.read_csv(dataset.path, sep=dataset.sep, nrows=0).columns)
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to read file: {str(e)}")
 
-    return {"columns": columns}
+    return {"columns": columns, "columnar": False}
+
+
+@app.post("/reconcile_datasets")
+def reconcile_datasets_endpoint(db: Session = Depends(get_db)):
+    return reconcile_datasets(db)
 
 
 @app.get("/list_pipelines")
@@ -112,6 +227,7 @@ def list_pipelines(db: Session = Depends(get_db)):
             "status": r.status,
             "dataset_name": r.dataset_name,
             "model_name": r.model_name,
+            "priority": r.priority,
             "created_at": r.created_at.isoformat() if r.created_at else None
         })
     return {"pipelines": pipelines}
@@ -120,82 +236,109 @@ def list_pipelines(db: Session = Depends(get_db)):
 async def run_pipeline_endpoint(
     file_id: str,
     params: PipelineParams,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
-    data_files = os.listdir('data/')
-    matched_files = [f for f in data_files if f.startswith(f"{file_id}_")]
-    if not matched_files:
+    dataset = get_dataset(db, file_id)
+    if dataset is None:
         return {"error": "File not found"}
 
-    data_path = f"data/{matched_files[0]}"
+    data_path = training_path(dataset, params.sep)
 
-    task_id = str(uuid.uuid4())
-    report_id = str(uuid.uuid4())
-    tasks_status[task_id] = "Running"
+    # Пайплайн выполняет отдельный пул воркеров (worker.py), API только
+    # ставит задачу в очередь.
+    pipeline_params = jsonable_encoder(params)
+    priority = pipeline_params.pop('priority')
+    force_refresh = pipeline_params.pop('force_refresh')
 
-    new_report = Report(
-        report_id=report_id,
-        task_id=task_id,
-        status='Running'
-    )
-    db.add(new_report)
-    db.commit()
-
-    background_tasks.add_task(
-        run_pipeline_task,
-        data_path,
-        params,
-        task_id,
-        report_id,
-        db
-    )
+    # Повторный запуск с теми же данными и параметрами отдаёт готовый отчёт
+    cache_key = pipeline_cache_key(dataset.content_hash, pipeline_params)
+    if not force_refresh:
+        cached = find_cached_job(db, cache_key)
+        if cached is not None:
+            return {
+                "task_id": cached.task_id,
+                "status": cached.status,
+                "report_id": cached.report_id,
+                "cached": True,
+            }
 
-    return {"task_id": task_id, "status": "Pipeline started", "report_id": report_id}
+    job = enqueue_job(db, data_path, pipeline_params, priority=priority, cache_key=cache_key)
 
+    return {"task_id": job.task_id, "status": "Pipeline queued", "report_id": job.report_id, "cached": False}
 
-def run_pipeline_task(data_path, params, task_id, report_id, db: Session):
-    try:
-        report = db.query(Report).filter(Report.task_id == task_id).first()
-        report.status = 'Running'
-        db.commit()
-
-        run_pipeline(
-            data_path=data_path,
-            column_names=None,
-            target_column=params.target_column,
-            task_type=params.task_type,
-            sep=params.sep,
-            dataset_name=params.dataset_name,
-            report_id=report_id,
-            db=db  # Передаём сессию БД
-        )
-
-        # Обновляем статус задачи в БД
-        report.status = 'Completed'
-        db.commit()
-    except Exception as e:
-        # Обновляем статус задачи в БД
-        report.status = f"Error: {str(e)}"
-        db.commit()
+
+@app.post("/cancel_pipeline/{task_id}")
+def cancel_pipeline(task_id: str, db: Session = Depends(get_db)):
+    job = cancel_job(db, task_id)
+    if job is None:
+        return {"error": "Task not found"}
+    return {"task_id": task_id, "status": job.status, "cancel_requested": job.cancel_requested}
 
 @app.post("/predict")
-def predict(data: InputData):
+async def predict(data: InputData):
     model_path = f'models/{data.model_name}'
     if not os.path.exists(model_path):
         return {"error": "Model not found."}
 
-    model = mlflow.sklearn.load_model(model_path)
+    model = model_cache.get_cached(model_path)
+    if model is None:
+        model = await run_in_threadpool(model_cache.get, model_path)
+
+    # dtype=object: сырые строки категорий кодирует сохранённый encoder
+    input_array = np.array(data.features, dtype=object).reshape(1, -1)
+    prediction = await predict_batcher.submit(model_path, model, input_array)
 
-    input_array = np.array(data.features).reshape(1, -1)
-    prediction = model.predict(input_array)
+    return {"prediction": format_prediction(prediction, data.task_type).tolist()}
 
-    if data.task_type == 'classification':
-        prediction = prediction.astype(int).tolist()
+@app.post("/apply_model")
+async def apply_model(
+    request: Request,
+    output: str = 'ndjson',
+    chunk_size: int = CHUNK_SIZE,
+    sep: str = ',',
+    db: Session = Depends(get_db)
+):
+    # Принимает multipart (file + report_id) или JSON {"report_id", "data"}
+    if request.headers.get('content-type', '').startswith('multipart/form-data'):
+        form = await request.form()
+        report_id = form.get('report_id')
+        upload = form.get('file')
+        if upload is None:
+            raise HTTPException(status_code=400, detail="File is required")
+        frames = iter_frames(upload.file, detect_format(upload.filename), chunk_size, sep)
     else:
-        prediction = prediction.tolist()
+        body = await request.json()
+        report_id = body.get('report_id')
+        frames = iter_examples(body.get('data', []), chunk_size)
 
-    return {"prediction": prediction}
+    report = await run_in_threadpool(
+        lambda: db.query(Report).filter(Report.report_id == report_id).first()
+    )
+    if report is None or report.model_name is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    model_path = f"models/{report.dataset_name}_{report.model_name}"
+    if not os.path.exists(model_path):
+        raise HTTPException(status_code=404, detail="Model not found")
+    task_type = (report.params or {}).get('task_type', 'classification')
+
+    model = model_cache.get_cached(model_path)
+    if model is None:
+        model = await run_in_threadpool(model_cache.get, model_path)
+    try:
+        predictions = await run_in_threadpool(start_predictions, model, frames, task_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if output == 'csv':
+        return StreamingResponse(to_csv(predictions), media_type='text/csv')
+    return StreamingResponse(to_ndjson(predictions), media_type='application/x-ndjson')
+
+@app.get("/model_cache_stats")
+def model_cache_stats():
+    return model_cache.stats()
+
+@app.get("/predict_batching_stats")
+def predict_batching_stats():
+    return predict_batcher.stats()
 
 @app.get("/task_status/{task_id}")
 def get_task_status(task_id: str, db: Session = Depends(get_db)):
@@ -0,0 +1,151 @@
+# bench_compiled_trees.py
+#
+# Задержка и память: пайплайн sklearn из create_pipeline против
+# компилированных деревьев (src/compiled.py) — по размерам батча, плюс
+# проверка совпадения предсказаний.
+#
+#   cd backend && python benchmarks/bench_compiled_trees.py --rows 100000
+#   cd backend && python benchmarks/bench_compiled_trees.py --model-aware --output compiled.json
+
+import os
+import sys
+import json
+import time
+import pickle
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def make_data(n_rows, n_features, task_type):
+    from sklearn.datasets import make_classification, make_regression
+    if task_type == "classification":
+        X, y = make_classification(
+            n_samples=n_rows, n_features=n_features, n_informative=n_features // 2,
+            flip_y=0.05, random_state=42,
+        )
+    else:
+        X, y = make_regression(
+            n_samples=n_rows, n_features=n_features, n_informative=n_features // 2,
+            noise=10.0, random_state=42,
+        )
+    return pd.DataFrame(X, columns=[f"f{i}" for i in range(n_features)]), y
+
+
+def current_rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def measure_memory(model_file, batch_file):
+    # В отдельном процессе: в текущем аллокатор переиспользует освобождённое
+    # и прирост RSS не виден
+    from src.resources import reset_peak_rss, peak_rss_mb
+    # Импорт библиотек (src.compiled тянет xgboost и lightgbm) не входит в замер
+    import src.compiled
+    with open(batch_file, "rb") as f:
+        batch = pickle.load(f)
+    before = current_rss_mb()
+    with open(model_file, "rb") as f:
+        model = pickle.load(f)
+    loaded = current_rss_mb()
+    reset_peak_rss()
+    model.predict(batch)
+    return {"loaded_rss_mb": loaded - before, "predict_peak_rss_mb": peak_rss_mb() - loaded}
+
+
+def latency(model, X, batch, repeats):
+    times = []
+    for i in range(repeats):
+        start = (i * batch) % max(len(X) - batch, 1)
+        rows = X.iloc[start:start + batch]
+        begin = time.perf_counter()
+        model.predict(rows)
+        times.append(time.perf_counter() - begin)
+    return float(np.median(times))
+
+
+def memory(model, X, workdir):
+    import multiprocessing
+    model_file = os.path.join(workdir, "model.pkl")
+    batch_file = os.path.join(workdir, "batch.pkl")
+    with open(model_file, "wb") as f:
+        pickle.dump(model, f)
+    with open(batch_file, "wb") as f:
+        pickle.dump(X, f)
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        result = pool.apply(measure_memory, (model_file, batch_file))
+    return {"pickle_bytes": os.path.getsize(model_file), **result}
+
+
+def main(args):
+    from src.utils import get_models, create_pipeline
+    from src.compiled import compile_pipeline, parity
+
+    X, y = make_data(args.rows, args.features, args.task_type)
+    split = int(len(X) * 0.8)
+    X_train, y_train, X_val = X.iloc[:split], y[:split], X.iloc[split:]
+    results = {"rows": args.rows, "features": args.features,
+               "task_type": args.task_type, "models": {}}
+
+    for name, model in get_models(args.task_type).items():
+        pipeline = create_pipeline(model, model_aware=args.model_aware)
+        pipeline.fit(X_train, y_train)
+        try:
+            compiled = compile_pipeline(pipeline)
+        except ValueError as e:
+            print(f"{name}: {e}")
+            continue
+
+        entry = {"parity": parity(pipeline, compiled, X_val), "latency": {}}
+        for batch in args.batches:
+            sklearn_seconds = latency(pipeline, X_val, batch, args.repeats)
+            compiled_seconds = latency(compiled, X_val, batch, args.repeats)
+            entry["latency"][batch] = {
+                "sklearn_ms": sklearn_seconds * 1e3,
+                "compiled_ms": compiled_seconds * 1e3,
+                "speedup": sklearn_seconds / compiled_seconds,
+            }
+        batch = X_val.iloc[:max(args.batches)]
+        with tempfile.TemporaryDirectory() as workdir:
+            entry["memory"] = {
+                "sklearn": memory(pipeline, batch, workdir),
+                "compiled": memory(compiled, batch, workdir),
+            }
+        results["models"][name] = entry
+
+        print(f"{name}: parity {entry['parity']}")
+        for batch, row in entry["latency"].items():
+            print(
+                f"  batch {batch:>6}: sklearn {row['sklearn_ms']:.2f} ms, "
+                f"compiled {row['compiled_ms']:.2f} ms, x{row['speedup']:.1f}"
+            )
+        for kind, row in entry["memory"].items():
+            print(
+                f"  {kind:>8}: {row['pickle_bytes'] / 1e6:.1f} MB pickled, "
+                f"+{row['loaded_rss_mb']:.1f} MB loaded, "
+                f"+{row['predict_peak_rss_mb']:.1f} MB peak on predict"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--features", type=int, default=20)
+    parser.add_argument("--task-type", default="classification")
+    parser.add_argument("--model-aware", action="store_true")
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 100, 10000])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
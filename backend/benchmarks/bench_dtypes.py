@@ -0,0 +1,155 @@
+# bench_dtypes.py
+#
+# Память и время обучения каждой модели на одних и тех же данных:
+# прежние матрицы (int64/float64 + StandardScaler с float64-копией),
+# после optimize_dtypes (int8-int32/float32 + Float32Scaler) и разреженный
+# one-hot путь (SparseOneHotEncoder + масштабирование без центрирования).
+#
+#   cd backend && python benchmarks/bench_dtypes.py --rows 200000
+#   cd backend && python benchmarks/bench_dtypes.py --categorical 40 --levels 20 --output dtypes.json
+#   cd backend && python benchmarks/bench_dtypes.py --lossy-floats
+
+import os
+import sys
+import json
+import time
+import pickle
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+VARIANTS = ("baseline", "downcast", "sparse")
+
+
+def make_data(args):
+    # Числовые признаки, категории с небольшим числом уровней и несколько
+    # категорий с большим (остаются кодами и в one-hot пути)
+    rng = np.random.default_rng(42)
+    columns = {}
+    for i in range(args.numeric):
+        columns[f"num{i}"] = rng.normal(size=args.rows)
+    for i in range(args.categorical):
+        columns[f"cat{i}"] = rng.integers(0, args.levels, args.rows).astype(str)
+    for i in range(args.high_cardinality):
+        columns[f"id{i}"] = rng.integers(0, 1000, args.rows).astype(str)
+    data = pd.DataFrame(columns)
+    signal = data[[f"num{i}" for i in range(min(args.numeric, 5))]].sum(axis=1)
+    for i in range(min(args.categorical, 5)):
+        signal += (data[f"cat{i}"].astype(int) % 3 - 1) * 0.5
+    if args.task_type == "classification":
+        data["target"] = np.where(signal + rng.normal(size=args.rows) > 0, "a", "b")
+    else:
+        data["target"] = signal + rng.normal(size=args.rows)
+    return data
+
+
+def prepare(data, variant, onehot_max_levels, lossy_floats=False):
+    from src.utils import preprocess_data
+    from src.preprocessing import optimize_dtypes, SparseOneHotEncoder
+    X_train, X_val, y_train, y_val, encoder, _ = preprocess_data(
+        data, "target", return_encoders=True
+    )
+    levels = {col: len(values) for col, values in encoder.categories_.items()}
+    if variant != "baseline":
+        (X_train, X_val), _ = optimize_dtypes(X_train, X_val, lossy_floats=lossy_floats)
+    if variant == "sparse":
+        onehot = SparseOneHotEncoder(levels, onehot_max_levels).fit(X_train)
+        X_train, X_val = onehot.transform(X_train), onehot.transform(X_val)
+        levels = {}
+    return X_train, X_val, np.asarray(y_train), np.asarray(y_val), levels
+
+
+def matrix_bytes(X):
+    if hasattr(X, "memory_usage"):
+        return int(X.memory_usage(index=False).sum())
+    return int(X.data.nbytes + X.indices.nbytes + X.indptr.nbytes)
+
+
+def measure_fit(data_file, model_name, task_type, variant, model_aware):
+    # В отдельном процессе: пик RSS считается только для этого обучения
+    from sklearn.preprocessing import StandardScaler
+    from src.utils import get_models, create_pipeline
+    from src.resources import reset_peak_rss, peak_rss_mb
+    with open(data_file, "rb") as f:
+        X_train, X_val, y_train, y_val, levels = pickle.load(f)
+
+    pipeline = create_pipeline(
+        get_models(task_type)[model_name], model_aware=model_aware,
+        categorical_features=levels if model_aware else None,
+        sparse=variant == "sparse",
+    )
+    if variant == "baseline" and "scaler" in pipeline.named_steps:
+        # Прежний create_pipeline: StandardScaler делает float64-копию
+        pipeline.steps[0] = ("scaler", StandardScaler())
+
+    reset_peak_rss()
+    before = peak_rss_mb()
+    start = time.perf_counter()
+    pipeline.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    fit_peak = peak_rss_mb() - before
+    return {
+        "fit_seconds": fit_seconds,
+        "fit_peak_rss_mb": fit_peak,
+        "score": float(pipeline.score(X_val, y_val)),
+    }
+
+
+def main(args):
+    import multiprocessing
+
+    data = make_data(args)
+    results = {"rows": args.rows, "task_type": args.task_type,
+               "model_aware": args.model_aware, "variants": {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        for variant in VARIANTS:
+            X_train, X_val, y_train, y_val, levels = prepare(
+                data, variant, args.onehot_max_levels, args.lossy_floats
+            )
+            data_file = os.path.join(workdir, f"{variant}.pkl")
+            with open(data_file, "wb") as f:
+                pickle.dump((X_train, X_val, y_train, y_val, levels), f)
+            entry = {"matrix_bytes": matrix_bytes(X_train), "shape": list(X_train.shape), "models": {}}
+            del X_train, X_val
+
+            from src.utils import get_models
+            for model_name in args.models or get_models(args.task_type):
+                context = multiprocessing.get_context("spawn")
+                with context.Pool(1) as pool:
+                    entry["models"][model_name] = pool.apply(
+                        measure_fit,
+                        (data_file, model_name, args.task_type, variant, args.model_aware),
+                    )
+            results["variants"][variant] = entry
+
+            print(f"{variant}: {entry['shape']}, {entry['matrix_bytes'] / 1e6:.1f} MB")
+            for model_name, row in entry["models"].items():
+                print(
+                    f"  {model_name:>20}: fit {row['fit_seconds']:.2f} s, "
+                    f"+{row['fit_peak_rss_mb']:.1f} MB peak, score {row['score']:.4f}"
+                )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--numeric", type=int, default=10)
+    parser.add_argument("--categorical", type=int, default=20)
+    parser.add_argument("--levels", type=int, default=10)
+    parser.add_argument("--high-cardinality", type=int, default=2)
+    parser.add_argument("--onehot-max-levels", type=int, default=32)
+    parser.add_argument("--task-type", default="classification")
+    parser.add_argument("--model-aware", action="store_true")
+    parser.add_argument("--lossy-floats", action="store_true",
+                        help="float64 во float32 с округлением (lossy_float32)")
+    parser.add_argument("--models", nargs="+", default=None)
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
@@ -0,0 +1,105 @@
+# bench_fold_materialization.py
+#
+# Время и выделения памяти на один триал: фолды из .iloc-копий с
+# StandardScaler в каждом фолде против заранее подготовленного FoldSet.
+#
+#   cd backend && python benchmarks/bench_fold_materialization.py --rows 200000
+
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def make_data(n_rows, n_features):
+    from sklearn.datasets import make_classification
+    X, y = make_classification(
+        n_samples=n_rows, n_features=n_features, n_informative=n_features // 2,
+        random_state=42,
+    )
+    return pd.DataFrame(X, columns=[f"f{i}" for i in range(n_features)]), y
+
+
+def trial_iloc(model, X, y, task_type):
+    # Как было: разбиение, копии фолдов и масштабирование на каждый триал
+    from sklearn.base import clone
+    from sklearn.metrics import get_scorer
+    from src.utils import create_pipeline, get_cv, take_rows
+    cv, scoring = get_cv(task_type)
+    scorer = get_scorer(scoring)
+    scores = []
+    for train_idx, val_idx in cv.split(X, y):
+        pipeline = create_pipeline(clone(model))
+        pipeline.fit(take_rows(X, train_idx), take_rows(y, train_idx))
+        scores.append(scorer(pipeline, take_rows(X, val_idx), take_rows(y, val_idx)))
+    return np.mean(scores)
+
+
+def trial_folds(model, folds):
+    from src.folds import score_folds
+    return np.mean(score_folds(model, folds))
+
+
+def measure(fn, repeats):
+    times = []
+    tracemalloc.start()
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds_per_trial": float(np.median(times)),
+        "peak_traced_mb": peak / 1024 ** 2,
+    }
+
+
+def main(args):
+    from sklearn.linear_model import LogisticRegression
+    from lightgbm import LGBMClassifier
+    from src.folds import FoldSet
+
+    X, y = make_data(args.rows, args.features)
+    models = {
+        "Logistic Regression": LogisticRegression(max_iter=1000, random_state=42),
+        "LightGBM": LGBMClassifier(n_estimators=50, random_state=42, verbose=-1),
+    }
+
+    start = time.perf_counter()
+    folds = FoldSet(X, y, "classification")
+    materialize = time.perf_counter() - start
+    print(f"FoldSet: {folds.nbytes / 1024 ** 2:.1f} MB in {materialize:.2f}s")
+
+    results = {"rows": args.rows, "features": args.features,
+               "materialize_seconds": materialize, "models": {}}
+    for name, model in models.items():
+        baseline = measure(lambda: trial_iloc(model, X, y, "classification"), args.repeats)
+        prepared = measure(lambda: trial_folds(model, folds), args.repeats)
+        results["models"][name] = {"iloc": baseline, "folds": prepared}
+        print(
+            f"{name:>20}: {baseline['seconds_per_trial']:.3f}s -> "
+            f"{prepared['seconds_per_trial']:.3f}s per trial, peak traced "
+            f"{baseline['peak_traced_mb']:.1f} -> {prepared['peak_traced_mb']:.1f} MB"
+        )
+    folds.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--features", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
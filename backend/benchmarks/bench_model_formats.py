@@ -0,0 +1,116 @@
+# bench_model_formats.py
+#
+# Время сохранения, размер на диске и время загрузки финальной модели
+# в разных форматах model_store: MLflow (как раньше, с автоопределением
+# зависимостей, и с явным списком) и joblib с разными уровнями сжатия.
+#
+#   cd backend && python benchmarks/bench_model_formats.py --rows 100000
+#   cd backend && python benchmarks/bench_model_formats.py --model lightgbm --output formats.json
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def make_model(name, n_rows, n_features):
+    from sklearn.datasets import make_classification
+    from sklearn.ensemble import RandomForestClassifier
+    from lightgbm import LGBMClassifier
+    from xgboost import XGBClassifier
+    from src.utils import create_pipeline
+
+    X, y = make_classification(
+        n_samples=n_rows, n_features=n_features, n_informative=n_features // 2,
+        flip_y=0.05, random_state=42,
+    )
+    model = {
+        "random_forest": RandomForestClassifier(n_estimators=200, random_state=42, n_jobs=-1),
+        "lightgbm": LGBMClassifier(n_estimators=200, num_leaves=127, verbose=-1),
+        "xgboost": XGBClassifier(n_estimators=200, max_depth=10, tree_method="hist"),
+    }[name]
+    return create_pipeline(model).fit(X, y), X[:1000]
+
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(path) for name in files
+    )
+
+
+def main(args):
+    import mlflow.sklearn
+    from src.model_store import save_model, load_model
+
+    model, X_check = make_model(args.model, args.rows, args.features)
+    expected = model.predict(X_check)
+
+    formats = {
+        # Прежний путь: rmtree + save_model с автоопределением зависимостей
+        "mlflow_inferred": lambda path: mlflow.sklearn.save_model(model, path),
+        "mlflow": lambda path: save_model(model, path, fmt="mlflow"),
+    }
+    for level in args.compress:
+        formats[f"joblib_{level}"] = (
+            lambda path, level=level: save_model(model, path, fmt="joblib", compress=level)
+        )
+
+    results = {"model": args.model, "rows": args.rows, "features": args.features,
+               "formats": {}}
+    workdir = tempfile.mkdtemp(prefix="bench-formats-")
+    try:
+        for label, save in formats.items():
+            path = os.path.join(workdir, label)
+            start = time.perf_counter()
+            save(path)
+            save_seconds = time.perf_counter() - start
+
+            load_times = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                loaded = load_model(path)
+                load_times.append(time.perf_counter() - start)
+            # Первый predict после загрузки: у mmap-моделей тут дочитываются страницы
+            start = time.perf_counter()
+            prediction = loaded.predict(X_check)
+            first_predict = time.perf_counter() - start
+
+            entry = {
+                "save_seconds": save_seconds,
+                "bytes": directory_size(os.path.realpath(path)),
+                "load_seconds": float(np.median(load_times)),
+                "first_predict_seconds": first_predict,
+                "same_predictions": bool(np.array_equal(prediction, expected)),
+            }
+            results["formats"][label] = entry
+            print(
+                f"{label:>16}: save {save_seconds:.2f}s, "
+                f"{entry['bytes'] / 1e6:.1f} MB, load {entry['load_seconds']:.3f}s, "
+                f"first predict {first_predict:.3f}s, same {entry['same_predictions']}"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="random_forest",
+                        choices=["random_forest", "lightgbm", "xgboost"])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--features", type=int, default=20)
+    parser.add_argument("--compress", type=int, nargs="+", default=[0, 3, 9])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
@@ -0,0 +1,93 @@
+# bench_native_categorical.py
+#
+# Время CV и качество для каждой модели: прежний путь (коды категорий как
+# числа + StandardScaler перед любой моделью) против model-aware пути
+# (деревья без масштабирования, LightGBM/XGBoost с нативными категориями).
+#
+#   cd backend && python benchmarks/bench_native_categorical.py \
+#       --data data/mushrom/secondary_data.csv --sep ";" --target class
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def load(args):
+    from src.utils import load_data, preprocess_data
+    data = load_data(args.data, sep=args.sep)
+    # В secondary_data пропуск есть почти в каждой строке: вместо dropna
+    # пропуск в категориальной колонке считается отдельной категорией
+    numeric = data.select_dtypes(include="number").columns
+    data[numeric] = data[numeric].fillna(data[numeric].median())
+    if args.rows and len(data) > args.rows:
+        data = data.sample(n=args.rows, random_state=42)
+    X_train, _, y_train, _, encoder, _ = preprocess_data(
+        data, args.target, return_encoders=True
+    )
+    categorical_features = {
+        col: len(levels) for col, levels in encoder.categories_.items()
+    }
+    return X_train, y_train, categorical_features
+
+
+def measure(model, folds, repeats):
+    from src.folds import score_folds
+    times, scores = [], None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        scores = score_folds(model, folds)
+        times.append(time.perf_counter() - start)
+    return {
+        "kind": folds.kind_for(model),
+        "cv_seconds": float(np.median(times)),
+        "score": float(np.mean(scores)),
+    }
+
+
+def main(args):
+    from src.folds import FoldSet
+    from src.utils import get_models
+
+    X, y, categorical_features = load(args)
+    print(f"{len(X)} rows, {len(categorical_features)} categorical of {X.shape[1]} features")
+
+    legacy = FoldSet(X, y, args.task_type)
+    aware = FoldSet(
+        X, y, args.task_type,
+        model_aware=True, categorical_features=categorical_features,
+    )
+
+    results = {"rows": len(X), "features": X.shape[1],
+               "categorical": len(categorical_features), "models": {}}
+    for name, model in get_models(args.task_type).items():
+        before = measure(model, legacy, args.repeats)
+        after = measure(model, aware, args.repeats)
+        results["models"][name] = {"legacy": before, "model_aware": after}
+        print(
+            f"{name:>20}: {before['cv_seconds']:.2f}s -> {after['cv_seconds']:.2f}s "
+            f"({after['kind']}), score {before['score']:.4f} -> {after['score']:.4f}"
+        )
+    legacy.close()
+    aware.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default=os.path.join(BACKEND_DIR, "data/mushrom/secondary_data.csv"))
+    parser.add_argument("--sep", default=";")
+    parser.add_argument("--target", default="class")
+    parser.add_argument("--task-type", default="classification")
+    parser.add_argument("--rows", type=int, default=None)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
@@ -0,0 +1,327 @@
+# bench_pipeline.py
+#
+# Сквозной замер run_pipeline на синтетических данных: время (wall/CPU)
+# и пик памяти каждого этапа — load, preprocess, dtypes, folds, screening,
+# tuning, refit, persistence, logging — по сетке из числа строк (1e3-1e7),
+# ширины и доли категориальных признаков. Работает офлайн: отчёты в SQLite,
+# MLflow заменён заглушкой (--mlflow file — локальный file store).
+# Каждая конфигурация идёт в отдельном процессе и в пустом рабочем каталоге:
+# без кэша фолдов, тёплого старта Optuna и чужих моделей в models/.
+# С --baseline этапы сравниваются с прошлым JSON того же набора, замедление
+# больше --tolerance выводится как регрессия. Код выхода 1 — при регрессии
+# или если хотя бы один конфиг упал с ошибкой.
+#
+#   cd backend && python benchmarks/bench_pipeline.py --output pipeline.json
+#   cd backend && python benchmarks/bench_pipeline.py --rows 1e5 1e6 1e7 --features 20 100 \
+#       --categorical-share 0 0.5 --param n_trials=10 --param selection_strategy=subsample
+#   cd backend && python benchmarks/bench_pipeline.py --baseline pipeline.json --output new.json
+
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import platform
+import argparse
+import tempfile
+import contextlib
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Строк в одном куске при генерации: 1e7 строк не собираются в памяти целиком
+GENERATE_CHUNK_ROWS = 1000000
+# Число уровней категорий по кругу: от one-hot-размера до почти идентификатора
+CATEGORY_LEVELS = (5, 20, 100, 1000)
+# Замедление этапа меньше этого порога (секунды) регрессией не считается
+REGRESSION_MIN_SECONDS = 0.5
+
+
+def parse_rows(value):
+    # 1e6 и 1000000 — одно и то же
+    return int(float(value))
+
+
+def parse_param(value):
+    name, _, raw = value.partition("=")
+    try:
+        return name, json.loads(raw)
+    except json.JSONDecodeError:
+        return name, raw
+
+
+def dataset_path(data_dir, rows, features, share, task_type, seed):
+    return os.path.join(
+        data_dir, f"synthetic_{task_type}_{rows}x{features}_cat{share:g}_seed{seed}.parquet"
+    )
+
+
+def make_dataset(path, rows, features, share, task_type, seed):
+    # Признаки и целевая колонка строятся по кускам с одним и тем же
+    # генератором — файл воспроизводим для тех же параметров и seed
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if os.path.exists(path):
+        return path
+    n_categorical = int(round(features * share))
+    n_numeric = features - n_categorical
+    rng = np.random.default_rng(seed)
+    weights = rng.normal(size=n_numeric)
+    levels = [CATEGORY_LEVELS[i % len(CATEGORY_LEVELS)] for i in range(n_categorical)]
+    effects = [rng.normal(size=n_levels) for n_levels in levels]
+
+    tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+    writer = None
+    try:
+        for start in range(0, rows, GENERATE_CHUNK_ROWS):
+            n = min(GENERATE_CHUNK_ROWS, rows - start)
+            numeric = rng.normal(size=(n, n_numeric))
+            signal = numeric @ weights
+            columns = {f"num{i}": numeric[:, i] for i in range(n_numeric)}
+            for i, n_levels in enumerate(levels):
+                codes = rng.integers(0, n_levels, n)
+                signal += effects[i][codes]
+                columns[f"cat{i}"] = pd.Categorical.from_codes(
+                    codes, categories=[f"L{k}" for k in range(n_levels)]
+                ).astype(str)
+            signal += rng.normal(size=n)
+            if task_type == "classification":
+                columns["target"] = np.where(signal > 0, "yes", "no")
+            else:
+                columns["target"] = signal
+            table = pa.Table.from_pandas(pd.DataFrame(columns), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table)
+        writer.close()
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+class StubRunLogger:
+    # Заглушка RunLogger: запуск никуда не уходит, run_id выдаётся локально.
+    # Этап logging тогда — метрики на валидации и подготовка артефактов.
+
+    def __init__(self):
+        self.runs = 0
+
+    def log_run(self, metrics, params, tags=None, artifacts=None, model_path=None,
+                run_name=None):
+        self.runs += 1
+        return {
+            "run_id": f"stub-{self.runs}",
+            "tracking_uri": "stub",
+            "metrics": {name: float(value) for name, value in metrics.items()},
+            "params": {name: str(value) for name, value in params.items()},
+            "tags": dict(tags or {}),
+        }
+
+    def flush(self, timeout=None):
+        return True
+
+    def stats(self):
+        return {"runs": self.runs, "fallbacks": 0, "uploaded": self.runs, "failed": 0, "pending": 0}
+
+
+def run_config(config, data_path, params, mlflow, workdir):
+    # В отдельном (spawn) процессе: окружение выставляется до импорта src,
+    # пик памяти и состояние модулей — только этого запуска
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["MLFLOW_TRACKING_URI"] = f"file:{os.path.join(workdir, 'mlruns')}"
+
+    from src.database import SessionLocal, engine, sync_schema
+    from src.models import Base, Report
+    import src.pipeline as pipeline
+
+    sync_schema(Base, engine)
+    if mlflow == "stub":
+        pipeline.run_logger = StubRunLogger()
+
+    db = SessionLocal()
+    report_id = str(uuid.uuid4())
+    db.add(Report(report_id=report_id, task_id=report_id, status="Running", params=params))
+    db.commit()
+
+    result = {**config, "data_bytes": os.path.getsize(data_path)}
+    start = time.perf_counter()
+    try:
+        with open(os.path.join(workdir, "pipeline.log"), "w") as log, contextlib.redirect_stdout(log):
+            pipeline.run_pipeline(
+                data_path, None, "target",
+                task_type=config["task_type"],
+                dataset_name="synthetic",
+                report_id=report_id,
+                db=db,
+                **params,
+            )
+            # Выгрузка в MLflow идёт в фоне и в этапы не входит
+            flush_start = time.perf_counter()
+            pipeline.run_logger.flush()
+            result["mlflow_flush_seconds"] = time.perf_counter() - flush_start
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start
+
+    db.expire_all()
+    report = db.query(Report).filter(Report.report_id == report_id).first().report_data or {}
+    resources = report.get("resources", {})
+    result["peak_rss_mb"] = resources.get("peak_rss_mb")
+    result["stages"] = {
+        name: {
+            "wall_seconds": stage["wall_seconds"],
+            "cpu_seconds": stage["cpu_seconds"],
+            "peak_rss_mb": stage["peak_rss_mb"],
+        }
+        for name, stage in resources.get("stages", {}).items()
+    }
+    result["best_model"] = db.query(Report.model_name).filter(Report.report_id == report_id).scalar()
+    result["validation_metrics"] = report.get("validation_metrics")
+    db.close()
+    return result
+
+
+def config_key(entry):
+    return (entry["rows"], entry["features"], entry["categorical_share"], entry["task_type"])
+
+
+def compare(results, baseline, tolerance):
+    # Регрессия — этап того же конфига медленнее прошлого замера больше чем
+    # на tolerance (доля) и больше чем на REGRESSION_MIN_SECONDS
+    previous = {config_key(entry): entry for entry in baseline.get("results", [])}
+    regressions = []
+    for entry in results:
+        old = previous.get(config_key(entry))
+        if old is None:
+            continue
+        stages = {**entry.get("stages", {}), "total": {"wall_seconds": entry["seconds"]}}
+        old_stages = {**old.get("stages", {}), "total": {"wall_seconds": old["seconds"]}}
+        for name, stage in stages.items():
+            if name not in old_stages:
+                continue
+            new_seconds = stage["wall_seconds"]
+            old_seconds = old_stages[name]["wall_seconds"]
+            if (new_seconds > old_seconds * (1 + tolerance)
+                    and new_seconds - old_seconds > REGRESSION_MIN_SECONDS):
+                regressions.append({
+                    "config": dict(zip(("rows", "features", "categorical_share", "task_type"),
+                                       config_key(entry))),
+                    "stage": name,
+                    "baseline_seconds": old_seconds,
+                    "seconds": new_seconds,
+                    "ratio": new_seconds / old_seconds if old_seconds else None,
+                })
+    return regressions
+
+
+def main(args):
+    import multiprocessing
+    from src.model_store import requirements
+
+    params = {"n_trials": 10, **dict(parse_param(p) for p in args.param)}
+    # Кэш фолдов и тёплый старт подменили бы замер повторного запуска
+    params["use_fold_cache"] = False
+
+    scratch = tempfile.mkdtemp(prefix="bench_pipeline_")
+    data_dir = args.data_dir or os.path.join(scratch, "data")
+    os.makedirs(data_dir, exist_ok=True)
+    results = []
+    try:
+        for task_type in args.task_types:
+            for rows in args.rows:
+                for features in args.features:
+                    for share in args.categorical_share:
+                        config = {
+                            "rows": rows,
+                            "features": features,
+                            "categorical_share": share,
+                            "task_type": task_type,
+                        }
+                        path = dataset_path(data_dir, rows, features, share, task_type, args.seed)
+                        start = time.perf_counter()
+                        make_dataset(path, rows, features, share, task_type, args.seed)
+                        generate_seconds = time.perf_counter() - start
+
+                        workdir = os.path.join(scratch, f"run_{len(results)}")
+                        context = multiprocessing.get_context("spawn")
+                        with context.Pool(1) as pool:
+                            entry = pool.apply(run_config, (config, path, params, args.mlflow, workdir))
+                        entry["generate_seconds"] = generate_seconds
+                        results.append(entry)
+
+                        stages = ", ".join(
+                            f"{name} {stage['wall_seconds']:.2f}s"
+                            for name, stage in entry["stages"].items()
+                        )
+                        status = entry.get("error") or f"{entry['best_model']}, peak {entry['peak_rss_mb']:.0f} MB"
+                        print(
+                            f"{task_type} {rows}x{features} cat {share:g}: "
+                            f"{entry['seconds']:.1f}s, {status}"
+                        )
+                        print(f"  {stages}")
+                        if not args.keep_workdirs:
+                            shutil.rmtree(workdir, ignore_errors=True)
+    finally:
+        if not args.keep_workdirs:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    output = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "libraries": requirements(),
+        },
+        "params": params,
+        "mlflow": args.mlflow,
+        "seed": args.seed,
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            output["regressions"] = compare(results, json.load(f), args.tolerance)
+        for regression in output["regressions"]:
+            print(
+                f"Regression: {regression['config']} {regression['stage']} "
+                f"{regression['baseline_seconds']:.2f}s -> {regression['seconds']:.2f}s"
+            )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2, default=str)
+    # Упавший конфиг — такой же провал, как регрессия
+    errors = [entry for entry in results if "error" in entry]
+    for entry in errors:
+        print(
+            f"Error: {entry['task_type']} {entry['rows']}x{entry['features']} "
+            f"cat {entry['categorical_share']:g}: {entry['error']}"
+        )
+    if output.get("regressions") or errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=parse_rows, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--features", type=int, nargs="+", default=[20])
+    parser.add_argument("--categorical-share", type=float, nargs="+", default=[0.0, 0.5])
+    parser.add_argument("--task-types", nargs="+", default=["classification", "regression"])
+    parser.add_argument("--param", action="append", default=[],
+                        help="параметр run_pipeline, например n_trials=20 или time_budget=60")
+    parser.add_argument("--mlflow", choices=("stub", "file"), default="stub")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", default=None,
+                        help="каталог для сгенерированных Parquet-файлов (переиспользуются)")
+    parser.add_argument("--keep-workdirs", action="store_true")
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
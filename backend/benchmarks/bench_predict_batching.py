@@ -0,0 +1,102 @@
+# bench_predict_batching.py
+#
+# Латентность (p50/p99) и пропускная способность /predict с микробатчингом
+# и без него при разной конкурентности.
+#
+#   cd backend && python benchmarks/bench_predict_batching.py --requests 2000
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def prepare_workdir(n_features):
+    from sklearn.datasets import make_classification
+    from sklearn.ensemble import RandomForestClassifier
+    import mlflow.sklearn
+    from src.utils import create_pipeline
+
+    workdir = tempfile.mkdtemp(prefix="bench_predict_")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/bench.db")
+    X, y = make_classification(n_samples=5000, n_features=n_features, random_state=42)
+    pipeline = create_pipeline(RandomForestClassifier(n_estimators=100, random_state=42))
+    pipeline.fit(X, y)
+    mlflow.sklearn.save_model(pipeline, os.path.join(workdir, "models", "bench_model"))
+    os.chdir(workdir)
+    return X
+
+
+async def run_level(client, rows, concurrency, n_requests):
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(n_requests):
+        queue.put_nowait(rows[i % len(rows)].tolist())
+
+    async def worker():
+        while not queue.empty():
+            features = queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.post(
+                "/predict", json={"features": features, "model_name": "bench_model"}
+            )
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "rows_per_sec": n_requests / elapsed,
+    }
+
+
+async def main(args):
+    rows = prepare_workdir(args.features)
+    import httpx
+    import app as api
+
+    results = []
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # прогрев кэша моделей
+        await client.post("/predict", json={"features": rows[0].tolist(), "model_name": "bench_model"})
+        for mode, max_wait, max_rows in [
+            ("unbatched", 0.0, 1),
+            ("batched", args.wait_ms / 1000, args.max_rows),
+        ]:
+            api.predict_batcher.max_wait = max_wait
+            api.predict_batcher.max_rows = max_rows
+            for concurrency in args.concurrency:
+                result = await run_level(client, rows, concurrency, args.requests)
+                result["mode"] = mode
+                results.append(result)
+                print(
+                    f"{mode:>9} c={concurrency:<4} p50={result['p50_ms']:.2f}ms "
+                    f"p99={result['p99_ms']:.2f}ms rows/s={result['rows_per_sec']:.0f}"
+                )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--features", type=int, default=20)
+    parser.add_argument("--wait-ms", type=float, default=2.0)
+    parser.add_argument("--max-rows", type=int, default=256)
+    parser.add_argument("--output", default=None)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,98 @@
+# bench_screening.py
+#
+# Время отбора моделей и согласие с ранжированием по полной CV:
+# exhaustive (эталон) против successive_halving и subsample.
+#
+#   cd backend && python benchmarks/bench_screening.py --rows 200000
+#   cd backend && python benchmarks/bench_screening.py --task-type regression
+
+import os
+import sys
+import json
+import time
+import argparse
+import pandas as pd
+from scipy.stats import kendalltau
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def make_data(n_rows, n_features, task_type):
+    from sklearn.datasets import make_classification, make_regression
+    if task_type == "classification":
+        X, y = make_classification(
+            n_samples=n_rows, n_features=n_features, n_informative=n_features // 2,
+            flip_y=0.05, random_state=42,
+        )
+    else:
+        X, y = make_regression(
+            n_samples=n_rows, n_features=n_features, n_informative=n_features // 2,
+            noise=10.0, random_state=42,
+        )
+    return pd.DataFrame(X, columns=[f"f{i}" for i in range(n_features)]), y
+
+
+def agreement(ranked, reference, reference_scores):
+    tau = kendalltau(
+        [reference.index(m) for m in ranked], list(range(len(ranked)))
+    ).statistic
+    return {
+        "top1": ranked[0] == reference[0],
+        "kendall_tau": float(tau),
+        # Насколько полная CV выбранной модели хуже лучшей по полной CV
+        "score_regret": float(reference_scores[reference[0]] - reference_scores[ranked[0]]),
+    }
+
+
+def main(args):
+    from src.utils import get_models
+    from src.selection import select_model
+
+    X, y = make_data(args.rows, args.features, args.task_type)
+    results = {"rows": args.rows, "features": args.features,
+               "task_type": args.task_type, "strategies": {}}
+
+    reference = None
+    for strategy in ("exhaustive", "successive_halving", "subsample"):
+        start = time.perf_counter()
+        best, _, selection = select_model(
+            get_models(args.task_type), X, y, args.task_type, strategy=strategy,
+            confidence=args.confidence, margin=args.margin,
+        )
+        seconds = time.perf_counter() - start
+        if reference is None:
+            reference = selection["ranking"]
+            reference_scores = selection["rounds"][-1]["scores"]
+        entry = {
+            "seconds": seconds,
+            "best_model": best,
+            "ranking": selection["ranking"],
+            "rounds": [
+                {"budget": r["budget"], "models": list(r["scores"])}
+                for r in selection["rounds"]
+            ],
+            **agreement(selection["ranking"], reference, reference_scores),
+        }
+        results["strategies"][strategy] = entry
+        print(
+            f"{strategy:>20}: {seconds:.1f}s, best {best}, "
+            f"top1 {entry['top1']}, tau {entry['kendall_tau']:.2f}, "
+            f"regret {entry['score_regret']:.4f}, "
+            f"rows per round {[r['budget'] for r in entry['rounds']]}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--features", type=int, default=20)
+    parser.add_argument("--task-type", default="classification")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--margin", type=float, default=0.01)
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
@@ -0,0 +1,76 @@
+# batching.py
+
+import asyncio
+import numpy as np
+
+
+class MicroBatcher:
+    # Склеивает одновременные запросы к одной модели в один вызов predict:
+    # батч уходит, когда набралось max_rows строк или прошло max_wait секунд.
+    # Запросы с разным числом признаков в один батч не попадают.
+
+    def __init__(self, max_wait=0.002, max_rows=256):
+        self.max_wait = max_wait
+        self.max_rows = max_rows
+        self._pending = {}
+        self._timers = {}
+        self.batches = 0
+        self.rows = 0
+
+    async def submit(self, key, model, rows):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        rows = np.asarray(rows)
+        key = (key, rows.shape[1] if rows.ndim == 2 else None)
+        batch = self._pending.setdefault(key, {"model": model, "items": [], "rows": 0})
+        batch["items"].append((rows, future))
+        batch["rows"] += len(rows)
+
+        if batch["rows"] >= self.max_rows or self.max_wait <= 0:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.max_wait, self._flush, key)
+        return await future
+
+    def _flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if batch is not None:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        items = batch["items"]
+        loop = asyncio.get_running_loop()
+        try:
+            X = np.vstack([rows for rows, _ in items])
+            # predict в пуле потоков, чтобы не блокировать event loop
+            prediction = await loop.run_in_executor(None, batch["model"].predict, X)
+        except Exception as e:
+            if len(items) == 1:
+                if not items[0][1].done():
+                    items[0][1].set_exception(e)
+                return
+            # Ошибку получает только запрос, на котором она возникла
+            await asyncio.gather(*(
+                self._run({"model": batch["model"], "items": [item]}) for item in items
+            ))
+            return
+
+        self.batches += 1
+        self.rows += len(X)
+        offset = 0
+        for rows, future in items:
+            if not future.done():
+                future.set_result(prediction[offset:offset + len(rows)])
+            offset += len(rows)
+
+    def stats(self):
+        return {
+            "max_wait_ms": self.max_wait * 1000,
+            "max_rows": self.max_rows,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_rows": self.rows / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,390 @@
+# compiled.py
+
+import json
+import numpy as np
+import scipy.sparse as sp
+from sklearn.base import BaseEstimator
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.pipeline import Pipeline
+from xgboost import XGBClassifier, XGBRegressor
+from lightgbm import LGBMClassifier, LGBMRegressor
+from .preprocessing import Float32Scaler
+
+# Деревья ансамбля переводятся в плоские массивы узлов и считаются
+# векторно по всему батчу: на каждом шаге все строки во всех деревьях
+# спускаются на один уровень. Строки обрабатываются кусками, чтобы
+# матрица индексов узлов (строки x деревья) не разрасталась.
+COMPILE_CHUNK_ROWS = 1024
+# Совпадение с исходной моделью на валидации, при котором компилированная
+# модель заменяет её при сохранении (для регрессии — относительная ошибка,
+# XGBoost суммирует листья во float32, отсюда расхождение ~1e-6)
+PARITY_TOLERANCE = 1e-5
+
+
+class TreeBuilder:
+    # Узлы всех деревьев в общих списках; лист — feature == -1
+
+    def __init__(self, n_outputs):
+        self.n_outputs = n_outputs
+        self.feature, self.threshold, self.missing_left = [], [], []
+        self.left, self.right, self.category, self.value = [], [], [], []
+        self.categories = []
+        self.roots = []
+        self.max_depth = 0
+
+    def node(self):
+        self.feature.append(-1)
+        self.threshold.append(0.0)
+        self.missing_left.append(False)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.category.append(-1)
+        self.value.append(np.zeros(self.n_outputs))
+        return len(self.feature) - 1
+
+    def split(self, index, feature, threshold, missing_left, left, right,
+              categories=None):
+        # categories — множество уровней, которые идут влево
+        self.feature[index] = feature
+        self.threshold[index] = threshold
+        self.missing_left[index] = missing_left
+        self.left[index] = left
+        self.right[index] = right
+        if categories is not None:
+            self.category[index] = len(self.categories)
+            self.categories.append(categories)
+
+    def leaf(self, index, value, output=None):
+        if output is None:
+            self.value[index] = np.asarray(value, dtype=float)
+        else:
+            self.value[index][output] = value
+
+    def build(self, estimator):
+        feature = np.asarray(self.feature, dtype=np.int32)
+        leaf = feature < 0
+        index = np.arange(len(feature), dtype=np.int32)
+        # Лист ссылается сам на себя
+        left = np.where(leaf, index, np.asarray(self.left, dtype=np.int32))
+        right = np.where(leaf, index, np.asarray(self.right, dtype=np.int32))
+        estimator.leaf_ = leaf
+        estimator.feature_ = np.where(leaf, 0, feature).astype(np.int32)
+        estimator.threshold_ = np.asarray(self.threshold, dtype=np.float64)
+        estimator.missing_left_ = np.asarray(self.missing_left, dtype=bool)
+        # children_[2 * node + пошли_вправо]
+        estimator.children_ = np.column_stack([left, right]).ravel()
+        estimator.category_ = np.asarray(self.category, dtype=np.int32)
+        estimator.value_ = np.asarray(self.value, dtype=np.float64)
+        estimator.roots_ = np.asarray(self.roots, dtype=np.int32)
+        estimator.max_depth_ = self.max_depth
+        # Таблица принадлежности уровня множеству; последний столбец —
+        # для пропусков и неизвестных уровней (всегда False)
+        width = max((max(c) + 1 for c in self.categories if c), default=0) + 1
+        table = np.zeros((max(len(self.categories), 1), width), dtype=bool)
+        for i, levels in enumerate(self.categories):
+            table[i, list(levels)] = True
+        estimator.category_table_ = table
+        return estimator
+
+
+class CompiledTrees(BaseEstimator):
+    # Ансамбль деревьев как набор массивов. aggregate: "mean" (лес) или
+    # "sum" (бустинг); link: "identity", "sigmoid" или "softmax".
+
+    def fit(self, X, y=None):
+        # Строится из уже обученной модели (compile_model), fit ничего не делает
+        return self
+
+    def leaves(self, X):
+        n_rows, n_trees = len(X), len(self.roots_)
+        node = np.repeat(self.roots_[None, :], n_rows, axis=0).ravel()
+        # Пары (строка, дерево), ещё не дошедшие до листа: глубина деревьев
+        # разная, и считать дошедшие до самого глубокого листа невыгодно
+        active = np.flatnonzero(~self.leaf_[node])
+        current = node[active]
+        offset = active // n_trees * X.shape[1]
+        flat = X.ravel()
+        has_missing = np.isnan(flat).any()
+        has_categories = (self.category_ >= 0).any()
+        unknown = self.category_table_.shape[1] - 1
+        while len(active):
+            x = flat[offset + self.feature_[current]]
+            go_right = ~(x <= self.threshold_[current])
+            if has_categories:
+                category = self.category_[current]
+                categorical = category >= 0
+                codes = x[categorical]
+                valid = (codes >= 0) & (codes < unknown)
+                codes = np.where(valid, codes, unknown).astype(np.int64)
+                go_right[categorical] = ~self.category_table_[category[categorical], codes]
+            if has_missing:
+                go_right = np.where(np.isnan(x), ~self.missing_left_[current], go_right)
+            current = self.children_[2 * current + go_right]
+            done = self.leaf_[current]
+            if done.any():
+                node[active[done]] = current[done]
+                keep = ~done
+                active, current, offset = active[keep], current[keep], offset[keep]
+        return node.reshape(n_rows, n_trees)
+
+    def raw_predict(self, X):
+        if sp.issparse(X):
+            # XGBoost считает отсутствующие в CSR элементы пропусками, а не нулями
+            X = sp.coo_matrix(X)
+            dense = np.full(X.shape, np.nan if getattr(self, "sparse_missing_", False) else 0.0)
+            dense[X.row, X.col] = X.data
+            X = dense
+        X = np.asarray(X, dtype=self.input_dtype_).astype(np.float64)
+        if getattr(self, "category_levels_", None) is not None:
+            # Как CategoricalCaster: неизвестный уровень — пропуск
+            levels = self.category_levels_
+            columns = np.flatnonzero(levels)
+            codes = X[:, columns]
+            X[:, columns] = np.where((codes >= 0) & (codes < levels[columns]), codes, np.nan)
+        result = np.empty((len(X), self.value_.shape[1]))
+        for start in range(0, len(X), COMPILE_CHUNK_ROWS):
+            chunk = X[start:start + COMPILE_CHUNK_ROWS]
+            values = self.value_[self.leaves(chunk)].sum(axis=1)
+            if self.aggregate_ == "mean":
+                values /= len(self.roots_)
+            result[start:start + len(chunk)] = values + self.base_margin_
+        return result
+
+    def predict_proba(self, X):
+        margin = self.raw_predict(X)
+        if self.link_ == "sigmoid":
+            positive = 1.0 / (1.0 + np.exp(-margin[:, 0]))
+            return np.column_stack([1.0 - positive, positive])
+        if self.link_ == "softmax":
+            margin = np.exp(margin - margin.max(axis=1, keepdims=True))
+            return margin / margin.sum(axis=1, keepdims=True)
+        return margin
+
+    def predict(self, X):
+        if hasattr(self, "classes_"):
+            return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+        return self.raw_predict(X)[:, 0]
+
+
+def compile_forest(model):
+    classifier = isinstance(model, RandomForestClassifier)
+    n_outputs = len(model.classes_) if classifier else 1
+    builder = TreeBuilder(n_outputs)
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        offset = len(builder.feature)
+        for _ in range(tree.node_count):
+            builder.node()
+        missing_left = getattr(tree, "missing_go_to_left", np.zeros(tree.node_count))
+        for i in range(tree.node_count):
+            if tree.children_left[i] == -1:
+                value = tree.value[i][0]
+                # Лес усредняет доли классов в листьях
+                builder.leaf(offset + i, value / value.sum() if classifier else value)
+            else:
+                builder.split(
+                    offset + i, tree.feature[i], tree.threshold[i], bool(missing_left[i]),
+                    offset + tree.children_left[i], offset + tree.children_right[i],
+                )
+        builder.roots.append(offset)
+        builder.max_depth = max(builder.max_depth, tree.max_depth)
+    compiled = builder.build(CompiledTrees())
+    compiled.aggregate_, compiled.link_ = "mean", "identity"
+    compiled.base_margin_ = np.zeros(n_outputs)
+    # sklearn сравнивает признаки во float32
+    compiled.input_dtype_ = np.float32
+    return compiled
+
+
+def compile_xgboost(model):
+    booster = model.get_booster()
+    config = json.loads(booster.save_config())
+    objective = config["learner"]["objective"]["name"]
+    base_score = float(config["learner"]["learner_model_param"]["base_score"])
+    n_groups = max(int(config["learner"]["learner_model_param"]["num_class"]), 1)
+    if objective == "binary:logistic":
+        # base_score хранится в пространстве вероятностей
+        link, base_margin = "sigmoid", np.log(base_score / (1 - base_score))
+    elif objective in ("multi:softprob", "multi:softmax"):
+        link, base_margin = "softmax", base_score
+    elif objective == "reg:squarederror":
+        link, base_margin = "identity", base_score
+    else:
+        raise ValueError(f"Целевая функция {objective} не поддерживается для компиляции.")
+
+    names = booster.feature_names or [f"f{i}" for i in range(booster.num_features())]
+    index = {name: i for i, name in enumerate(names)}
+    dumps = booster.get_dump(dump_format="json")
+    try:
+        dumps = dumps[:(model.best_iteration + 1) * n_groups]
+    except AttributeError:
+        pass
+
+    builder = TreeBuilder(n_groups)
+    for tree_index, dump in enumerate(dumps):
+        output = tree_index % n_groups
+        nodes, depth = {}, {}
+        stack = [json.loads(dump)]
+        while stack:
+            item = stack.pop()
+            nodes[item["nodeid"]] = item
+            stack.extend(item.get("children", []))
+        ids = {nodeid: builder.node() for nodeid in nodes}
+        for nodeid, item in nodes.items():
+            if "leaf" in item:
+                builder.leaf(ids[nodeid], item["leaf"], output)
+                continue
+            depth[nodeid] = item["depth"]
+            condition = item["split_condition"]
+            if isinstance(condition, list):
+                # Уровни из списка идут в "yes"
+                builder.split(
+                    ids[nodeid], index[item["split"]], 0.0,
+                    item["missing"] == item["yes"], ids[item["yes"]], ids[item["no"]],
+                    categories=set(int(c) for c in condition),
+                )
+            else:
+                # XGBoost: x < t во float32, то есть x <= предыдущего float32
+                threshold = np.nextafter(np.float32(condition), np.float32(-np.inf))
+                builder.split(
+                    ids[nodeid], index[item["split"]], float(threshold),
+                    item["missing"] == item["yes"], ids[item["yes"]], ids[item["no"]],
+                )
+        builder.roots.append(ids[0])
+        builder.max_depth = max(builder.max_depth, max(depth.values(), default=-1) + 1)
+    compiled = builder.build(CompiledTrees())
+    compiled.aggregate_, compiled.link_ = "sum", link
+    compiled.base_margin_ = np.full(n_groups, base_margin)
+    compiled.input_dtype_ = np.float32
+    compiled.sparse_missing_ = True
+    return compiled
+
+
+def compile_lightgbm(model):
+    dump = model.booster_.dump_model()
+    objective = dump["objective"].split()[0]
+    if dump.get("average_output"):
+        raise ValueError("Режим rf в LightGBM не поддерживается для компиляции.")
+    link = {"binary": "sigmoid", "multiclass": "softmax", "regression": "identity"}.get(objective)
+    if link is None:
+        raise ValueError(f"Целевая функция {objective} не поддерживается для компиляции.")
+    n_groups = dump["num_tree_per_iteration"]
+    trees = dump["tree_info"]
+    if getattr(model, "best_iteration_", None):
+        trees = trees[:model.best_iteration_ * n_groups]
+
+    builder = TreeBuilder(n_groups)
+    for tree in trees:
+        output = tree["tree_index"] % n_groups
+        max_depth = 0
+        root = builder.node()
+        stack = [(tree["tree_structure"], root, 0)]
+        while stack:
+            item, index, depth = stack.pop()
+            if "leaf_value" in item:
+                builder.leaf(index, item["leaf_value"], output)
+                max_depth = max(max_depth, depth)
+                continue
+            if item["missing_type"] == "Zero":
+                raise ValueError("zero_as_missing не поддерживается для компиляции.")
+            left, right = builder.node(), builder.node()
+            if item["decision_type"] == "==":
+                # Пропуски и неизвестные уровни категорий идут вправо
+                levels = set(int(c) for c in str(item["threshold"]).split("||"))
+                builder.split(index, item["split_feature"], 0.0, False, left, right,
+                              categories=levels)
+            else:
+                threshold = float(item["threshold"])
+                # missing_type None: пропуск считается нулём
+                missing_left = (
+                    item["default_left"] if item["missing_type"] == "NaN" else 0.0 <= threshold
+                )
+                builder.split(index, item["split_feature"], threshold, missing_left, left, right)
+            stack.append((item["left_child"], left, depth + 1))
+            stack.append((item["right_child"], right, depth + 1))
+        builder.roots.append(root)
+        builder.max_depth = max(builder.max_depth, max_depth)
+    compiled = builder.build(CompiledTrees())
+    compiled.aggregate_, compiled.link_ = "sum", link
+    compiled.base_margin_ = np.zeros(n_groups)
+    compiled.input_dtype_ = np.float64
+    return compiled
+
+
+def float32_boundary(threshold):
+    # sklearn и XGBoost сравнивают float32(x') <= t. Это то же, что
+    # x' < середины между наибольшим float32 <= t и следующим за ним
+    below = threshold.astype(np.float32)
+    below = np.where(below > threshold, np.nextafter(below, np.float32(-np.inf)), below)
+    above = np.nextafter(below, np.float32(np.inf))
+    return (below.astype(np.float64) + above.astype(np.float64)) / 2
+
+
+def fold_scaler(compiled, scaler):
+    # x' = (x - mean) / scale <= t  <=>  x <= t * scale + mean (scale > 0):
+    # масштабирование уходит в пороги, StandardScaler при предсказании не нужен
+    numeric = ~compiled.leaf_ & (compiled.category_ < 0)
+    feature = compiled.feature_[numeric]
+    threshold = compiled.threshold_[numeric]
+    mean = scaler.mean_[feature] if scaler.with_mean else 0.0
+    # Float32Scaler сам округляет x' до float32 — для LightGBM тоже
+    if compiled.input_dtype_ == np.float32 or isinstance(scaler, Float32Scaler):
+        # Строгое x' < граница -> x <= предыдущего double
+        boundary = float32_boundary(threshold) * scaler.scale_[feature] + mean
+        threshold = np.nextafter(boundary, -np.inf)
+    else:
+        threshold = threshold * scaler.scale_[feature] + mean
+    compiled.threshold_[numeric] = threshold
+    # Пороги уже в исходных единицах, округление до float32 сдвинуло бы их
+    compiled.input_dtype_ = np.float64
+    return compiled
+
+
+def compile_model(model):
+    if isinstance(model, (RandomForestClassifier, RandomForestRegressor)):
+        compiled = compile_forest(model)
+    elif isinstance(model, (XGBClassifier, XGBRegressor)):
+        compiled = compile_xgboost(model)
+    elif isinstance(model, (LGBMClassifier, LGBMRegressor)):
+        compiled = compile_lightgbm(model)
+    else:
+        raise ValueError(f"Модель {type(model).__name__} не поддерживается для компиляции.")
+    if hasattr(model, "classes_"):
+        compiled.classes_ = np.asarray(model.classes_)
+    return compiled
+
+
+def compile_pipeline(pipeline):
+    # Пайплайн из create_pipeline -> одна компилированная модель: scaler
+    # сворачивается в пороги, CategoricalCaster не нужен (уровни — коды)
+    compiled = compile_model(pipeline.named_steps["model"])
+    if "scaler" in pipeline.named_steps:
+        compiled = fold_scaler(compiled, pipeline.named_steps["scaler"])
+    if "categorical" in pipeline.named_steps:
+        caster = pipeline.named_steps["categorical"]
+        columns = list(pipeline.named_steps["model"].feature_names_in_)
+        compiled.category_levels_ = np.array([
+            (caster.categorical_features or {}).get(col, 0) for col in columns
+        ])
+    # Порядок колонок нужен align_features при пакетном скоринге
+    feature_names = getattr(pipeline, "feature_names_in_", None)
+    if feature_names is not None:
+        compiled.feature_names_in_ = feature_names
+    return Pipeline([("model", compiled)])
+
+
+def parity(original, compiled, X):
+    # Доля совпавших предсказаний и максимальное расхождение вероятностей
+    # (для регрессии — предсказаний, относительно их разброса)
+    expected, actual = original.predict(X), compiled.predict(X)
+    if hasattr(compiled, "classes_"):
+        diff = np.abs(original.predict_proba(X) - compiled.predict_proba(X))
+        report = {
+            "agreement": float(np.mean(expected == actual)),
+            "max_abs_diff": float(diff.max()) if diff.size else 0.0,
+        }
+    else:
+        scale = max(float(np.std(expected)), 1e-12)
+        report = {"max_abs_diff": float(np.max(np.abs(expected - actual)) / scale)}
+    report["passed"] = report["max_abs_diff"] <= PARITY_TOLERANCE
+    return report
@@ -1,6 +1,6 @@
 # database.py
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
 import os
 
@@ -8,3 +8,19 @@ DATABASE_URL = os.getenv('DATABASE_URL', 'postgresql://postgres:pass123@db:5432/
 
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def sync_schema(base, bind=engine):
+    # create_all не добавляет новые колонки в уже существующие таблицы
+    base.metadata.create_all(bind=bind)
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                ))
@@ -0,0 +1,314 @@
+# datasets.py
+
+import os
+import json
+import time
+import hashlib
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from .database import SessionLocal
+from .models import Dataset
+from .preprocessing import NULL_VALUES
+
+DATA_DIR = "data"
+# Имя без "_", чтобы list_datasets не принимал каталог за загруженный файл
+COLUMNAR_DIR = os.path.join(DATA_DIR, ".columnar")
+BLOCK_SIZE = 1 << 24
+
+UPLOADED = "Uploaded"
+READY = "Ready"
+FAILED = "Failed"
+
+
+def split_upload_name(name):
+    file_id, filename = name.split("_", 1)
+    return file_id, filename
+
+
+def sidecar_path(file_id, columnar_dir=COLUMNAR_DIR):
+    return os.path.join(columnar_dir, f"{file_id}.json")
+
+
+def read_sidecar(file_id, columnar_dir=COLUMNAR_DIR):
+    path = sidecar_path(file_id, columnar_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_sidecar(meta, columnar_dir=COLUMNAR_DIR):
+    # Сначала во временный файл, затем rename: читатель никогда не увидит
+    # недописанный JSON
+    path = sidecar_path(meta["file_id"], columnar_dir)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, path)
+
+
+def hash_file(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def drop_index_columns(batch):
+    # То же, что load_data: безымянные колонки-индексы выкидываются
+    keep = [
+        i for i, name in enumerate(batch.schema.names)
+        if name and not name.startswith("Unnamed")
+    ]
+    if len(keep) == len(batch.schema.names):
+        return batch
+    return batch.select(keep)
+
+
+def csv_options(sep, block_size):
+    return (
+        pacsv.ReadOptions(block_size=block_size),
+        pacsv.ParseOptions(delimiter=sep),
+        pacsv.ConvertOptions(null_values=NULL_VALUES, strings_can_be_null=True),
+    )
+
+
+def write_csv_as_parquet(raw_path, target_path, sep=",", block_size=BLOCK_SIZE):
+    read_options, parse_options, convert_options = csv_options(sep, block_size)
+    try:
+        # Потоково, по блокам: типы выводятся по первому блоку
+        reader = pacsv.open_csv(
+            raw_path, read_options=read_options,
+            parse_options=parse_options, convert_options=convert_options,
+        )
+        writer = None
+        try:
+            for batch in reader:
+                batch = drop_index_columns(batch)
+                if writer is None:
+                    writer = pq.ParquetWriter(target_path, batch.schema)
+                writer.write_batch(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            raise ValueError("Файл не содержит данных.")
+    except pa.ArrowInvalid:
+        # Тип колонки поменялся в одном из следующих блоков — читаем целиком,
+        # чтобы типы выводились по всему файлу
+        table = pacsv.read_csv(
+            raw_path, read_options=read_options,
+            parse_options=parse_options, convert_options=convert_options,
+        )
+        table = drop_index_columns(table)
+        pq.write_table(table, target_path)
+
+
+def column_stats(parquet_path):
+    # Статистика собирается из метаданных row group'ов Parquet, без чтения данных
+    parquet_file = pq.ParquetFile(parquet_path)
+    metadata = parquet_file.metadata
+    schema = parquet_file.schema_arrow
+    columns = []
+    for j, field in enumerate(schema):
+        stats = {"name": field.name, "type": str(field.type), "null_count": 0, "min": None, "max": None}
+        for i in range(metadata.num_row_groups):
+            rg_stats = metadata.row_group(i).column(j).statistics
+            if rg_stats is None:
+                continue
+            if rg_stats.has_null_count:
+                stats["null_count"] += rg_stats.null_count
+            if rg_stats.has_min_max:
+                low, high = rg_stats.min, rg_stats.max
+                if isinstance(low, bytes):
+                    low, high = low.decode(errors="replace"), high.decode(errors="replace")
+                stats["min"] = low if stats["min"] is None else min(stats["min"], low)
+                stats["max"] = high if stats["max"] is None else max(stats["max"], high)
+        for key in ("min", "max"):
+            if hasattr(stats[key], "isoformat"):
+                stats[key] = stats[key].isoformat()
+        columns.append(stats)
+    return metadata.num_rows, columns
+
+
+def convert_upload(raw_path, sep=",", content_hash=None, columnar_dir=COLUMNAR_DIR):
+    file_id, filename = split_upload_name(os.path.basename(raw_path))
+    os.makedirs(columnar_dir, exist_ok=True)
+    start = time.time()
+
+    if "parquet" in raw_path:
+        # Уже колоночный формат — отдельная копия не нужна
+        columnar_path = raw_path
+    else:
+        columnar_path = os.path.join(columnar_dir, f"{file_id}.parquet")
+        tmp_path = columnar_path + ".tmp"
+        write_csv_as_parquet(raw_path, tmp_path, sep=sep)
+        os.replace(tmp_path, columnar_path)
+
+    num_rows, columns = column_stats(columnar_path)
+    meta = {
+        "file_id": file_id,
+        "filename": filename,
+        "source_path": raw_path,
+        "columnar_path": columnar_path,
+        "sep": sep,
+        "content_hash": content_hash or hash_file(raw_path),
+        "num_rows": num_rows,
+        "columns": columns,
+        "conversion_seconds": time.time() - start,
+    }
+    write_sidecar(meta, columnar_dir)
+    print(f"Converted {raw_path} -> {columnar_path} ({num_rows} rows)")
+    return meta
+
+
+def convert_upload_safe(raw_path, sep=",", content_hash=None, columnar_dir=COLUMNAR_DIR):
+    # Для фоновой задачи: при ошибке остаётся исходный файл, обучение
+    # просто читает его как раньше
+    try:
+        return convert_upload(raw_path, sep, content_hash, columnar_dir)
+    except Exception as e:
+        print(f"Failed to convert {raw_path}: {e}")
+        return None
+
+
+def resolve_columnar(data_path, sep=",", columnar_dir=COLUMNAR_DIR):
+    # Parquet-копия подходит, только если она сделана с тем же разделителем
+    try:
+        file_id, _ = split_upload_name(os.path.basename(data_path))
+    except ValueError:
+        return data_path
+    meta = read_sidecar(file_id, columnar_dir)
+    if meta is None or meta.get("sep", ",") != sep or not os.path.exists(meta["columnar_path"]):
+        return data_path
+    return meta["columnar_path"]
+
+
+def file_format(filename):
+    name = filename.lower()
+    if "parquet" in name:
+        return "parquet"
+    if name.endswith((".json", ".jsonl", ".ndjson")):
+        return "json"
+    return "csv"
+
+
+def register_upload(db, file_id, filename, path, content_hash, sep=","):
+    dataset = Dataset(
+        file_id=file_id,
+        filename=filename,
+        path=path,
+        size=os.path.getsize(path),
+        format=file_format(filename),
+        sep=sep,
+        content_hash=content_hash,
+        status=UPLOADED,
+    )
+    db.add(dataset)
+    db.commit()
+    return dataset
+
+
+def apply_sidecar(dataset, meta):
+    dataset.columnar_path = meta["columnar_path"]
+    dataset.num_rows = meta["num_rows"]
+    dataset.schema = meta["columns"]
+    dataset.content_hash = meta["content_hash"]
+    dataset.status = READY
+
+
+def convert_and_index(file_id):
+    # Фоновая задача после upload_data: своя сессия, как у воркеров очереди
+    db = SessionLocal()
+    try:
+        dataset = get_dataset(db, file_id)
+        if dataset is None or dataset.format == "json":
+            return
+        meta = convert_upload_safe(dataset.path, dataset.sep, dataset.content_hash)
+        if meta is None:
+            dataset.status = FAILED
+        else:
+            apply_sidecar(dataset, meta)
+        db.commit()
+    finally:
+        db.close()
+
+
+def get_dataset(db, file_id):
+    return db.query(Dataset).filter(Dataset.file_id == file_id).first()
+
+
+def find_dataset_by_hash(db, content_hash):
+    return (
+        db.query(Dataset)
+        .filter(Dataset.content_hash == content_hash)
+        .order_by(Dataset.id)
+        .first()
+    )
+
+
+def list_dataset_page(db, offset=0, limit=100):
+    query = db.query(Dataset)
+    total = query.count()
+    rows = (
+        query.order_by(Dataset.created_at.desc(), Dataset.id.desc())
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
+    return total, rows
+
+
+def training_path(dataset, sep=","):
+    # Parquet-копия, если она готова и сделана с тем же разделителем
+    if dataset.status == READY and dataset.sep == sep and dataset.columnar_path:
+        return dataset.columnar_path
+    return dataset.path
+
+
+def reconcile_datasets(db, data_dir=DATA_DIR, columnar_dir=COLUMNAR_DIR, convert=True):
+    # Один проход по каталогу: индексирует файлы, загруженные до появления
+    # таблицы datasets, и удаляет записи о файлах, которых больше нет на диске
+    known = {d.file_id: d for d in db.query(Dataset).all()}
+    on_disk = set()
+    added = removed = converted = 0
+
+    names = os.listdir(data_dir) if os.path.isdir(data_dir) else []
+    for name in names:
+        path = os.path.join(data_dir, name)
+        if "_" not in name or not os.path.isfile(path):
+            continue
+        file_id, filename = split_upload_name(name)
+        on_disk.add(file_id)
+        if file_id in known:
+            continue
+
+        meta = read_sidecar(file_id, columnar_dir)
+        dataset = Dataset(
+            file_id=file_id,
+            filename=filename,
+            path=path,
+            size=os.path.getsize(path),
+            format=file_format(filename),
+            sep=meta["sep"] if meta else ",",
+            content_hash=meta["content_hash"] if meta else hash_file(path),
+            status=UPLOADED,
+        )
+        if meta is None and convert and dataset.format != "json":
+            meta = convert_upload_safe(path, dataset.sep, dataset.content_hash, columnar_dir)
+            converted += meta is not None
+        if meta is not None:
+            apply_sidecar(dataset, meta)
+        db.add(dataset)
+        added += 1
+
+    for file_id, dataset in known.items():
+        if file_id not in on_disk and not os.path.exists(dataset.path):
+            db.delete(dataset)
+            removed += 1
+
+    db.commit()
+    print(f"Datasets reconciled: {added} added, {removed} removed, {converted} converted")
+    return {"added": added, "removed": removed, "converted": converted}
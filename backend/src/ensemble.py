@@ -0,0 +1,99 @@
+# ensemble.py
+
+import time
+import numpy as np
+from sklearn.base import BaseEstimator, clone
+
+# Ансамбль собирается жадно (Caruana): на каждом шаге с возвращением
+# добавляется модель, сильнее всего улучшающая out-of-fold оценку среднего
+ENSEMBLE_MAX_STEPS = 20
+
+
+def oof_score(prediction, y, task_type, classes=None):
+    # Та же метрика, что при отборе: accuracy или -RMSE
+    if task_type == "classification":
+        return float(np.mean(classes[np.argmax(prediction, axis=1)] == np.asarray(y)))
+    return -float(np.sqrt(np.mean((prediction - np.asarray(y)) ** 2)))
+
+
+def greedy_ensemble(oof, y, task_type, classes=None, max_steps=ENSEMBLE_MAX_STEPS):
+    counts = dict.fromkeys(oof, 0)
+    total, current, history = None, None, []
+    single = {name: oof_score(pred, y, task_type, classes) for name, pred in oof.items()}
+    for step in range(1, max_steps + 1):
+        best_name, best_score = None, current
+        for name, pred in oof.items():
+            candidate = pred if total is None else total + pred
+            score = oof_score(candidate / step, y, task_type, classes)
+            if best_score is None or score > best_score:
+                best_name, best_score = name, score
+        # Ни одна модель не улучшает ансамбль — дальше только дрейф весов
+        if best_name is None:
+            break
+        total = oof[best_name] if total is None else total + oof[best_name]
+        counts[best_name] += 1
+        current = best_score
+        history.append({"model": best_name, "score": best_score})
+
+    n_steps = sum(counts.values())
+    weights = {name: count / n_steps for name, count in counts.items() if count}
+    return weights, {
+        "oof_score": current,
+        "single_oof_scores": single,
+        "steps": history,
+    }
+
+
+class EnsembleModel(BaseEstimator):
+    # Взвешенное среднее обученных пайплайнов: вероятности классов для
+    # классификации, предсказания для регрессии. Каждый участник сам
+    # масштабирует/приводит признаки (create_pipeline).
+
+    # С prefit=True участники уже обучены и fit их не переобучает
+
+    def __init__(self, members=None, weights=None, task_type="classification",
+                 prefit=False):
+        self.members = members
+        self.weights = weights
+        self.task_type = task_type
+        self.prefit = prefit
+
+    def fit(self, X, y):
+        if self.prefit:
+            self.members_ = list(self.members)
+        else:
+            self.members_ = [(name, clone(member).fit(X, y)) for name, member in self.members]
+        if self.task_type == "classification":
+            self.classes_ = self.members_[0][1].classes_
+        return self
+
+    def predict_proba(self, X):
+        return sum(
+            self.weights[name] * member.predict_proba(X) for name, member in self.members_
+        )
+
+    def predict(self, X):
+        if self.task_type == "classification":
+            return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+        return sum(self.weights[name] * member.predict(X) for name, member in self.members_)
+
+
+def inference_cost(model, X, repeats=3, single_rows=20):
+    # Пакетное предсказание (мкс на строку) и задержка одной строки (мс),
+    # как в /predict без микробатчинга
+    n_rows = X.shape[0]
+    batch = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict(X)
+        batch.append(time.perf_counter() - start)
+    single = []
+    for i in range(min(single_rows, n_rows)):
+        row = X.iloc[i:i + 1] if hasattr(X, "iloc") else X[i:i + 1]
+        start = time.perf_counter()
+        model.predict(row)
+        single.append(time.perf_counter() - start)
+    return {
+        "batch_us_per_row": float(np.median(batch)) / max(n_rows, 1) * 1e6,
+        "single_row_ms": float(np.median(single)) * 1e3 if single else None,
+    }
@@ -0,0 +1,207 @@
+# fold_cache.py
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+# Параметры, которые влияют на скорость, но не на результат фолда
+IGNORED_PARAMS = ("n_jobs", "nthread", "callbacks", "verbose", "verbosity")
+
+
+def data_fingerprint(X, y):
+    # Хэш самой обучающей матрицы (после кодирования и разбиения): от неё
+    # зависят и разбиение на фолды, и оценки
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(c) for c in getattr(X, "columns", [])]).encode())
+    if sp.issparse(X):
+        X = sp.csr_matrix(X)
+        digest.update(json.dumps(X.shape).encode())
+        for part in (X.data, X.indices, X.indptr):
+            digest.update(np.ascontiguousarray(part).tobytes())
+    else:
+        X = pd.DataFrame(X)
+        digest.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    digest.update(pd.util.hash_pandas_object(pd.Series(np.asarray(y)), index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def canonical_params(model):
+    params = {
+        k: v for k, v in model.get_params(deep=False).items() if k not in IGNORED_PARAMS
+    }
+    return json.dumps(params, sort_keys=True, default=repr)
+
+
+def estimator_key(model):
+    cls = type(model)
+    return f"{cls.__module__}.{cls.__name__}:{canonical_params(model)}"
+
+
+def cv_spec(cv, scoring):
+    return f"{cv!r}:{scoring}"
+
+
+def fold_keys(data_key, cv, scoring, model, n_folds):
+    base = f"{data_key}|{cv_spec(cv, scoring)}|{estimator_key(model)}"
+    return [
+        hashlib.sha256(f"{base}|fold={i}".encode()).hexdigest() for i in range(n_folds)
+    ]
+
+
+class FoldCache:
+    # Оценки фолдов в SQLite-файле: общий кэш для отбора моделей, триалов
+    # Optuna (в том числе в дочерних процессах) и последующих запусков.
+    # При переполнении удаляются записи, к которым дольше всего не обращались.
+
+    def __init__(self, path="cache/fold_scores.db", max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # Счётчики в пределах процесса
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        # Соединение не переносится в spawn-процессы — там откроется своё
+        return {"path": self.path, "max_entries": self.max_entries}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _connect(self):
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS folds "
+                "(key TEXT PRIMARY KEY, score REAL, fit_seconds REAL, accessed REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS folds_accessed ON folds (accessed)")
+            # Кэши, созданные до ранней остановки, получают колонку на месте
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(folds)")]
+            if "iterations" not in columns:
+                conn.execute("ALTER TABLE folds ADD COLUMN iterations INTEGER")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS trials "
+                "(id INTEGER PRIMARY KEY, study_key TEXT, params TEXT, "
+                "distributions TEXT, value REAL, created REAL, "
+                "UNIQUE (study_key, params))"
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(trials)")]
+            if "best_iteration" not in columns:
+                conn.execute("ALTER TABLE trials ADD COLUMN best_iteration INTEGER")
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        with self._lock:
+            conn = self._connect()
+            marks = ",".join("?" * len(keys))
+            rows = conn.execute(
+                f"SELECT key, score FROM folds WHERE key IN ({marks})", list(keys)
+            ).fetchall()
+            if rows:
+                conn.execute(
+                    f"UPDATE folds SET accessed = ? WHERE key IN ({marks})",
+                    [time.time()] + [k for k, _ in rows],
+                )
+                conn.commit()
+            self.hits += len(rows)
+            self.misses += len(keys) - len(rows)
+        return dict(rows)
+
+    def get_iterations(self, keys):
+        # Число итераций бустинга, выбранное ранней остановкой на фолде
+        if not keys:
+            return {}
+        with self._lock:
+            marks = ",".join("?" * len(keys))
+            rows = self._connect().execute(
+                f"SELECT key, iterations FROM folds "
+                f"WHERE key IN ({marks}) AND iterations IS NOT NULL",
+                list(keys),
+            ).fetchall()
+        return dict(rows)
+
+    def put_many(self, scores, fit_seconds=0.0, iterations=None):
+        if not scores:
+            return
+        iterations = iterations or {}
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO folds (key, score, fit_seconds, accessed, iterations) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(k, float(v), fit_seconds, now, iterations.get(k)) for k, v in scores.items()],
+            )
+            self._evict(conn, "folds", "accessed")
+            conn.commit()
+
+    def add_trial(self, study_key, params, distributions, value, best_iteration=None):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO trials "
+                "(study_key, params, distributions, value, created, best_iteration) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    study_key,
+                    json.dumps(params, sort_keys=True),
+                    json.dumps(distributions, sort_keys=True),
+                    float(value),
+                    time.time(),
+                    best_iteration,
+                ),
+            )
+            self._evict(conn, "trials", "created")
+            conn.commit()
+
+    def load_trials(self, study_key, limit=100):
+        # Лучшие завершённые триалы прошлых запусков (study минимизирует)
+        # вместе с числом деревьев, выбранным ранней остановкой
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT params, distributions, value, best_iteration FROM trials "
+                "WHERE study_key = ? ORDER BY value LIMIT ?",
+                (study_key, limit),
+            ).fetchall()
+        return [(json.loads(p), json.loads(d), v, it) for p, d, v, it in rows]
+
+    def _evict(self, conn, table, order_column):
+        (count,) = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            conn.execute(
+                f"DELETE FROM {table} WHERE rowid IN "
+                f"(SELECT rowid FROM {table} ORDER BY {order_column} LIMIT ?)",
+                (excess,),
+            )
+
+    def stats(self):
+        with self._lock:
+            conn = self._connect()
+            (folds,) = conn.execute("SELECT COUNT(*) FROM folds").fetchone()
+            (trials,) = conn.execute("SELECT COUNT(*) FROM trials").fetchone()
+        return {"path": self.path, "max_entries": self.max_entries,
+                "folds": folds, "trials": trials,
+                "hits": self.hits, "misses": self.misses}
+
+
+def default_fold_cache():
+    return FoldCache(
+        path=os.getenv("FOLD_CACHE_PATH", "cache/fold_scores.db"),
+        max_entries=int(os.getenv("FOLD_CACHE_MAX_ENTRIES", 100000)),
+    )
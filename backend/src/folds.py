@@ -0,0 +1,224 @@
+# folds.py
+
+import os
+import time
+import shutil
+import tempfile
+import weakref
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from joblib import Parallel, delayed, parallel_backend
+from sklearn.base import clone
+from sklearn.metrics import get_scorer
+from .utils import get_cv, is_tree_model, supports_native_categorical
+from .preprocessing import CategoricalCaster, Float32Scaler
+from .resources import set_estimator_threads, split_threads
+
+# Варианты матриц фолда: отмасштабированные (как после create_pipeline),
+# без масштабирования (деревья) и с category-колонками (LightGBM/XGBoost)
+SCALED = "scaled"
+RAW = "raw"
+CATEGORICAL = "categorical"
+# Разреженная матрица фолда хранится тремя плоскими массивами CSR
+CSR_PARTS = ("data", "indices", "indptr")
+
+
+def fold_kind(model, model_aware=False, categorical_features=None):
+    if not model_aware or not is_tree_model(model):
+        return SCALED
+    if categorical_features and supports_native_categorical(model):
+        return CATEGORICAL
+    return RAW
+
+
+class FoldSet:
+    # Разбиение на фолды считается один раз за запуск. Матрицы фолдов лежат
+    # на диске как float32 .npy и открываются через memmap — триалы и
+    # дочерние процессы не копируют и не пиклят данные. Масштабированный
+    # вариант (StandardScaler обучен на каждом фолде) готовится один раз,
+    # при первом запросе.
+
+    def __init__(self, X, y, task_type, n_splits=5, scratch_dir=None,
+                 model_aware=False, categorical_features=None):
+        start = time.time()
+        self.task_type = task_type
+        self.n_splits = n_splits
+        self.cv, self.scoring = get_cv(task_type, n_splits)
+        self.model_aware = model_aware
+        self.categorical_features = dict(categorical_features or {})
+        self.feature_names = list(X.columns) if hasattr(X, "columns") else None
+        self.dir = tempfile.mkdtemp(
+            prefix="automl_folds_", dir=scratch_dir or os.getenv("FOLDS_DIR")
+        )
+        self.owner_pid = os.getpid()
+        # Каталог удалится и при исключении в пайплайне — при сборке мусора
+        # или выходе из процесса
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.dir, True)
+
+        # Разреженные признаки (SparseOneHotEncoder) так и остаются CSR
+        self.sparse = sp.issparse(X)
+        X = sp.csr_matrix(X, dtype=np.float32) if self.sparse else np.asarray(X, dtype=np.float32)
+        self.n_features = X.shape[1]
+        y = np.asarray(y)
+        self.n_rows = len(y)
+        self.classes = np.unique(y) if task_type == "classification" else None
+        self.splits = list(self.cv.split(X, y))
+        self.nbytes = 0
+        for i, (train_idx, val_idx) in enumerate(self.splits):
+            self._save(i, RAW, "X_train", X[train_idx])
+            self._save(i, RAW, "X_val", X[val_idx])
+            self._save(i, None, "y_train", y[train_idx])
+            self._save(i, None, "y_val", y[val_idx])
+        self.kinds = [RAW]
+        self.scalers = []
+        self._open()
+        self.materialize_seconds = time.time() - start
+
+    def _path(self, i, kind, name, part=None):
+        prefix = f"{i}_{kind}" if kind else str(i)
+        suffix = f".{part}" if part else ""
+        return os.path.join(self.dir, f"{prefix}_{name}{suffix}.npy")
+
+    def _save(self, i, kind, name, array):
+        if sp.issparse(array):
+            array = sp.csr_matrix(array)
+            for part in CSR_PARTS:
+                np.save(self._path(i, kind, name, part), getattr(array, part))
+                self.nbytes += getattr(array, part).nbytes
+            return
+        np.save(self._path(i, kind, name), np.ascontiguousarray(array))
+        self.nbytes += array.nbytes
+
+    def _load(self, i, kind, name):
+        if kind is not None and self.sparse:
+            # CSR поверх memmap-массивов: индексы уже int32 и отсортированы,
+            # scipy их не копирует и не переставляет
+            data, indices, indptr = (
+                np.load(self._path(i, kind, name, part), mmap_mode="r") for part in CSR_PARTS
+            )
+            return sp.csr_matrix(
+                (data, indices, indptr), shape=(len(indptr) - 1, self.n_features)
+            )
+        return np.load(self._path(i, kind, name), mmap_mode="r")
+
+    def _open(self):
+        self._arrays = {
+            kind: [
+                {
+                    "X_train": self._load(i, kind, "X_train"),
+                    "X_val": self._load(i, kind, "X_val"),
+                    "y_train": self._load(i, None, "y_train"),
+                    "y_val": self._load(i, None, "y_val"),
+                }
+                for i in range(len(self.splits))
+            ]
+            for kind in self.kinds
+        }
+        self._frames = None
+
+    def prepare(self, kind):
+        # Вызывать в основном процессе до запуска воркеров: дочерние
+        # процессы получают уже готовые файлы
+        if kind == SCALED and SCALED not in self.kinds:
+            start = time.time()
+            for i, fold in enumerate(self._arrays[RAW]):
+                scaler = Float32Scaler(with_mean=not self.sparse)
+                self._save(i, SCALED, "X_train", scaler.fit_transform(fold["X_train"]))
+                self._save(i, SCALED, "X_val", scaler.transform(fold["X_val"]))
+                self.scalers.append(scaler)
+            self.kinds.append(SCALED)
+            self._open()
+            self.materialize_seconds += time.time() - start
+
+    def kind_for(self, model):
+        return fold_kind(model, self.model_aware, self.categorical_features)
+
+    def folds(self, kind=SCALED):
+        if kind == CATEGORICAL:
+            return self._categorical_folds()
+        self.prepare(kind)
+        return self._arrays[kind]
+
+    def _categorical_folds(self):
+        # DataFrame с category-колонками собирается один раз на процесс
+        if self._frames is None:
+            caster = CategoricalCaster(self.categorical_features)
+            self._frames = [
+                {
+                    "X_train": caster.transform(pd.DataFrame(fold["X_train"], columns=self.feature_names)),
+                    "X_val": caster.transform(pd.DataFrame(fold["X_val"], columns=self.feature_names)),
+                    "y_train": fold["y_train"],
+                    "y_val": fold["y_val"],
+                }
+                for fold in self._arrays[RAW]
+            ]
+        return self._frames
+
+    def __getstate__(self):
+        # В spawn-процесс уходят только пути, данные открываются там же с диска
+        state = self.__dict__.copy()
+        for key in ("_arrays", "_frames", "_cleanup"):
+            state.pop(key)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+    def __len__(self):
+        return len(self.splits)
+
+    def stats(self):
+        return {
+            "n_splits": len(self.splits),
+            "kinds": list(self.kinds),
+            "bytes": self.nbytes,
+            "materialize_seconds": self.materialize_seconds,
+        }
+
+    def close(self):
+        self._arrays, self._frames = {}, None
+        # Удаляет только создавший процесс, не дочерние воркеры
+        if os.getpid() == self.owner_pid and hasattr(self, "_cleanup"):
+            self._cleanup()
+
+
+def fold_predictions(fitted, X_val, classes=None):
+    # Вероятности по всем классам выборки: в фолде какого-то класса может
+    # не оказаться, тогда его колонка нулевая
+    if classes is None:
+        return fitted.predict(X_val)
+    proba = np.zeros((X_val.shape[0], len(classes)))
+    proba[:, np.searchsorted(classes, fitted.classes_)] = fitted.predict_proba(X_val)
+    return proba
+
+
+def score_folds(model, folds, n_jobs=1, return_oof=False):
+    scorer = get_scorer(folds.scoring)
+    outer, inner = split_threads(n_jobs, len(folds))
+    model = set_estimator_threads(clone(model), inner)
+
+    def fit_and_score(fold):
+        fitted = clone(model).fit(fold["X_train"], fold["y_train"])
+        score = scorer(fitted, fold["X_val"], fold["y_val"])
+        if not return_oof:
+            return score, None
+        return score, fold_predictions(fitted, fold["X_val"], folds.classes)
+
+    # Потоки вместо процессов: модели отпускают GIL в fit, а CPU-время
+    # остаётся в учёте процесса.
+    with parallel_backend("threading", n_jobs=outer):
+        results = Parallel(n_jobs=outer)(
+            delayed(fit_and_score)(f) for f in folds.folds(folds.kind_for(model))
+        )
+    scores = np.array([score for score, _ in results])
+    if not return_oof:
+        return scores
+
+    # Out-of-fold предсказания в порядке строк обучающей выборки
+    first = results[0][1]
+    oof = np.zeros((folds.n_rows,) + first.shape[1:])
+    for (_, val_idx), (_, prediction) in zip(folds.splits, results):
+        oof[val_idx] = prediction
+    return scores, oof
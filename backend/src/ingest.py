@@ -0,0 +1,183 @@
+# ingest.py
+
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from sklearn.model_selection import train_test_split
+from .preprocessing import FeatureEncoder, NULL_VALUES
+
+CHUNK_SIZE = 100000
+
+
+def iter_raw_chunks(file_path, sep=",", chunk_size=CHUNK_SIZE):
+    if "parquet" in file_path:
+        for batch in pq.ParquetFile(file_path, memory_map=True).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(
+            file_path, sep=sep, chunksize=chunk_size, na_values=NULL_VALUES, keep_default_na=False
+        )
+
+
+class ChunkDictionary:
+    # Словарь категорий, который растёт от куска к куску. Коды выдаются в
+    # порядке появления, в конце переводятся в отсортированный порядок,
+    # чтобы совпасть с FeatureEncoder/encode_target.
+
+    def __init__(self):
+        self.values = pd.Index([], dtype=object)
+
+    def encode(self, column):
+        column = column.astype(str)
+        codes = self.values.get_indexer(column)
+        unseen = codes == -1
+        if unseen.any():
+            self.values = self.values.append(pd.Index(pd.unique(column[unseen])))
+            codes[unseen] = self.values.get_indexer(column[unseen])
+        return codes
+
+    def sorted_index(self):
+        return pd.Index(np.sort(self.values.to_numpy(dtype=str)))
+
+    def remap(self):
+        # старый код -> код в отсортированном словаре
+        return self.sorted_index().get_indexer(self.values)
+
+
+def clean_chunk(chunk, column_names, numeric_columns):
+    if column_names is not None:
+        chunk.columns = column_names
+    chunk = chunk.loc[:, ~chunk.columns.str.contains("^Unnamed")]
+    chunk = chunk.replace("?", pd.NA)
+    if numeric_columns is not None:
+        # Тип колонки фиксируется по первому куску, в остальных приводим к нему.
+        # Нечисловое значение — не пропуск, а конфликт типов: молча выкинуть
+        # такие строки значило бы обучаться не на тех данных
+        for col in numeric_columns:
+            values = pd.to_numeric(chunk[col], errors="coerce")
+            conflicts = values.isna() & chunk[col].notna()
+            if conflicts.any():
+                raise ValueError(
+                    f"Колонка {col} числовая в первом куске, но содержит значение "
+                    f"{chunk[col][conflicts].iloc[0]!r}. Используйте обычную загрузку "
+                    f"(streaming=False)."
+                )
+            chunk[col] = values
+    return chunk.dropna()
+
+
+def split_matrix(X, y, scratch_dir=None, chunk_size=CHUNK_SIZE):
+    # То же разбиение, что split_data, но по индексам: строки train/val
+    # копируются кусками в отдельные memmap-файлы, в память целиком
+    # не попадает ни одна из частей
+    train_idx, val_idx = train_test_split(np.arange(len(y)), test_size=0.2, random_state=42)
+    columns = list(X.columns)
+    values = X.to_numpy(copy=False)
+    parts = []
+    for index in (train_idx, val_idx):
+        scratch = tempfile.NamedTemporaryFile(
+            prefix="automl_matrix_", suffix=".f32", dir=scratch_dir, delete=False
+        )
+        scratch.close()
+        part = np.memmap(scratch.name, dtype=np.float32, mode="w+",
+                         shape=(len(index), len(columns)))
+        os.remove(scratch.name)
+        for start in range(0, len(index), chunk_size):
+            part[start:start + chunk_size] = values[index[start:start + chunk_size]]
+        parts.append(pd.DataFrame(part, columns=columns, copy=False))
+    if isinstance(y, pd.Series):
+        # Индекс как у частей матрицы (0..n-1)
+        y_train = y.iloc[train_idx].reset_index(drop=True)
+        y_val = y.iloc[val_idx].reset_index(drop=True)
+    else:
+        y_train, y_val = y[train_idx], y[val_idx]
+    return parts[0], parts[1], y_train, y_val
+
+
+def load_training_matrix(file_path, target_column, column_names=None, sep=",",
+                         chunk_size=CHUNK_SIZE, scratch_dir=None):
+    # Читает файл кусками и собирает float32-матрицу признаков в memmap:
+    # в памяти одновременно держится только один кусок исходных данных.
+    scratch = tempfile.NamedTemporaryFile(
+        prefix="automl_matrix_", suffix=".f32", dir=scratch_dir, delete=False
+    )
+    feature_columns = None
+    numeric_columns = None
+    dictionaries = {}
+    target_dictionary = None
+    target_chunks = []
+    n_rows = 0
+    n_dropped = 0
+    n_chunks = 0
+
+    with scratch:
+        for raw in iter_raw_chunks(file_path, sep, chunk_size):
+            chunk = clean_chunk(raw, column_names, numeric_columns)
+            n_dropped += len(raw) - len(chunk)
+            del raw
+            if feature_columns is None:
+                feature_columns = [c for c in chunk.columns if c != target_column]
+                numeric_columns = [
+                    c for c in chunk.columns if pd.api.types.is_numeric_dtype(chunk[c])
+                ]
+                dictionaries = {
+                    c: ChunkDictionary() for c in feature_columns if c not in numeric_columns
+                }
+                if target_column not in numeric_columns:
+                    target_dictionary = ChunkDictionary()
+
+            matrix = np.empty((len(chunk), len(feature_columns)), dtype=np.float32)
+            for j, col in enumerate(feature_columns):
+                if col in dictionaries:
+                    matrix[:, j] = dictionaries[col].encode(chunk[col])
+                else:
+                    matrix[:, j] = chunk[col].to_numpy(dtype=np.float32)
+            matrix.tofile(scratch)
+
+            target = chunk[target_column]
+            if target_dictionary is not None:
+                target_chunks.append(target_dictionary.encode(target).astype(np.int32))
+            else:
+                target_chunks.append(target.to_numpy(dtype=np.float64))
+
+            n_rows += len(chunk)
+            n_chunks += 1
+
+    if feature_columns is None or n_rows == 0:
+        os.remove(scratch.name)
+        raise ValueError("После очистки данных не осталось ни одной строки.")
+
+    X = np.memmap(scratch.name, dtype=np.float32, mode="r+",
+                  shape=(n_rows, len(feature_columns)))
+    # На POSIX отображение живёт и после удаления файла — временный файл
+    # исчезнет вместе с последней ссылкой на матрицу.
+    os.remove(scratch.name)
+
+    encoder = FeatureEncoder()
+    encoder.feature_names_in_ = np.asarray(feature_columns, dtype=object)
+    encoder.categories_ = {}
+    for j, col in enumerate(feature_columns):
+        if col in dictionaries:
+            remap = dictionaries[col].remap().astype(np.float32)
+            X[:, j] = remap[X[:, j].astype(np.int64)]
+            encoder.categories_[col] = dictionaries[col].sorted_index()
+
+    y = np.concatenate(target_chunks)
+    target_classes = None
+    if target_dictionary is not None:
+        y = target_dictionary.remap()[y]
+        target_classes = target_dictionary.sorted_index().to_numpy()
+    else:
+        y = pd.Series(y, name=target_column)
+
+    stats = {
+        "rows": n_rows,
+        # Строки с пропусками, выброшенные dropna
+        "dropped_rows": n_dropped,
+        "columns": len(feature_columns),
+        "chunks": n_chunks,
+        "matrix_bytes": int(X.nbytes),
+    }
+    return pd.DataFrame(X, columns=feature_columns, copy=False), y, encoder, target_classes, stats
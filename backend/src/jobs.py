@@ -0,0 +1,256 @@
+# jobs.py
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import signal
+import socket
+import multiprocessing
+from datetime import datetime, timedelta
+from .database import SessionLocal
+from .models import Report
+from .pipeline import run_pipeline
+from .resources import available_cores
+from .model_cache import model_version
+from .tracking import run_logger
+
+QUEUED = "Queued"
+RUNNING = "Running"
+COMPLETED = "Completed"
+CANCELLED = "Cancelled"
+
+
+# Параметры, которые влияют только на скорость, а не на результат
+EXECUTION_PARAMS = ("n_cores", "tuning_workers", "chunk_size", "use_fold_cache")
+CACHE_LIBRARIES = ("sklearn", "xgboost", "lightgbm", "optuna", "numpy", "pandas")
+
+
+def library_versions():
+    import importlib
+    return {name: importlib.import_module(name).__version__ for name in CACHE_LIBRARIES}
+
+
+def pipeline_cache_key(content_hash, params):
+    search = {k: v for k, v in params.items() if k not in EXECUTION_PARAMS}
+    payload = {
+        "dataset": content_hash,
+        "params": search,
+        "libraries": library_versions(),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def find_cached_job(db, cache_key):
+    # Та же задача уже в очереди/выполняется — возвращаем её. Готовый
+    # результат годится, только если модель на диске не перезаписана.
+    jobs = (
+        db.query(Report)
+        .filter(Report.cache_key == cache_key, Report.status.in_([QUEUED, RUNNING, COMPLETED]))
+        .order_by(Report.created_at.desc(), Report.id.desc())
+        .all()
+    )
+    for job in jobs:
+        if job.status != COMPLETED:
+            return job
+        model_path = f"models/{job.dataset_name}_{job.model_name}"
+        if os.path.exists(model_path) and job.model_version == model_version(model_path):
+            return job
+    return None
+
+
+def enqueue_job(db, data_path, params, priority=0, cache_key=None):
+    job = Report(
+        report_id=str(uuid.uuid4()),
+        task_id=str(uuid.uuid4()),
+        status=QUEUED,
+        data_path=data_path,
+        params=params,
+        priority=priority,
+        cancel_requested=False,
+        cache_key=cache_key,
+    )
+    db.add(job)
+    db.commit()
+    return job
+
+
+def claim_next_job(db, worker_id):
+    candidates = (
+        db.query(Report.id)
+        .filter(Report.status == QUEUED)
+        .order_by(Report.priority.desc(), Report.created_at, Report.id)
+        .limit(10)
+        .all()
+    )
+    for (job_id,) in candidates:
+        # Условный UPDATE работает как захват и в Postgres, и в SQLite:
+        # задачу получает только тот воркер, у которого обновилась строка.
+        now = datetime.utcnow()
+        claimed = (
+            db.query(Report)
+            .filter(Report.id == job_id, Report.status == QUEUED)
+            .update(
+                {
+                    Report.status: RUNNING,
+                    Report.worker_id: worker_id,
+                    Report.started_at: now,
+                    Report.heartbeat_at: now,
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        if claimed:
+            return db.query(Report).filter(Report.id == job_id).first()
+    return None
+
+
+def finish_job(db, job_id, status):
+    db.query(Report).filter(Report.id == job_id).update(
+        {Report.status: status, Report.finished_at: datetime.utcnow()},
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def cancel_job(db, task_id):
+    job = db.query(Report).filter(Report.task_id == task_id).first()
+    if job is None:
+        return None
+    if job.status == QUEUED:
+        job.status = CANCELLED
+        job.finished_at = datetime.utcnow()
+    elif job.status == RUNNING:
+        job.cancel_requested = True
+    db.commit()
+    return job
+
+
+def requeue_stale_jobs(db, stale_after):
+    # Задачи упавших воркеров (нет heartbeat) возвращаются в очередь.
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+    requeued = (
+        db.query(Report)
+        .filter(Report.status == RUNNING, Report.heartbeat_at < cutoff)
+        .update(
+            {Report.status: QUEUED, Report.worker_id: None},
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return requeued
+
+
+def _raise_system_exit(signum, frame):
+    raise SystemExit(1)
+
+
+def execute_job(job_id, n_cores=None):
+    # Каждая задача — отдельный процесс со своей сессией БД.
+    signal.signal(signal.SIGTERM, _raise_system_exit)
+    db = SessionLocal()
+    try:
+        job = db.query(Report).filter(Report.id == job_id).first()
+        params = dict(job.params or {})
+        if params.get("n_cores") is None:
+            params["n_cores"] = n_cores
+        try:
+            run_pipeline(
+                data_path=job.data_path,
+                column_names=None,
+                report_id=job.report_id,
+                db=db,
+                **params,
+            )
+            finish_job(db, job_id, COMPLETED)
+        except Exception as e:
+            db.rollback()
+            finish_job(db, job_id, f"Error: {str(e)}")
+    finally:
+        db.close()
+        # Задача уже завершена, процесс только дожидается выгрузки в MLflow
+        run_logger.flush()
+
+
+class WorkerPool:
+    def __init__(self, concurrency=1, poll_interval=1.0, stale_after=60,
+                 cores_per_job=None):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        # Пайплайны идут в разных процессах, поэтому ядра делим заранее.
+        self.cores_per_job = cores_per_job or max(1, available_cores() // concurrency)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.running = {}
+        self.ctx = multiprocessing.get_context("spawn")
+
+    def run_forever(self):
+        print(
+            f"Worker pool {self.worker_id}: concurrency={self.concurrency}, "
+            f"cores_per_job={self.cores_per_job}"
+        )
+        db = SessionLocal()
+        try:
+            while True:
+                self.poll(db)
+                time.sleep(self.poll_interval)
+        finally:
+            for process in self.running.values():
+                process.terminate()
+            db.close()
+
+    def poll(self, db):
+        db.expire_all()
+        self.reap(db)
+        self.heartbeat(db)
+        self.handle_cancellations(db)
+        requeue_stale_jobs(db, self.stale_after)
+        self.fill(db)
+
+    def fill(self, db):
+        while len(self.running) < self.concurrency:
+            job = claim_next_job(db, self.worker_id)
+            if job is None:
+                return
+            print(f"Starting job {job.task_id} (priority {job.priority})")
+            process = self.ctx.Process(
+                target=execute_job, args=(job.id, self.cores_per_job)
+            )
+            process.start()
+            self.running[job.id] = process
+
+    def reap(self, db):
+        for job_id, process in list(self.running.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            del self.running[job_id]
+            if process.exitcode != 0:
+                job = db.query(Report).filter(Report.id == job_id).first()
+                if job and job.status == RUNNING:
+                    finish_job(db, job_id, f"Error: worker exited with code {process.exitcode}")
+
+    def heartbeat(self, db):
+        if not self.running:
+            return
+        db.query(Report).filter(Report.id.in_(list(self.running))).update(
+            {Report.heartbeat_at: datetime.utcnow()}, synchronize_session=False
+        )
+        db.commit()
+
+    def handle_cancellations(self, db):
+        if not self.running:
+            return
+        cancelled = (
+            db.query(Report.id)
+            .filter(Report.id.in_(list(self.running)), Report.cancel_requested.is_(True))
+            .all()
+        )
+        for (job_id,) in cancelled:
+            process = self.running.pop(job_id)
+            process.terminate()
+            process.join()
+            finish_job(db, job_id, CANCELLED)
+            print(f"Cancelled job {job_id}")
@@ -0,0 +1,141 @@
+# model_cache.py
+
+import os
+import threading
+from collections import OrderedDict
+from .model_store import load_model, META_FILE, VERSIONS_DIR
+
+
+def model_version(model_path):
+    # Каждая версия пишется в новый каталог, поэтому время изменения
+    # MLmodel / model.json однозначно определяет версию на диске.
+    for name in ("MLmodel", META_FILE):
+        marker = os.path.join(model_path, name)
+        if os.path.exists(marker):
+            return os.stat(marker).st_mtime_ns
+    return os.stat(model_path).st_mtime_ns
+
+
+def model_size(model_path):
+    total = 0
+    for root, _, files in os.walk(model_path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+class ModelCache:
+    def __init__(self, max_bytes=1024 ** 3, loader=load_model):
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Блокировки загрузки по путям моделей
+        self._loading = {}
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_cached(self, model_path):
+        # Без загрузки с диска: None, если модели в кэше нет или она устарела
+        entry = self._lookup(model_path, model_version(model_path))
+        return entry["model"] if entry is not None else None
+
+    def get(self, model_path):
+        version = model_version(model_path)
+        entry = self._lookup(model_path, version)
+        if entry is not None:
+            return entry["model"]
+        # Одна загрузка на путь: параллельные холодные запросы ждут её,
+        # а не читают модель с диска каждый сам
+        with self._path_lock(model_path):
+            entry = self._lookup(model_path, version)
+            if entry is not None:
+                return entry["model"]
+            with self._lock:
+                self.misses += 1
+                if model_path in self._entries:
+                    self._drop(model_path)
+                    self.invalidations += 1
+            model = self.loader(model_path)
+            self.put(model_path, model, version)
+        return model
+
+    def _lookup(self, model_path, version):
+        with self._lock:
+            entry = self._entries.get(model_path)
+            if entry is None or entry["version"] != version:
+                return None
+            self._entries.move_to_end(model_path)
+            self.hits += 1
+            return entry
+
+    def _path_lock(self, model_path):
+        with self._lock:
+            return self._loading.setdefault(model_path, threading.Lock())
+
+    def put(self, model_path, model, version=None):
+        version = version if version is not None else model_version(model_path)
+        size = model_size(model_path)
+        with self._lock:
+            if model_path in self._entries:
+                self._drop(model_path)
+            if size > self.max_bytes:
+                # Не влезает даже в пустой кэш — отдаём без кэширования.
+                return
+            self._entries[model_path] = {"model": model, "version": version, "size": size}
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, model_path):
+        with self._lock:
+            if model_path in self._entries:
+                self._drop(model_path)
+                self.invalidations += 1
+
+    def _drop(self, model_path):
+        entry = self._entries.pop(model_path)
+        self.current_bytes -= entry["size"]
+
+    def warm_up(self, models_dir="models", limit=3):
+        if not os.path.isdir(models_dir):
+            return []
+        paths = [
+            os.path.join(models_dir, name)
+            for name in os.listdir(models_dir)
+            # Каталог версий и недоделанные симлинки не загружаем
+            if os.path.isdir(os.path.join(models_dir, name))
+            and name != VERSIONS_DIR and ".tmp-" not in name
+        ]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        loaded = []
+        for path in paths[:limit]:
+            try:
+                self.get(path)
+                loaded.append(path)
+            except Exception as e:
+                print(f"Failed to preload {path}: {e}")
+        return loaded
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "models": list(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+model_cache = ModelCache(
+    max_bytes=int(os.getenv("MODEL_CACHE_BYTES", 1024 ** 3)),
+)
@@ -0,0 +1,105 @@
+# model_store.py
+
+import os
+import json
+import time
+import uuid
+import shutil
+import importlib.metadata
+import joblib
+import mlflow.sklearn
+
+# Формат сохранения: "mlflow" (каталог MLflow-модели с cloudpickle и
+# закреплёнными версиями пакетов) — он же без пересохранения уходит в run
+# MLflow артефактом model, и runs:/<id>/model открывается
+# mlflow.sklearn.load_model. "joblib" (model.joblib, compress — уровень
+# zlib, 0 — без сжатия, массивы при загрузке отображаются в память)
+# быстрее загружается, но в run попадает как есть, без MLmodel
+# (benchmarks/bench_model_formats.py).
+MODEL_FORMAT = os.getenv("MODEL_FORMAT", "mlflow")
+MODEL_COMPRESS = int(os.getenv("MODEL_COMPRESS", 0))
+MODEL_FORMATS = ("joblib", "mlflow")
+
+# Каждое сохранение пишется в новый каталог models/.versions/<имя>/<версия>,
+# а models/<имя> — симлинк, который переключается атомарно. Старые версии
+# хранятся, пока их могут дочитывать уже начатые загрузки.
+VERSIONS_DIR = ".versions"
+MODEL_VERSIONS_KEEP = 3
+
+JOBLIB_FILE = "model.joblib"
+META_FILE = "model.json"
+REQUIREMENT_PACKAGES = (
+    "mlflow", "cloudpickle", "joblib", "numpy", "pandas", "scipy",
+    "scikit-learn", "xgboost", "lightgbm",
+)
+
+
+def requirements():
+    # Явный список вместо автоопределения MLflow: то загружает модель
+    # в отдельном процессе и занимает секунды на каждое сохранение
+    pinned = []
+    for package in REQUIREMENT_PACKAGES:
+        try:
+            pinned.append(f"{package}=={importlib.metadata.version(package)}")
+        except importlib.metadata.PackageNotFoundError:
+            pass
+    return pinned
+
+
+def write_model(model, directory, fmt=MODEL_FORMAT, compress=MODEL_COMPRESS):
+    if fmt == "mlflow":
+        mlflow.sklearn.save_model(model, directory, pip_requirements=requirements())
+    elif fmt == "joblib":
+        os.makedirs(directory)
+        joblib.dump(model, os.path.join(directory, JOBLIB_FILE), compress=compress)
+        meta = {"format": fmt, "compress": compress, "requirements": requirements()}
+        with open(os.path.join(directory, META_FILE), "w") as f:
+            json.dump(meta, f, indent=2)
+    else:
+        raise ValueError(f"Формат модели {fmt} не поддерживается.")
+
+
+def versions_dir(model_path):
+    parent, name = os.path.split(os.path.normpath(model_path))
+    return os.path.join(parent, VERSIONS_DIR, name)
+
+
+def swap_link(model_path, target):
+    # os.replace атомарно подменяет симлинк: /predict видит либо старую,
+    # либо новую модель, но никогда пустой каталог
+    link = f"{model_path}.tmp-{uuid.uuid4().hex}"
+    os.symlink(target, link)
+    os.replace(link, model_path)
+
+
+def prune_versions(versions, current, keep=MODEL_VERSIONS_KEEP):
+    names = sorted(os.listdir(versions), key=int)
+    for name in names[:-keep]:
+        path = os.path.join(versions, name)
+        if os.path.realpath(path) != os.path.realpath(current):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def save_model(model, model_path, fmt=MODEL_FORMAT, compress=MODEL_COMPRESS):
+    versions = versions_dir(model_path)
+    os.makedirs(versions, exist_ok=True)
+    # Каталог до версионирования переносится в версии один раз
+    if os.path.isdir(model_path) and not os.path.islink(model_path):
+        os.rename(model_path, os.path.join(versions, "0"))
+
+    directory = os.path.join(versions, str(time.time_ns()))
+    write_model(model, directory, fmt, compress)
+    # Относительная ссылка переживает перемонтирование каталога models/
+    swap_link(model_path, os.path.relpath(directory, os.path.dirname(model_path) or "."))
+    prune_versions(versions, directory)
+    return directory
+
+
+def load_model(model_path):
+    path = os.path.join(model_path, JOBLIB_FILE)
+    if not os.path.exists(path):
+        return mlflow.sklearn.load_model(model_path)
+    with open(os.path.join(model_path, META_FILE)) as f:
+        meta = json.load(f)
+    # Несжатые массивы не читаются, а отображаются в память
+    return joblib.load(path, mmap_mode=None if meta["compress"] else "r")
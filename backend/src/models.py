@@ -1,6 +1,6 @@
 # models.py
 
-from sqlalchemy import Column, Integer, String, Text, JSON, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Text, JSON, DateTime, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -19,3 +19,35 @@ class Report(Base):
     mlflow_data = Column(JSON)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Очередь задач: строка отчёта одновременно является задачей для воркеров
+    data_path = Column(String)
+    params = Column(JSON)
+    priority = Column(Integer, default=0, index=True)
+    worker_id = Column(String)
+    cancel_requested = Column(Boolean, default=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+    # Мемоизация: одинаковые данные + параметры поиска дают тот же ключ
+    cache_key = Column(String, index=True)
+    model_version = Column(BigInteger)
+
+
+class Dataset(Base):
+    __tablename__ = 'datasets'
+
+    id = Column(Integer, primary_key=True, index=True)
+    file_id = Column(String, unique=True, index=True)
+    filename = Column(String)
+    path = Column(String)
+    size = Column(BigInteger)
+    format = Column(String)
+    sep = Column(String, default=',')
+    content_hash = Column(String, index=True)
+    # Заполняются после конвертации в Parquet (см. datasets.convert_upload)
+    columnar_path = Column(String)
+    num_rows = Column(BigInteger)
+    schema = Column(JSON)
+    status = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -1,10 +1,18 @@
 # pipeline.py
 
 import os
-import shutil
-import errno
 import pandas as pd
-from .utils import load_data, preprocess_data, get_models
+from .utils import load_data, preprocess_data, get_models, create_pipeline
+from .ingest import load_training_matrix, split_matrix
+from .datasets import resolve_columnar
+from .fold_cache import default_fold_cache, data_fingerprint
+from .folds import FoldSet
+from .selection import select_model
+from .tuning import tune_hyperparameters
+from .resources import (
+    resource_manager, set_estimator_threads, CpuMeter, TimeBudget,
+    deadline_passed,
+)
 from sklearn.metrics import (
     accuracy_score,
     mean_squared_error,
@@ -13,26 +21,25 @@ from sklearn.metrics import (
     f1_score,
     r2_score,
 )
-from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import cross_val_score, StratifiedKFold, KFold
-import optuna
-import mlflow
-import mlflow.sklearn
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from sklearn.metrics import confusion_matrix, ConfusionMatrixDisplay
 import numpy as np
+import io
 import json
+import pickle
 import uuid
+from functools import partial
 from .models import Report
-
-
-def create_pipeline(model):
-    pipeline_steps = []
-    pipeline_steps.append(("scaler", StandardScaler()))
-    pipeline_steps.append(("model", model))
-    pipeline = Pipeline(steps=pipeline_steps)
-    return pipeline
+from .model_cache import model_cache, model_version
+from .model_store import save_model
+from .tracking import run_logger
+from .preprocessing import (
+    build_inference_pipeline, optimize_dtypes, SparseOneHotEncoder, ONEHOT_MAX_LEVELS,
+)
+from .ensemble import EnsembleModel, greedy_ensemble, inference_cost
+from .compiled import compile_pipeline, parity
+from sklearn.base import clone
+from sklearn.pipeline import Pipeline
 
 
 def save_report(report_id, report_data, report_filename):
@@ -46,58 +53,37 @@ def save_report(report_id, report_data, report_filename):
         json.dump(report_data, f, indent=4)
 
 
-def get_hyperparameters(model_name, trial, task_type):
-    params = {}
-    if model_name == "Random Forest":
-        params = {
-            "n_estimators": trial.suggest_int("n_estimators", 50, 200),
-            "max_depth": trial.suggest_int("max_depth", 3, 20),
-            "max_features": trial.suggest_categorical(
-                "max_features", [None, "sqrt", "log2"]
-            ),
-        }
-    elif model_name == "Logistic Regression":
-        params = {"C": trial.suggest_loguniform("C", 1e-4, 1e2)}
-    elif model_name == "Linear Regression":
-        params = {}
-    elif model_name == "XGBoost":
-        params = {
-            "n_estimators": trial.suggest_int("n_estimators", 50, 200),
-            "learning_rate": trial.suggest_float("learning_rate", 0.01, 0.3),
-            "max_depth": trial.suggest_int("max_depth", 3, 20),
-        }
-    elif model_name == "LightGBM":
-        params = {
-            "n_estimators": trial.suggest_int("n_estimators", 50, 200),
-            "learning_rate": trial.suggest_float("learning_rate", 0.01, 0.3),
-            "num_leaves": trial.suggest_int("num_leaves", 20, 150),
-        }
-    else:
-        raise ValueError(f"Модель {model_name} не поддерживается.")
-    return params
+def save_model_artifact(artifact, model_path):
+    # Одна запись в новый каталог версии и атомарная подмена симлинка
+    version_path = save_model(artifact, model_path)
+    model_cache.invalidate(model_path)
+    return version_path
 
 
-def objective(trial, model_name, base_model, X_train, y_train, task_type):
-    params = get_hyperparameters(model_name, trial, task_type)
-    model = base_model.set_params(**params)
-    pipeline = create_pipeline(model)
+def confusion_matrix_png(cm, title):
+    # Figure без pyplot: отрисовка идёт в фоновом потоке логгера
+    figure = Figure()
+    ax = figure.subplots()
+    ConfusionMatrixDisplay(confusion_matrix=cm).plot(ax=ax)
+    ax.set_title(title)
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png")
+    return buffer.getvalue()
 
-    if task_type == "classification":
-        cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
-        scoring = "accuracy"
-    else:
-        cv = KFold(n_splits=5, shuffle=True, random_state=42)
-        scoring = "neg_root_mean_squared_error"
 
-    scores = cross_val_score(
-        pipeline, X_train, y_train, cv=cv, scoring=scoring, n_jobs=-1
-    )
-    mean_score = scores.mean()
+def persist_model(pipeline, model_name, dataset_name, encoder=None,
+                  target_classes=None, export=None, onehot=None):
+    # export — модель для инференса (компилированные деревья), сохраняется
+    # вместо pipeline. Сохраняем вместе с кодировщиками: модель принимает
+    # сырые строки и возвращает исходные метки классов
+    artifact = pipeline if export is None else export
+    if encoder is not None:
+        artifact = build_inference_pipeline(artifact, encoder, target_classes, onehot=onehot)
 
-    if task_type == "classification":
-        return -mean_score
-    else:
-        return mean_score
+    model_path = f"models/{dataset_name}_{model_name}"
+    version_path = save_model_artifact(artifact, model_path)
+    print(f"Model: {model_name}, saved at {model_path}")
+    return model_path, version_path
 
 
 def train_with_mlflow(
@@ -111,86 +97,155 @@ def train_with_mlflow(
     model_name,
     dataset_name,
     report_id,
-    db
+    db,
+    model_path,
+    version_path,
+    onehot=None,
 ):
-    mlflow.set_tracking_uri("http://mlflow:5000")
+    # Пайплайн уже обучен и сохранён (persist_model): здесь только метрики
+    # и постановка запуска MLflow в очередь
+    y_pred = pipeline.predict(X_val)
+    artifacts = {}
 
-    with mlflow.start_run() as run:
-        run_id = run.info.run_id
-        pipeline.fit(X_train, y_train)
-        y_pred = pipeline.predict(X_val)
+    if task_type == "classification":
+        metrics = {
+            "accuracy": accuracy_score(y_val, y_pred),
+            "precision": precision_score(y_val, y_pred, average="weighted", zero_division=0),
+            "recall": recall_score(y_val, y_pred, average="weighted", zero_division=0),
+            "f1_score": f1_score(y_val, y_pred, average="weighted", zero_division=0),
+        }
+        cm = confusion_matrix(y_val, y_pred)
+        artifacts[f"confusion_matrix_{dataset_name}_{model_name}.png"] = partial(
+            confusion_matrix_png, cm, f"Confusion Matrix - {model_name}"
+        )
 
-        if task_type == "classification":
-            accuracy = accuracy_score(y_val, y_pred)
-            precision = precision_score(
-                y_val, y_pred, average="weighted", zero_division=0
-            )
-            recall = recall_score(y_val, y_pred, average="weighted", zero_division=0)
-            f1 = f1_score(y_val, y_pred, average="weighted", zero_division=0)
+    else:
+        metrics = {
+            "rmse": np.sqrt(mean_squared_error(y_val, y_pred)),
+            "r2_score": r2_score(y_val, y_pred),
+        }
 
-            mlflow.log_metric("accuracy", accuracy)
-            mlflow.log_metric("precision", precision)
-            mlflow.log_metric("recall", recall)
-            mlflow.log_metric("f1_score", f1)
-
-            cm = confusion_matrix(y_val, y_pred)
-            disp = ConfusionMatrixDisplay(confusion_matrix=cm)
-            disp.plot()
-            plt.title(f"Confusion Matrix - {model_name}")
-            cm_filename = f"confusion_matrix_{dataset_name}_{model_name}.png"
-            plt.savefig(cm_filename)
-            plt.close()
-            mlflow.log_artifact(cm_filename)
-            os.remove(cm_filename)
+    if hasattr(pipeline.named_steps["model"], "feature_importances_"):
+        importances = pipeline.named_steps["model"].feature_importances_
+        # В разреженном пути колонки модели — выход SparseOneHotEncoder
+        feature_names = X_train.columns if onehot is None else onehot.feature_names_out_
+        importance_df = pd.DataFrame(
+            {"feature": feature_names, "importance": importances}
+        )
+        importance_df = importance_df.sort_values(by="importance", ascending=False)
+        importance_filename = f"feature_importances_{dataset_name}_{model_name}.csv"
+        artifacts[importance_filename] = importance_df.to_csv(index=False)
+
+    mlflow_report_data = run_logger.log_run(
+        metrics,
+        {**params, "model_name": model_name, "dataset_name": dataset_name},
+        artifacts=artifacts,
+        # Каталог версии не меняется, его можно выгружать без копии
+        model_path=version_path,
+    )
+    print(f"MLflow run {mlflow_report_data['run_id']} queued")
 
-        else:
-            rmse = mean_squared_error(y_val, y_pred, squared=False)
-            r2 = r2_score(y_val, y_pred)
+    report_entry = db.query(Report).filter(Report.report_id == report_id).first()
+    if report_entry:
+        report_entry.mlflow_data = mlflow_report_data
+        # По версии видно, что на диске всё ещё модель этого запуска
+        report_entry.model_version = model_version(model_path)
+        db.commit()
 
-            mlflow.log_metric("rmse", rmse)
-            mlflow.log_metric("r2_score", r2)
 
-        mlflow.log_params(params)
-        mlflow.log_param("model_name", model_name)
-        mlflow.log_param("dataset_name", dataset_name)
+# Минимальная доля бюджета времени, оставляемая на финальное обучение
+REFIT_RESERVE_SHARE = 0.05
 
-        if hasattr(pipeline.named_steps["model"], "feature_importances_"):
-            importances = pipeline.named_steps["model"].feature_importances_
-            feature_names = X_train.columns
-            importance_df = pd.DataFrame(
-                {"feature": feature_names, "importance": importances}
-            )
-            importance_df = importance_df.sort_values(by="importance", ascending=False)
-            importance_filename = f"feature_importances_{dataset_name}_{model_name}.csv"
-            importance_df.to_csv(importance_filename, index=False)
-            mlflow.log_artifact(importance_filename)
-            os.remove(importance_filename)
-
-        mlflow.sklearn.log_model(pipeline, "model")
-
-        model_path = f"models/{dataset_name}_{model_name}"
-
-        if os.path.exists(model_path):
-            try:
-                shutil.rmtree(model_path)
-            except OSError as e:
-                if e.errno != errno.ENOENT:
-                    raise
-
-        mlflow.sklearn.save_model(pipeline, model_path)
-
-        print(f"Model: {model_name}, saved at {model_path}")
-        mlflow_report_data = {
-        'run_id': run_id,
-        'metrics': mlflow.tracking.MlflowClient().get_run(run_id).data.metrics,
-        'params': mlflow.tracking.MlflowClient().get_run(run_id).data.params,
-        'tags': mlflow.tracking.MlflowClient().get_run(run_id).data.tags
-        }
 
-        report_entry = db.query(Report).filter(Report.report_id == report_id).first()
-        if report_entry:
-            report_entry.mlflow_data = mlflow_report_data
-            db.commit()
+def refit_estimate(selection_entry, n_rows):
+    # Время одного фита лучшей модели при отборе, пересчитанное на полную
+    # обучающую выборку (фолд обучается на 4/5 строк раунда)
+    n_splits = selection_entry.get("n_splits", 5)
+    rows = selection_entry.get("budget", n_rows)
+    fold_rows = rows * (n_splits - 1) / n_splits if n_splits > 1 else rows * 0.8
+    return selection_entry.get("seconds", 0.0) / n_splits * n_rows / max(fold_rows, 1)
+
+
+def validation_metrics(y_val, y_pred, task_type):
+    if task_type == "classification":
+        return {"accuracy": accuracy_score(y_val, y_pred)}
+    return {
+        "rmse": np.sqrt(mean_squared_error(y_val, y_pred)),
+        "r2_score": r2_score(y_val, y_pred),
+    }
+
+
+def build_ensemble(oof, classes, best_model_name, best_pipeline, models,
+                   X_train, y_train, X_val, y_val, task_type, cores,
+                   native_categorical, categorical_features, sparse=False):
+    # Веса подбираются по out-of-fold предсказаниям отбора, без новых
+    # проходов CV; обучаются заново только вошедшие в ансамбль модели.
+    # Все участники — с параметрами по умолчанию, как при отборе: веса
+    # и oof_score описывают именно ту модель, которая будет обслуживаться
+    weights, info = greedy_ensemble(oof, y_train, task_type, classes)
+    report = {"weights": weights, "member_params": "default", **info}
+    if len(weights) < 2:
+        report["skipped"] = "single_model"
+        print(f"Ensemble: no gain over {next(iter(weights))}")
+        return None, report
+
+    members = []
+    for name in weights:
+        member = create_pipeline(
+            set_estimator_threads(clone(models[name]), cores),
+            model_aware=native_categorical,
+            categorical_features=categorical_features,
+            sparse=sparse,
+        )
+        members.append((name, member.fit(X_train, y_train)))
+
+    ensemble_pipeline = Pipeline([
+        ("model", EnsembleModel(members, weights, task_type, prefit=True)),
+    ]).fit(X_train, y_train)
+
+    report["validation_metrics"] = {
+        "ensemble": validation_metrics(y_val, ensemble_pipeline.predict(X_val), task_type),
+        best_model_name: validation_metrics(y_val, best_pipeline.predict(X_val), task_type),
+    }
+    report["inference_cost"] = {
+        "ensemble": inference_cost(ensemble_pipeline, X_val),
+        best_model_name: inference_cost(best_pipeline, X_val),
+    }
+    print(f"Ensemble weights: {weights}")
+    return ensemble_pipeline, report
+
+
+def export_compiled(pipeline, X_val):
+    try:
+        compiled = compile_pipeline(pipeline)
+    except ValueError as e:
+        print(f"Compilation skipped: {e}")
+        return None, {"skipped": str(e)}
+
+    report = {
+        "parity": parity(pipeline, compiled, X_val),
+        "inference_cost": {
+            "sklearn": inference_cost(pipeline, X_val),
+            "compiled": inference_cost(compiled, X_val),
+        },
+        "bytes": {
+            "sklearn": len(pickle.dumps(pipeline)),
+            "compiled": len(pickle.dumps(compiled)),
+        },
+    }
+    # Модель с другими предсказаниями не подменяет исходную
+    report["served"] = report["parity"]["passed"]
+    print(f"Compiled model parity: {report['parity']}")
+    return (compiled if report["served"] else None), report
+
+
+def refit_model(base_model, best_params, tuning_report, n_jobs):
+    model = set_estimator_threads(clone(base_model).set_params(**best_params), n_jobs)
+    # Бустинг дообучается на столько деревьев, сколько выбрала ранняя
+    # остановка при подборе, — без повторной отложенной выборки
+    if tuning_report["best_iteration"]:
+        model.set_params(n_estimators=tuning_report["best_iteration"])
+    return model
 
 
 def run_pipeline(
@@ -201,118 +256,318 @@ def run_pipeline(
     sep=",",
     dataset_name="dataset",
     report_id=None,
-    db=None
+    db=None,
+    selection_strategy="successive_halving",
+    halving_eta=2,
+    halving_min_resources=1000,
+    screening_confidence=0.95,
+    screening_margin=0.01,
+    pruner="median",
+    n_trials=50,
+    tuning_workers=1,
+    tuning_timeout=None,
+    n_cores=None,
+    study_storage="journal",
+    streaming=False,
+    chunk_size=100000,
+    use_fold_cache=True,
+    native_categorical=False,
+    time_budget=None,
+    adaptive_search=True,
+    ensemble=False,
+    compile_trees=False,
+    downcast_dtypes=True,
+    lossy_float32=False,
+    sparse_onehot=False,
+    onehot_max_levels=ONEHOT_MAX_LEVELS,
 ):
     if report_id is None:
         report_id = str(uuid.uuid4())
-    data = load_data(data_path, column_names=column_names, sep=sep)
-    data.replace("?", pd.NA, inplace=True)
-    data.dropna(inplace=True)
-
-    X_train, X_val, y_train, y_val = preprocess_data(data, target_column)
-
-    models = get_models(task_type)
-
-    report = {}
+    # Если загрузка уже сконвертирована в Parquet, читаем её вместо CSV
+    data_path = resolve_columnar(data_path, sep=sep)
+
+    with resource_manager.allocate(report_id, n_cores) as cores:
+        print(f"Cores allotted: {cores}")
+        meter = CpuMeter(cores)
+        # Отсчёт бюджета — с момента, когда пайплайн получил ядра
+        budget = TimeBudget(time_budget)
+
+        if streaming:
+            # Файл читается кусками прямо в float32-матрицу, целиком
+            # в pandas он не загружается
+            with meter.stage("load"):
+                X, y, encoder, target_classes, ingest_stats = load_training_matrix(
+                    data_path, target_column, column_names=column_names,
+                    sep=sep, chunk_size=chunk_size,
+                )
+            print(
+                f"Loaded {ingest_stats['rows']} rows in {ingest_stats['chunks']} chunks, "
+                f"dropped {ingest_stats['dropped_rows']} rows with missing values"
+            )
+            with meter.stage("preprocess"):
+                X_train, X_val, y_train, y_val = split_matrix(X, y)
+                del X, y
+        else:
+            with meter.stage("load"):
+                data = load_data(data_path, column_names=column_names, sep=sep)
+                data.replace("?", pd.NA, inplace=True)
+                data.dropna(inplace=True)
+            with meter.stage("preprocess"):
+                X_train, X_val, y_train, y_val, encoder, target_classes = preprocess_data(
+                    data, target_column, return_encoders=True
+                )
+                del data
+
+        levels = {col: len(values) for col, values in encoder.categories_.items()}
+
+        # Признаки — в самые узкие типы: меньше памяти у обучающей матрицы
+        # и у её копий при масштабировании и обучении
+        dtypes_report = None
+        if downcast_dtypes:
+            with meter.stage("dtypes"):
+                (X_train, X_val), dtypes_report = optimize_dtypes(
+                    X_train, X_val, lossy_floats=lossy_float32
+                )
+            print(
+                f"Feature dtypes: {dtypes_report['bytes_before'] / 1e6:.1f} MB -> "
+                f"{dtypes_report['bytes_after'] / 1e6:.1f} MB"
+            )
 
-    model_scores = {}
-    for model_name, base_model in models.items():
-        print(f"Evaluating {model_name}...")
-        pipeline = create_pipeline(base_model)
+        # Широкие данные: категории с небольшим числом уровней — one-hot
+        # в разреженной матрице, масштабирование без центрирования
+        onehot, sparse_report = None, None
+        if sparse_onehot:
+            with meter.stage("sparse"):
+                onehot = SparseOneHotEncoder(levels, onehot_max_levels).fit(X_train)
+                X_train, X_val = onehot.transform(X_train), onehot.transform(X_val)
+            sparse_report = {
+                "shape": list(X_train.shape),
+                "onehot_columns": sorted(onehot.onehot_),
+                "density": X_train.nnz / max(X_train.shape[0] * X_train.shape[1], 1),
+                "bytes": int(X_train.data.nbytes + X_train.indices.nbytes + X_train.indptr.nbytes),
+            }
+            print(f"Sparse features: {X_train.shape}, density {sparse_report['density']:.3f}")
+
+        models = get_models(task_type)
+
+        # Деревья обучаются без StandardScaler, LightGBM/XGBoost получают
+        # закодированные признаки как категориальные (кроме one-hot пути)
+        categorical_features = {}
+        if native_categorical and onehot is None:
+            categorical_features = levels
+
+        # Оценки фолдов кэшируются по содержимому обучающей выборки
+        fold_cache, data_key = None, None
+        if use_fold_cache:
+            fold_cache = default_fold_cache()
+            data_key = data_fingerprint(X_train, y_train)
+
+        # Фолды полной CV считаются один раз: общие для финального раунда
+        # отбора и всех триалов подбора параметров
+        with meter.stage("folds"):
+            folds = FoldSet(
+                X_train, y_train, task_type,
+                model_aware=native_categorical,
+                categorical_features=categorical_features,
+            )
 
-        if task_type == "classification":
-            cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
-            scoring = "accuracy"
+        oof = {} if ensemble else None
+        with meter.stage("screening"):
+            best_model_name, report, selection = select_model(
+                models,
+                X_train,
+                y_train,
+                task_type,
+                strategy=selection_strategy,
+                eta=halving_eta,
+                min_resources=halving_min_resources,
+                n_jobs=cores,
+                fold_cache=fold_cache,
+                data_key=data_key,
+                folds=folds,
+                model_aware=native_categorical,
+                categorical_features=categorical_features,
+                deadline=budget.deadline,
+                confidence=screening_confidence,
+                margin=screening_margin,
+                # Out-of-fold предсказания отбора — материал для ансамбля
+                oof=oof,
+            )
+        report["model_selection"] = selection
+        if streaming:
+            report["ingest"] = ingest_stats
+        if dtypes_report is not None:
+            report["dtypes"] = dtypes_report
+        if sparse_report is not None:
+            report["sparse"] = sparse_report
+
+        print(f"Best model: {best_model_name}")
+
+        best_base_model = models[best_model_name]
+
+        # Подбор параметров получает остаток бюджета за вычетом времени
+        # на финальное обучение
+        timeout, trial_estimate = tuning_timeout, 0.0
+        if budget.seconds is not None:
+            fit_estimate = refit_estimate(report[best_model_name], X_train.shape[0])
+            reserve = max(fit_estimate, REFIT_RESERVE_SHARE * budget.seconds)
+            available = budget.remaining() - reserve
+            timeout = available if timeout is None else min(timeout, available)
+            # Начатый триал Optuna не прерывает: без времени хотя бы на одну
+            # CV подбор пропускается
+            trial_estimate = fit_estimate * 4
+
+        if timeout is not None and timeout <= trial_estimate:
+            print("Time budget exhausted, skipping hyperparameter tuning")
+            best_params = {}
+            tuning_report = {
+                "skipped": "time_budget",
+                "n_complete": 0,
+                "n_pruned": 0,
+                "best_iteration": None,
+            }
         else:
-            cv = KFold(n_splits=5, shuffle=True, random_state=42)
-            scoring = "neg_root_mean_squared_error"
-
-        scores = cross_val_score(
-            pipeline, X_train, y_train, cv=cv, scoring=scoring, n_jobs=-1
+            print(f"Optimizing hyperparameters for {best_model_name}...")
+            with meter.stage("tuning"):
+                study, tuning_report = tune_hyperparameters(
+                    best_model_name,
+                    best_base_model,
+                    X_train,
+                    y_train,
+                    task_type,
+                    n_trials=n_trials,
+                    pruner=pruner,
+                    n_workers=tuning_workers,
+                    timeout=timeout,
+                    n_cores=cores,
+                    storage=study_storage,
+                    study_name=f"{dataset_name}_{report_id}",
+                    fold_cache=fold_cache,
+                    data_key=data_key,
+                    folds=folds,
+                    # Диапазоны и число триалов — по размеру обучающей выборки
+                    shape=X_train.shape if adaptive_search else None,
+                )
+            best_params = study.best_params
+        folds.close()
+        print(
+            f"Trials: {tuning_report['n_complete']} complete, "
+            f"{tuning_report['n_pruned']} pruned"
         )
-        mean_score = scores.mean()
-        model_scores[model_name] = mean_score
-        print(f"{model_name} CV Score: {mean_score}")
 
-        report[model_name] = {"cv_scores": scores.tolist(), "mean_cv_score": mean_score}
+        report["best_params"] = best_params
+        report["tuning"] = tuning_report
+        report["folds"] = folds.stats()
+        if fold_cache is not None:
+            report["fold_cache"] = fold_cache.stats()
 
-    if task_type == "classification":
-        best_model_name = max(model_scores, key=model_scores.get)
-    else:
-        best_model_name = min(model_scores, key=model_scores.get)
-
-    print(f"Best model: {best_model_name}")
-
-    best_base_model = models[best_model_name]
-
-    print(f"Optimizing hyperparameters for {best_model_name}...")
+        best_model = refit_model(best_base_model, best_params, tuning_report, cores)
 
-    if task_type == "classification":
-        direction = "minimize"
-    else:
-        direction = "minimize"
-
-    study = optuna.create_study(direction=direction)
-    study.optimize(
-        lambda trial: objective(
-            trial, best_model_name, best_base_model, X_train, y_train, task_type
-        ),
-        n_trials=50,
-    )
-
-    best_params = study.best_params
-    report["best_params"] = best_params
+        best_pipeline = create_pipeline(
+            best_model,
+            model_aware=native_categorical,
+            categorical_features=categorical_features,
+            sparse=onehot is not None,
+        )
 
-    best_model = best_base_model.set_params(**best_params)
+        with meter.stage("refit"):
+            best_pipeline.fit(X_train, y_train)
+
+        ensemble_pipeline = None
+        if ensemble:
+            if budget.deadline is not None and deadline_passed(budget.deadline):
+                report["ensemble"] = {"skipped": "time_budget"}
+            elif len(oof) < 2:
+                report["ensemble"] = {"skipped": "not_enough_models"}
+            else:
+                with meter.stage("ensemble"):
+                    ensemble_pipeline, report["ensemble"] = build_ensemble(
+                        oof, folds.classes, best_model_name, best_pipeline, models,
+                        X_train, y_train, X_val, y_val, task_type, cores,
+                        native_categorical, categorical_features,
+                        sparse=onehot is not None,
+                    )
+
+        # Экспорт в массивы для быстрого инференса, если деревья
+        # предсказывают так же, как исходный пайплайн
+        compiled_pipeline = None
+        if compile_trees:
+            with meter.stage("compile"):
+                compiled_pipeline, report["compiled"] = export_compiled(best_pipeline, X_val)
+        budget.stop()
+
+        y_pred = best_pipeline.predict(X_val)
 
-    best_pipeline = create_pipeline(best_model)
+        if task_type == "classification":
+            accuracy = accuracy_score(y_val, y_pred)
+            precision = precision_score(y_val, y_pred, average="weighted", zero_division=0)
+            recall = recall_score(y_val, y_pred, average="weighted", zero_division=0)
+            f1 = f1_score(y_val, y_pred, average="weighted", zero_division=0)
+            print(f"Validation Accuracy: {accuracy}")
+            print(f"Validation Precision: {precision}")
+            print(f"Validation Recall: {recall}")
+            print(f"Validation F1 Score: {f1}")
+
+            report["validation_metrics"] = {
+                "accuracy": accuracy,
+                "precision": precision,
+                "recall": recall,
+                "f1_score": f1,
+            }
 
-    best_pipeline.fit(X_train, y_train)
+        else:
+            rmse = np.sqrt(mean_squared_error(y_val, y_pred))
+            r2 = r2_score(y_val, y_pred)
+            print(f"Validation RMSE: {rmse}")
+            print(f"Validation R2 Score: {r2}")
 
-    y_pred = best_pipeline.predict(X_val)
+            report["validation_metrics"] = {"rmse": rmse, "r2_score": r2}
 
-    if task_type == "classification":
-        accuracy = accuracy_score(y_val, y_pred)
-        precision = precision_score(y_val, y_pred, average="weighted", zero_division=0)
-        recall = recall_score(y_val, y_pred, average="weighted", zero_division=0)
-        f1 = f1_score(y_val, y_pred, average="weighted", zero_division=0)
-        print(f"Validation Accuracy: {accuracy}")
-        print(f"Validation Precision: {precision}")
-        print(f"Validation Recall: {recall}")
-        print(f"Validation F1 Score: {f1}")
-
-        report["validation_metrics"] = {
-            "accuracy": accuracy,
-            "precision": precision,
-            "recall": recall,
-            "f1_score": f1,
-        }
+        with meter.stage("persistence"):
+            model_path, version_path = persist_model(
+                best_pipeline, best_model_name, dataset_name, encoder, target_classes,
+                export=compiled_pipeline, onehot=onehot,
+            )
+            if ensemble_pipeline is not None:
+                # Ансамбль сохраняется рядом с лучшей моделью, /predict
+                # обслуживает его как {dataset_name}_Ensemble
+                report["ensemble"]["model_path"], _ = persist_model(
+                    ensemble_pipeline, "Ensemble", dataset_name, encoder, target_classes,
+                    onehot=onehot,
+                )
 
-    else:
-        rmse = mean_squared_error(y_val, y_pred, squared=False)
-        r2 = r2_score(y_val, y_pred)
-        print(f"Validation RMSE: {rmse}")
-        print(f"Validation R2 Score: {r2}")
+        report["resources"] = meter.report()
+        report["time_budget"] = budget.report(meter.stages)
 
-        report["validation_metrics"] = {"rmse": rmse, "r2_score": r2}
+        report_entry = db.query(Report).filter(Report.report_id == report_id).first()
+        if report_entry:
+            report_entry.dataset_name = dataset_name
+            report_entry.model_name = best_model_name
+            report_entry.report_data = report
+            db.commit()
 
-    report_entry = db.query(Report).filter(Report.report_id == report_id).first()
-    if report_entry:
-        report_entry.dataset_name = dataset_name
-        report_entry.model_name = best_model_name
-        report_entry.report_data = report
-        db.commit()
+        with meter.stage("logging"):
+            train_with_mlflow(
+                best_pipeline,
+                X_train,
+                y_train,
+                X_val,
+                y_val,
+                best_params,
+                task_type,
+                best_model_name,
+                dataset_name,
+                report_id,
+                db,
+                model_path,
+                version_path,
+                onehot=onehot,
+            )
 
-    train_with_mlflow(
-        best_pipeline,
-        X_train,
-        y_train,
-        X_val,
-        y_val,
-        best_params,
-        task_type,
-        best_model_name,
-        dataset_name,
-        report_id,
-        db
-    )
+        if report_entry:
+            report_entry.report_data = {
+                **report,
+                "resources": meter.report(),
+                "time_budget": budget.report(meter.stages),
+            }
+            db.commit()
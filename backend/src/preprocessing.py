@@ -0,0 +1,272 @@
+# preprocessing.py
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+# Целые колонки сжимаются до первого типа, в который помещается диапазон
+INT_DTYPES = (np.int8, np.int16, np.int32)
+# Строк за шаг в Float32Scaler: float64 живёт только в пределах куска
+SCALER_CHUNK_ROWS = 65536
+# Категории с числом уровней до этого порога раскрываются в one-hot
+ONEHOT_MAX_LEVELS = 32
+# Значения, которые при чтении CSV (pandas и pyarrow) считаются пропуском
+NULL_VALUES = ["", "?", "NA", "N/A", "NaN", "nan", "null", "NULL", "None"]
+
+
+class FeatureEncoder(BaseEstimator, TransformerMixin):
+    # Запоминает порядок колонок и словари категорий. Кодирование — поиск
+    # по хэш-индексу (pd.Index.get_indexer) сразу для всей колонки; коды
+    # совпадают с LabelEncoder (отсортированные строковые значения),
+    # неизвестная категория получает -1.
+
+    def fit(self, X, y=None):
+        X = pd.DataFrame(X)
+        self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        self.categories_ = {
+            col: pd.Index(np.unique(X[col].astype(str)))
+            for col in X.select_dtypes(include=["object", "string", "category"]).columns
+        }
+        return self
+
+    def transform(self, X):
+        if isinstance(X, pd.DataFrame) and set(self.feature_names_in_).issubset(X.columns):
+            X = X[list(self.feature_names_in_)]
+        else:
+            # Строки без имён колонок — порядок как при обучении
+            X = pd.DataFrame(np.asarray(X, dtype=object), columns=self.feature_names_in_)
+
+        columns = {}
+        for col in self.feature_names_in_:
+            if col in self.categories_:
+                columns[col] = self.categories_[col].get_indexer(X[col].astype(str))
+            else:
+                columns[col] = pd.to_numeric(X[col])
+        return pd.DataFrame(columns, index=X.index)
+
+
+class CategoricalCaster(BaseEstimator, TransformerMixin):
+    # Коды FeatureEncoder -> pandas category с фиксированным набором уровней
+    # (0..n-1), чтобы LightGBM/XGBoost видели одинаковые категории при
+    # обучении и предсказании. Неизвестная категория (-1) становится NaN.
+
+    def __init__(self, categorical_features=None):
+        self.categorical_features = categorical_features
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        X = pd.DataFrame(X).copy()
+        for col, n_levels in (self.categorical_features or {}).items():
+            codes = np.nan_to_num(np.asarray(X[col], dtype=float), nan=-1).astype(int)
+            X[col] = pd.Categorical.from_codes(
+                np.where(codes < n_levels, codes, -1), categories=range(n_levels)
+            )
+        return X
+
+
+def column_dtype(columns, lossy_floats=False):
+    # Тип без потерь для значений колонки во всех частях выборки
+    # (lossy_floats — float64 во float32 с округлением, лишь бы в диапазоне)
+    dtype = np.result_type(*[values.dtype for values in columns])
+    if dtype.kind in "iu":
+        low = min((values.min() for values in columns if len(values)), default=0)
+        high = max((values.max() for values in columns if len(values)), default=0)
+        for candidate in INT_DTYPES:
+            info = np.iinfo(candidate)
+            if info.min <= low and high <= info.max:
+                return np.dtype(candidate)
+    elif dtype == np.float64:
+        if lossy_floats:
+            limit = np.finfo(np.float32).max
+            if all(not (np.abs(values[np.isfinite(values)]) > limit).any() for values in columns):
+                return np.dtype(np.float32)
+        # Иначе только если float32 хранит каждое значение точно: большие
+        # идентификаторы и метки времени остаются float64
+        elif all(
+            np.array_equal(values.astype(np.float32).astype(np.float64), values, equal_nan=True)
+            for values in columns
+        ):
+            return np.dtype(np.float32)
+    return dtype
+
+
+def optimize_dtypes(*frames, lossy_floats=False):
+    # Коды категорий и целые — в int8/int16/int32 по диапазону, float64 —
+    # во float32, по умолчанию только без потерь: колонки, которые float32
+    # хранит не точно, остаются float64 (kept_float64). С lossy_floats
+    # во float32 идут все float64-колонки в диапазоне — как в фолдах CV
+    # (FoldSet) и у деревьев, — а округлённые перечислены в rounded.
+    # Типы подбираются по всем частям сразу, чтобы валидация тоже
+    # помещалась без потерь.
+    dtypes, report = {}, {"columns": {}, "kept_float64": [], "rounded": []}
+    for col in frames[0].columns:
+        columns = [frame[col].to_numpy() for frame in frames]
+        dtype = column_dtype(columns, lossy_floats)
+        if dtype == np.float64:
+            report["kept_float64"].append(col)
+        if dtype == columns[0].dtype:
+            continue
+        dtypes[col] = dtype
+        report["columns"][col] = f"{columns[0].dtype} -> {dtype}"
+        if lossy_floats and dtype == np.float32 and not all(
+            np.array_equal(values.astype(np.float32).astype(values.dtype), values, equal_nan=True)
+            for values in columns
+        ):
+            report["rounded"].append(col)
+
+    report["bytes_before"] = int(sum(frame.memory_usage(index=False).sum() for frame in frames))
+    if dtypes:
+        frames = [frame.astype(dtypes) for frame in frames]
+    report["bytes_after"] = int(sum(frame.memory_usage(index=False).sum() for frame in frames))
+    return frames, report
+
+
+def float32_values(X):
+    # Одна float32-копия признаков: pandas собирает колонки int8/float32
+    # сразу во float32, без промежуточного float64
+    if sp.issparse(X):
+        return sp.csr_matrix(X, dtype=np.float32, copy=True)
+    if isinstance(X, pd.DataFrame):
+        return X.to_numpy(dtype=np.float32, copy=True)
+    return np.array(X, dtype=np.float32)
+
+
+def has_float64(X):
+    dtypes = X.dtypes if isinstance(X, pd.DataFrame) else [np.asarray(X).dtype]
+    return any(dtype == np.float64 for dtype in dtypes)
+
+
+class Float32Scaler(StandardScaler):
+    # StandardScaler без float64-копии всей матрицы: x' = (x - mean) / scale
+    # считается в float64 по кускам строк и один раз округляется во float32 —
+    # ровно то значение, которое деревья и так получили бы после своего
+    # приведения к float32. Разреженная матрица (with_mean=False) только
+    # делится на scale, нули остаются нулями. Если есть float64-колонки
+    # (optimize_dtypes оставил их, чтобы не терять точность), среднее и
+    # дисперсия тоже считаются во float64 по кускам строк.
+
+    def fit(self, X, y=None, sample_weight=None):
+        if sp.issparse(X) or not has_float64(X):
+            super().fit(float32_values(X), y, sample_weight)
+        else:
+            self._reset()
+            for start in range(0, X.shape[0], SCALER_CHUNK_ROWS):
+                rows = slice(start, start + SCALER_CHUNK_ROWS)
+                chunk = X.iloc[rows] if isinstance(X, pd.DataFrame) else X[rows]
+                weights = None if sample_weight is None else sample_weight[rows]
+                self.partial_fit(np.asarray(chunk, dtype=np.float64), y, weights)
+        if isinstance(X, pd.DataFrame):
+            self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        return self
+
+    def transform(self, X, copy=None):
+        mean = self.mean_ if self.with_mean else 0.0
+        scale = self.scale_ if self.with_std else 1.0
+        if sp.issparse(X):
+            if self.with_mean:
+                raise ValueError("Разреженную матрицу нельзя центрировать: нужен with_mean=False.")
+            X = sp.csr_matrix(X, dtype=np.float32, copy=True)
+            X.data = (X.data / np.broadcast_to(scale, (X.shape[1],))[X.indices]).astype(np.float32)
+            return X
+        result = np.empty((X.shape[0], X.shape[1]), dtype=np.float32)
+        for start in range(0, X.shape[0], SCALER_CHUNK_ROWS):
+            rows = slice(start, start + SCALER_CHUNK_ROWS)
+            chunk = X.iloc[rows] if isinstance(X, pd.DataFrame) else X[rows]
+            result[rows] = (np.asarray(chunk, dtype=np.float64) - mean) / scale
+        return result
+
+
+class SparseOneHotEncoder(BaseEstimator, TransformerMixin):
+    # Коды FeatureEncoder -> разреженная float32-матрица (CSR) для широких
+    # данных: категории с числом уровней до max_levels раскрываются в one-hot,
+    # числовые признаки и категории с большим числом уровней остаются одной
+    # колонкой (код). Неизвестная категория (-1) — пустой one-hot блок.
+
+    def __init__(self, categorical_features=None, max_levels=ONEHOT_MAX_LEVELS):
+        self.categorical_features = categorical_features
+        self.max_levels = max_levels
+
+    def fit(self, X, y=None):
+        X = pd.DataFrame(X)
+        self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        levels = self.categorical_features or {}
+        self.onehot_ = {
+            col: n_levels for col, n_levels in levels.items()
+            if col in X.columns and n_levels <= self.max_levels
+        }
+        names = []
+        for col in self.feature_names_in_:
+            if col in self.onehot_:
+                names.extend(f"{col}={level}" for level in range(self.onehot_[col]))
+            else:
+                names.append(str(col))
+        self.feature_names_out_ = np.asarray(names, dtype=object)
+        return self
+
+    def get_feature_names_out(self, input_features=None):
+        return self.feature_names_out_
+
+    def transform(self, X):
+        X = pd.DataFrame(X)
+        rows, cols, data = [], [], []
+        offset = 0
+        for col in self.feature_names_in_:
+            values = X[col].to_numpy()
+            if col in self.onehot_:
+                n_levels = self.onehot_[col]
+                codes = np.nan_to_num(values.astype(np.float64), nan=-1).astype(np.int64)
+                index = np.flatnonzero((codes >= 0) & (codes < n_levels))
+                rows.append(index)
+                cols.append(offset + codes[index])
+                data.append(np.ones(len(index), dtype=np.float32))
+                offset += n_levels
+            else:
+                values = values.astype(np.float32)
+                index = np.flatnonzero(values != 0)
+                rows.append(index)
+                cols.append(np.full(len(index), offset))
+                data.append(values[index])
+                offset += 1
+        matrix = sp.csr_matrix(
+            (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(len(X), offset), dtype=np.float32,
+        )
+        # Отсортированные индексы: матрицу не придётся менять на месте,
+        # в том числе открытую из memmap (FoldSet)
+        matrix.sort_indices()
+        return matrix
+
+
+def encode_target(y):
+    if pd.api.types.is_numeric_dtype(y):
+        return y, None
+    target_classes, codes = np.unique(y.astype(str), return_inverse=True)
+    return codes, target_classes
+
+
+class InferencePipeline(Pipeline):
+    # Артефакт для инференса: на входе сырые строки (кодирование и порядок
+    # колонок — шаг encoder), на выходе исходные метки классов.
+
+    def __init__(self, steps, target_classes=None, *, memory=None, verbose=False):
+        super().__init__(steps, memory=memory, verbose=verbose)
+        self.target_classes = target_classes
+
+    def predict(self, X, **params):
+        prediction = super().predict(X, **params)
+        if self.target_classes is not None:
+            prediction = np.asarray(self.target_classes)[prediction.astype(int)]
+        return prediction
+
+
+def build_inference_pipeline(pipeline, encoder, target_classes=None, onehot=None):
+    # Шаги уже обучены — новый объект только собирает их в одну цепочку
+    steps = [("encoder", encoder)]
+    if onehot is not None:
+        steps.append(("onehot", onehot))
+    return InferencePipeline(steps + list(pipeline.steps), target_classes=target_classes)
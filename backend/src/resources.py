@@ -0,0 +1,192 @@
+# resources.py
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from threadpoolctl import threadpool_limits
+
+
+def available_cores():
+    cores = os.getenv("AUTOML_CPU_CORES")
+    if cores:
+        return max(1, int(cores))
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class ResourceManager:
+    # Один на процесс: раздаёт ядра одновременно идущим пайплайнам, чтобы
+    # joblib-воркеры и потоки XGBoost/LightGBM не дрались за одни и те же ядра.
+
+    def __init__(self, total_cores=None):
+        self.total_cores = total_cores or available_cores()
+        self._allocations = {}
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+
+    def acquire(self, pipeline_id, requested=None):
+        with self._released:
+            # Свободных ядер нет — ждём, пока какой-нибудь пайплайн их отдаст
+            while self._free() < 1:
+                self._released.wait()
+            if requested is None:
+                # Без явного числа — равная доля среди активных пайплайнов,
+                # чтобы первый пришедший не забирал все ядра
+                requested = self.total_cores // (len(self._allocations) + 1)
+            cores = max(1, min(requested, self._free()))
+            self._allocations[pipeline_id] = cores
+            return cores
+
+    def release(self, pipeline_id):
+        with self._released:
+            self._allocations.pop(pipeline_id, None)
+            self._released.notify_all()
+
+    def _free(self):
+        return self.total_cores - sum(self._allocations.values())
+
+    def usage(self):
+        with self._lock:
+            return {
+                "total_cores": self.total_cores,
+                "allocations": dict(self._allocations),
+            }
+
+    @contextmanager
+    def allocate(self, pipeline_id, requested=None):
+        cores = self.acquire(pipeline_id, requested)
+        try:
+            # Лимит BLAS/OpenMP действует на весь процесс — при нескольких
+            # пайплайнах в одном процессе берётся последний выставленный.
+            with threadpool_limits(limits=cores):
+                yield cores
+        finally:
+            self.release(pipeline_id)
+
+
+resource_manager = ResourceManager()
+
+
+def set_estimator_threads(model, n_jobs):
+    if "n_jobs" in model.get_params():
+        model.set_params(n_jobs=n_jobs)
+    return model
+
+
+def split_threads(n_jobs, n_tasks):
+    # Сколько задач (фолдов) запускать параллельно и сколько потоков дать
+    # каждой модели внутри, чтобы в сумме не выйти за n_jobs.
+    outer = max(1, min(n_jobs, n_tasks))
+    return outer, max(1, n_jobs // outer)
+
+
+def reset_peak_rss():
+    # Сбрасывает VmHWM, чтобы пик считался отдельно для каждого этапа.
+    # Есть только в Linux; в остальных ОС пик считается с начала процесса.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def cpu_times():
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+class CpuMeter:
+    def __init__(self, cores):
+        self.cores = cores
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        reset_peak_rss()
+        wall_start, cpu_start = time.time(), cpu_times()
+        try:
+            yield
+        finally:
+            wall = time.time() - wall_start
+            cpu = cpu_times() - cpu_start
+            self.stages[name] = {
+                "wall_seconds": wall,
+                "cpu_seconds": cpu,
+                "utilization": cpu / (wall * self.cores) if wall > 0 else 0.0,
+                # Пик резидентной памяти процесса за этап (дочерние не входят)
+                "peak_rss_mb": peak_rss_mb(),
+            }
+
+    def report(self):
+        wall = sum(s["wall_seconds"] for s in self.stages.values())
+        cpu = sum(s["cpu_seconds"] for s in self.stages.values())
+        # CPU-время снимается со всего процесса (плюс завершённые дочерние),
+        # поэтому при нескольких пайплайнах в одном процессе оно общее.
+        return {
+            "cores_allotted": self.cores,
+            "total_cores": resource_manager.total_cores,
+            "wall_seconds": wall,
+            "cpu_seconds": cpu,
+            "utilization": cpu / (wall * self.cores) if wall > 0 else 0.0,
+            "peak_rss_mb": max((s["peak_rss_mb"] for s in self.stages.values()), default=0.0),
+            "stages": self.stages,
+        }
+
+
+def deadline_passed(deadline):
+    return deadline is not None and time.time() >= deadline
+
+
+class TimeBudget:
+    # Общий бюджет времени на запуск в секундах (None — без ограничения).
+    # Этапы сами сверяются с дедлайном; уже начатую подгонку модели бюджет
+    # не прерывает, поэтому превышение возможно на длину одного фита.
+
+    def __init__(self, seconds=None):
+        self.seconds = seconds
+        self.start = time.time()
+        self.stopped = None
+
+    @property
+    def deadline(self):
+        return None if self.seconds is None else self.start + self.seconds
+
+    def stop(self):
+        # Всё, что после (логирование в MLflow), в бюджет не входит
+        self.stopped = time.time()
+
+    def elapsed(self):
+        return (self.stopped or time.time()) - self.start
+
+    def remaining(self):
+        return None if self.seconds is None else self.seconds - self.elapsed()
+
+    def report(self, stages):
+        elapsed = self.elapsed()
+        return {
+            "budget_seconds": self.seconds,
+            "elapsed_seconds": elapsed,
+            "remaining_seconds": self.remaining(),
+            "exceeded": self.seconds is not None and elapsed > self.seconds,
+            "stages": {
+                name: {
+                    "wall_seconds": stage["wall_seconds"],
+                    "share_of_budget": stage["wall_seconds"] / self.seconds if self.seconds else None,
+                }
+                for name, stage in stages.items()
+            },
+        }
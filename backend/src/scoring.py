@@ -0,0 +1,123 @@
+# scoring.py
+
+import json
+import itertools
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from .preprocessing import NULL_VALUES
+
+CHUNK_SIZE = 50000
+
+
+def detect_format(filename):
+    name = (filename or "").lower()
+    if name.endswith(".parquet"):
+        return "parquet"
+    if name.endswith((".jsonl", ".ndjson")):
+        return "ndjson"
+    if name.endswith(".json"):
+        return "json"
+    return "csv"
+
+
+def examples_to_frame(examples):
+    if isinstance(examples, dict):
+        examples = examples.get("examples", examples.get("data", []))
+    if examples and isinstance(examples[0], dict):
+        return pd.DataFrame.from_records(examples)
+    # dtype=object, как в /predict: строки категорий кодирует сохранённый
+    # encoder, числовые колонки pandas выводит сам
+    return pd.DataFrame(np.asarray(examples, dtype=object)).infer_objects()
+
+
+def iter_examples(examples, chunk_size=CHUNK_SIZE):
+    # Кадр собирается при первом обращении — ошибка разбора всплывает
+    # там же, где и ошибки схемы (start_predictions)
+    yield from split_frame(examples_to_frame(examples), chunk_size)
+
+
+def iter_frames(file_obj, fmt="csv", chunk_size=CHUNK_SIZE, sep=","):
+    # Файл читается кусками, чтобы память не зависела от его размера.
+    if fmt == "csv":
+        # Пропуски — как при обучении (load_data)
+        yield from pd.read_csv(
+            file_obj, sep=sep, chunksize=chunk_size, na_values=NULL_VALUES, keep_default_na=False
+        )
+    elif fmt == "parquet":
+        parquet_file = pq.ParquetFile(file_obj)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif fmt == "ndjson":
+        yield from pd.read_json(file_obj, lines=True, chunksize=chunk_size)
+    elif fmt == "json":
+        # Обычный JSON-массив потоково не разобрать — читаем целиком, режем на куски
+        frame = examples_to_frame(json.load(file_obj))
+        yield from split_frame(frame, chunk_size)
+    else:
+        raise ValueError(f"Формат {fmt} не поддерживается.")
+
+
+def split_frame(frame, chunk_size=CHUNK_SIZE):
+    for start in range(0, len(frame), chunk_size):
+        yield frame.iloc[start:start + chunk_size]
+
+
+def align_features(model, frame):
+    feature_names = getattr(model, "feature_names_in_", None)
+    if feature_names is None:
+        return frame
+    if set(feature_names).issubset(frame.columns):
+        # Лишние колонки (например, целевую) отбрасываем, порядок — как при обучении
+        return frame[list(feature_names)]
+    if frame.shape[1] == len(feature_names):
+        # Строки без имён колонок — считаем, что порядок совпадает с обучением
+        return pd.DataFrame(frame.to_numpy(), columns=feature_names)
+    raise ValueError(
+        f"Ожидались признаки {list(feature_names)}, получены {list(frame.columns)}"
+    )
+
+
+def format_prediction(prediction, task_type="classification"):
+    # Модели с сохранённым декодером уже возвращают исходные метки
+    if task_type == "classification" and prediction.dtype.kind == "f":
+        prediction = prediction.astype(int)
+    return prediction
+
+
+def predict_frames(model, frames, task_type="classification"):
+    for frame in frames:
+        prediction = model.predict(align_features(model, frame))
+        yield format_prediction(prediction, task_type)
+
+
+def start_predictions(model, frames, task_type="classification"):
+    # Первый кусок считается сразу: ошибка схемы или predict всплывает
+    # до начала ответа, а не обрывает уже отправленный поток
+    predictions = predict_frames(model, frames, task_type)
+    first = next(predictions, None)
+    if first is None:
+        return iter(())
+    return itertools.chain([first], predictions)
+
+
+def to_ndjson(predictions):
+    row = 0
+    for chunk in predictions:
+        lines = [
+            json.dumps({"row": row + i, "prediction": value})
+            for i, value in enumerate(chunk.tolist())
+        ]
+        row += len(lines)
+        yield "\n".join(lines) + "\n"
+
+
+def to_csv(predictions):
+    yield "row,prediction\n"
+    row = 0
+    for chunk in predictions:
+        frame = pd.DataFrame(
+            {"row": np.arange(row, row + len(chunk)), "prediction": chunk}
+        )
+        row += len(chunk)
+        yield frame.to_csv(index=False, header=False)
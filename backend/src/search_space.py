@@ -0,0 +1,138 @@
+# search_space.py
+
+import math
+from optuna.distributions import (
+    CategoricalDistribution,
+    FloatDistribution,
+    IntDistribution,
+)
+
+# Пространства поиска по моделям: параметр -> описание распределения.
+# Границы могут быть функциями от формы данных (n_rows, n_features);
+# без формы (shape=None) берётся прежний фиксированный диапазон.
+SEARCH_SPACES = {}
+
+# До этого размера выборки — полный бюджет триалов, дальше он убывает
+# как корень из числа строк
+FULL_TRIALS_ROWS = 100000
+MIN_TRIALS = 10
+# Больше триалов на параметр пространству поиска не нужно
+TRIALS_PER_PARAM = 15
+
+
+def register_search_space(model_name, space):
+    SEARCH_SPACES[model_name] = space
+
+
+def depth_limit(cap, per_log2=1.0, floor=4):
+    # Дерево глубже log2(n_rows) всё равно упирается в листья из одного объекта
+    def bound(shape):
+        if shape is None:
+            return cap
+        depth = math.ceil(per_log2 * math.log2(max(shape[0], 2)))
+        return int(min(cap, max(floor, depth)))
+    return bound
+
+
+def leaves_limit(cap, rows_per_leaf=20, floor=8):
+    def bound(shape):
+        if shape is None:
+            return cap
+        return int(min(cap, max(floor, shape[0] // rows_per_leaf)))
+    return bound
+
+
+def resolve(value, shape):
+    return value(shape) if callable(value) else value
+
+
+def to_distribution(spec, shape=None):
+    if spec["type"] == "categorical":
+        return CategoricalDistribution(spec["choices"])
+    high = resolve(spec["high"], shape)
+    # Нижняя граница не может оказаться выше урезанной верхней
+    low = min(resolve(spec["low"], shape), high)
+    if spec["type"] == "int":
+        return IntDistribution(low, high, log=spec.get("log", False))
+    if spec["type"] == "float":
+        return FloatDistribution(low, high, log=spec.get("log", False))
+    raise ValueError(f"Тип параметра {spec['type']} не поддерживается.")
+
+
+def search_space(model_name, shape=None):
+    if model_name not in SEARCH_SPACES:
+        raise ValueError(f"Модель {model_name} не поддерживается.")
+    return {
+        name: to_distribution(spec, shape)
+        for name, spec in SEARCH_SPACES[model_name].items()
+    }
+
+
+def suggest_params(trial, distributions):
+    params = {}
+    for name, dist in distributions.items():
+        if isinstance(dist, CategoricalDistribution):
+            params[name] = trial.suggest_categorical(name, dist.choices)
+        elif isinstance(dist, IntDistribution):
+            params[name] = trial.suggest_int(name, dist.low, dist.high, log=dist.log)
+        else:
+            params[name] = trial.suggest_float(name, dist.low, dist.high, log=dist.log)
+    return params
+
+
+def contains(distributions, params):
+    if set(params) != set(distributions):
+        return False
+    for name, value in params.items():
+        dist = distributions[name]
+        if isinstance(dist, CategoricalDistribution):
+            if value not in dist.choices:
+                return False
+        elif not dist.low <= value <= dist.high:
+            return False
+    return True
+
+
+def scaled_trials(n_trials, distributions, shape=None):
+    # n_trials — верхняя граница: модели без параметров хватит одного
+    # триала, на больших данных триалов меньше
+    if not distributions:
+        return 1
+    n = min(n_trials, TRIALS_PER_PARAM * len(distributions))
+    if shape is not None and shape[0] > FULL_TRIALS_ROWS:
+        n *= math.sqrt(FULL_TRIALS_ROWS / shape[0])
+    return max(min(MIN_TRIALS, n_trials), int(round(n)))
+
+
+def describe(distributions):
+    # Для отчёта: диапазоны после масштабирования
+    described = {}
+    for name, dist in distributions.items():
+        if isinstance(dist, CategoricalDistribution):
+            described[name] = {"choices": list(dist.choices)}
+        else:
+            described[name] = {"low": dist.low, "high": dist.high, "log": dist.log}
+    return described
+
+
+register_search_space("Random Forest", {
+    "n_estimators": {"type": "int", "low": 50, "high": 200},
+    "max_depth": {"type": "int", "low": 3, "high": depth_limit(20)},
+    "max_features": {"type": "categorical", "choices": [None, "sqrt", "log2"]},
+})
+register_search_space("Logistic Regression", {
+    "C": {"type": "float", "low": 1e-4, "high": 1e2, "log": True},
+})
+register_search_space("Linear Regression", {})
+# Для бустинга n_estimators — верхняя граница, фактическое число деревьев
+# выбирает ранняя остановка
+register_search_space("XGBoost", {
+    "n_estimators": {"type": "int", "low": 50, "high": 200},
+    "learning_rate": {"type": "float", "low": 0.01, "high": 0.3},
+    "max_depth": {"type": "int", "low": 3, "high": depth_limit(20, per_log2=0.5)},
+})
+register_search_space("LightGBM", {
+    "n_estimators": {"type": "int", "low": 50, "high": 200},
+    "learning_rate": {"type": "float", "low": 0.01, "high": 0.3},
+    "num_leaves": {"type": "int", "low": 20, "high": leaves_limit(150)},
+})
@@ -0,0 +1,393 @@
+# selection.py
+
+import math
+import time
+import numpy as np
+import pandas as pd
+from scipy.stats import norm, t as student_t
+from sklearn.model_selection import train_test_split
+from .utils import get_cv
+from .fold_cache import fold_keys
+from .folds import FoldSet, score_folds, fold_kind
+from .resources import deadline_passed
+
+
+def pick_best_model(model_scores):
+    # Оба скоринга (accuracy и neg RMSE) устроены как "больше — лучше".
+    return max(model_scores, key=model_scores.get)
+
+
+def stratify_labels(y, task_type, n_bins=10):
+    if task_type == "classification":
+        return y
+    # Регрессия: стратификация по квантильным корзинам целевой переменной
+    return pd.qcut(np.asarray(y), q=n_bins, labels=False, duplicates="drop")
+
+
+def subsample(X, y, n_samples, task_type, random_state=42):
+    if n_samples >= X.shape[0]:
+        return X, y
+    stratify = stratify_labels(y, task_type)
+    try:
+        X_sub, _, y_sub, _ = train_test_split(
+            X, y, train_size=n_samples, stratify=stratify, random_state=random_state
+        )
+    except ValueError:
+        # Слишком редкие классы для стратификации — берём обычную выборку.
+        X_sub, _, y_sub, _ = train_test_split(
+            X, y, train_size=n_samples, random_state=random_state
+        )
+    return X_sub, y_sub
+
+
+class RoundFolds:
+    # Фолды одного раунда отбора: разбиение считается один раз на раунд и
+    # общее для всех кандидатов. FoldSet строится при первой модели, которой
+    # не хватило кэша, — раунд целиком из кэша фолды на диск не пишет.
+
+    def __init__(self, X, y, task_type, n_splits=5, model_aware=False,
+                 categorical_features=None, folds=None):
+        self.args = (X, y, task_type, n_splits)
+        self.model_aware = model_aware
+        self.categorical_features = categorical_features
+        self.folds = folds
+        self.own = folds is None
+
+    def __call__(self):
+        if self.folds is None:
+            self.folds = FoldSet(
+                *self.args, model_aware=self.model_aware,
+                categorical_features=self.categorical_features,
+            )
+        return self.folds
+
+    def close(self):
+        if self.own and self.folds is not None:
+            self.folds.close()
+
+
+def evaluate_model(base_model, X, y, task_type, n_splits=5, n_jobs=1,
+                   fold_cache=None, data_key=None, folds=None,
+                   model_aware=False, categorical_features=None, return_oof=False):
+    cv, scoring = get_cv(task_type, n_splits)
+    keys = None
+    if fold_cache is not None and data_key is not None:
+        # Оценка зависит и от того, в каком виде модель получает признаки
+        kind = fold_kind(base_model, model_aware, categorical_features)
+        keys = fold_keys(f"{data_key}:{kind}", cv, scoring, base_model, cv.get_n_splits())
+        # В кэше только оценки: для out-of-fold предсказаний фолды считаются
+        cached = {} if return_oof else fold_cache.get_many(keys)
+        if len(cached) == len(keys):
+            return np.array([cached[k] for k in keys])
+
+    # folds — FoldSet или RoundFolds раунда (строится при первом обращении)
+    own_folds = folds is None
+    if own_folds:
+        folds = RoundFolds(X, y, task_type, n_splits, model_aware, categorical_features)
+    try:
+        result = score_folds(base_model, folds() if callable(folds) else folds, n_jobs, return_oof)
+    finally:
+        if own_folds:
+            folds.close()
+    scores = result[0] if return_oof else result
+    if keys is not None:
+        fold_cache.put_many(dict(zip(keys, scores)))
+    return result
+
+
+def exhaustive_selection(models, X_train, y_train, task_type, n_jobs=1,
+                         fold_cache=None, data_key=None, folds=None,
+                         model_aware=False, categorical_features=None, deadline=None,
+                         oof=None):
+    report = {}
+    model_scores = {}
+    stopped_by = None
+    for model_name, base_model in models.items():
+        # Бюджет времени исчерпан: выбираем из уже оценённых моделей
+        if model_scores and deadline_passed(deadline):
+            print(f"Time budget exhausted, skipping {model_name}")
+            stopped_by = "time_budget"
+            continue
+        print(f"Evaluating {model_name}...")
+        start = time.time()
+        scores = evaluate_model(
+            base_model, X_train, y_train, task_type, n_jobs=n_jobs,
+            fold_cache=fold_cache, data_key=data_key, folds=folds,
+            model_aware=model_aware, categorical_features=categorical_features,
+            return_oof=oof is not None,
+        )
+        if oof is not None:
+            scores, oof[model_name] = scores
+        mean_score = scores.mean()
+        model_scores[model_name] = mean_score
+        print(f"{model_name} CV Score: {mean_score}")
+
+        report[model_name] = {
+            "cv_scores": scores.tolist(),
+            "mean_cv_score": mean_score,
+            "seconds": time.time() - start,
+        }
+
+    selection = {"strategy": "exhaustive", "stopped_by": stopped_by, "rounds": [
+        {"budget": X_train.shape[0], "n_splits": 5, "scores": dict(model_scores),
+         "survivors": list(model_scores)}
+    ]}
+    return pick_best_model(model_scores), report, selection
+
+
+def sample_key(data_key, n_samples, n_rows):
+    # Подвыборка детерминирована (random_state), ключ — данные + размер
+    if data_key is None or n_samples >= n_rows:
+        return data_key
+    return f"{data_key}:sample={n_samples}"
+
+
+def ranking(selection):
+    # Итоговый порядок моделей: сначала дошедшие до более поздних раундов,
+    # внутри раунда — по оценке
+    ranked = []
+    for round_info in reversed(selection["rounds"]):
+        scores = round_info["scores"]
+        ranked += [m for m in sorted(scores, key=scores.get, reverse=True) if m not in ranked]
+    return ranked
+
+
+def halving_budgets(n_samples, n_models, eta=2, min_resources=1000):
+    # Последний раунд всегда идёт на полных данных, поэтому его оценки
+    # совпадают с полным перебором; на малых данных остаётся один раунд.
+    n_rounds = max(1, math.ceil(math.log(max(n_models, 1), eta)))
+    if n_samples <= min_resources:
+        max_rounds = 1
+    else:
+        max_rounds = 1 + int(math.floor(math.log(n_samples / min_resources, eta)))
+    n_rounds = min(n_rounds, max_rounds)
+    return [int(n_samples / eta ** (n_rounds - 1 - i)) for i in range(n_rounds)]
+
+
+def successive_halving(models, X_train, y_train, task_type, eta=2, min_resources=1000,
+                       n_jobs=1, fold_cache=None, data_key=None, folds=None,
+                       model_aware=False, categorical_features=None, deadline=None,
+                       oof=None):
+    budgets = halving_budgets(X_train.shape[0], len(models), eta, min_resources)
+    survivors = list(models)
+    report = {}
+    rounds = []
+    model_scores = {}
+    stopped_by = None
+
+    for round_idx, budget in enumerate(budgets):
+        final_round = round_idx == len(budgets) - 1
+        # Промежуточные раунды — один holdout-фолд на подвыборке,
+        # финальный — полная 5-fold CV на всех данных.
+        n_splits = 5 if final_round else 1
+        X_round, y_round = subsample(X_train, y_train, budget, task_type)
+        round_key = sample_key(data_key, budget, X_train.shape[0])
+        # Финальный раунд идёт на тех же фолдах, что и подбор параметров
+        round_folds = RoundFolds(
+            X_round, y_round, task_type, n_splits, model_aware, categorical_features,
+            folds=folds if final_round and budget >= X_train.shape[0] else None,
+        )
+        model_scores = {}
+        for model_name in survivors:
+            if model_scores and deadline_passed(deadline):
+                print(f"Time budget exhausted, skipping {model_name}")
+                stopped_by = "time_budget"
+                continue
+            print(f"Evaluating {model_name} on {budget} rows...")
+            start = time.time()
+            # Out-of-fold предсказания нужны только с полной CV на всех данных
+            collect = oof is not None and final_round and budget >= X_train.shape[0]
+            scores = evaluate_model(
+                models[model_name], X_round, y_round, task_type, n_splits, n_jobs,
+                fold_cache=fold_cache, data_key=round_key, folds=round_folds,
+                model_aware=model_aware, categorical_features=categorical_features,
+                return_oof=collect,
+            )
+            if collect:
+                scores, oof[model_name] = scores
+            mean_score = scores.mean()
+            model_scores[model_name] = mean_score
+            print(f"{model_name} CV Score: {mean_score}")
+
+            report[model_name] = {
+                "cv_scores": scores.tolist(),
+                "mean_cv_score": mean_score,
+                "budget": budget,
+                "n_splits": n_splits,
+                "round": round_idx,
+                "seconds": time.time() - start,
+            }
+
+        round_folds.close()
+
+        ranked = sorted(model_scores, key=model_scores.get, reverse=True)
+        if final_round:
+            survivors = ranked[:1]
+        else:
+            survivors = ranked[:max(1, math.ceil(len(ranked) / eta))]
+        rounds.append({
+            "budget": budget,
+            "n_splits": n_splits,
+            "scores": model_scores,
+            "survivors": survivors,
+        })
+        # Следующие раунды не начинаем: лучшая модель — по последнему раунду
+        if not final_round and deadline_passed(deadline):
+            print("Time budget exhausted, stopping model selection")
+            stopped_by = "time_budget"
+            break
+
+    selection = {
+        "strategy": "successive_halving",
+        "eta": eta,
+        "min_resources": min_resources,
+        "stopped_by": stopped_by,
+        "rounds": rounds,
+    }
+    return pick_best_model(model_scores), report, selection
+
+
+def screening_sample_size(n_rows, confidence=0.95, margin=0.01, min_rows=1000):
+    # Строк, при которых полуширина доверительного интервала для доли
+    # верных ответов (худший случай p=0.5) не больше margin
+    z = norm.ppf(0.5 + confidence / 2)
+    n_samples = math.ceil(z ** 2 * 0.25 / margin ** 2)
+    return int(min(n_rows, max(min_rows, n_samples)))
+
+
+def compare_candidates(scores, confidence=0.95, margin=0.01):
+    # Доверительный интервал парной разности (лучшая минус модель) по одним
+    # и тем же фолдам. Интервал целиком выше нуля — модель хуже, целиком
+    # внутри ±margin (относительно оценки лучшей) — практически равна
+    # лучшей; иначе данных для решения мало и модель идёт дальше.
+    best = max(scores, key=lambda m: scores[m].mean())
+    tolerance = margin * max(abs(scores[best].mean()), 1e-12)
+    undecided, intervals = [], {}
+    for model_name, model_scores in scores.items():
+        if model_name == best:
+            continue
+        diff = scores[best] - model_scores
+        half_width = (
+            student_t.ppf(0.5 + confidence / 2, len(diff) - 1)
+            * diff.std(ddof=1) / math.sqrt(len(diff))
+        )
+        low, high = diff.mean() - half_width, diff.mean() + half_width
+        intervals[model_name] = [float(low), float(high)]
+        if low > 0 or high < tolerance:
+            continue
+        undecided.append(model_name)
+    return best, undecided, intervals
+
+
+def subsample_screening(models, X_train, y_train, task_type, confidence=0.95,
+                        margin=0.01, eta=4, n_jobs=1, fold_cache=None, data_key=None,
+                        folds=None, model_aware=False, categorical_features=None,
+                        deadline=None, oof=None):
+    # Все кандидаты — 5-fold CV на стратифицированной подвыборке; на большую
+    # (в eta раз) выборку вместе с лучшей переходят только модели, про
+    # которые по текущей выборке нельзя решить, хуже ли они
+    n_rows = X_train.shape[0]
+    n_samples = screening_sample_size(n_rows, confidence, margin)
+    candidates = list(models)
+    report = {}
+    rounds = []
+    stopped_by = None
+
+    while True:
+        full_data = n_samples >= n_rows
+        X_round, y_round = subsample(X_train, y_train, n_samples, task_type)
+        round_key = sample_key(data_key, n_samples, n_rows)
+        round_folds = RoundFolds(
+            X_round, y_round, task_type, 5, model_aware, categorical_features,
+            folds=folds if full_data else None,
+        )
+        round_scores = {}
+        for model_name in candidates:
+            if round_scores and deadline_passed(deadline):
+                print(f"Time budget exhausted, skipping {model_name}")
+                stopped_by = "time_budget"
+                continue
+            print(f"Evaluating {model_name} on {n_samples} rows...")
+            start = time.time()
+            collect = oof is not None and full_data
+            scores = evaluate_model(
+                models[model_name], X_round, y_round, task_type, 5, n_jobs,
+                fold_cache=fold_cache, data_key=round_key, folds=round_folds,
+                model_aware=model_aware, categorical_features=categorical_features,
+                return_oof=collect,
+            )
+            if collect:
+                scores, oof[model_name] = scores
+            round_scores[model_name] = scores
+            print(f"{model_name} CV Score: {scores.mean()}")
+            report[model_name] = {
+                "cv_scores": scores.tolist(),
+                "mean_cv_score": scores.mean(),
+                "budget": n_samples,
+                "n_splits": 5,
+                "round": len(rounds),
+                "seconds": time.time() - start,
+            }
+
+        round_folds.close()
+
+        best, undecided, intervals = compare_candidates(round_scores, confidence, margin)
+        rounds.append({
+            "budget": n_samples,
+            "n_splits": 5,
+            "scores": {m: v.mean() for m, v in round_scores.items()},
+            "intervals": intervals,
+            "survivors": [best] + undecided,
+        })
+        if not undecided or full_data:
+            break
+        if deadline_passed(deadline):
+            print("Time budget exhausted, stopping model selection")
+            stopped_by = "time_budget"
+            break
+        print(f"Undecided against {best}: {undecided}, escalating")
+        candidates = [best] + undecided
+        n_samples = min(n_rows, n_samples * eta)
+
+    selection = {
+        "strategy": "subsample",
+        "confidence": confidence,
+        "margin": margin,
+        "eta": eta,
+        "stopped_by": stopped_by,
+        "rounds": rounds,
+    }
+    return best, report, selection
+
+
+def select_model(models, X_train, y_train, task_type, strategy="successive_halving",
+                 eta=2, min_resources=1000, n_jobs=1, fold_cache=None, data_key=None,
+                 folds=None, model_aware=False, categorical_features=None,
+                 deadline=None, confidence=0.95, margin=0.01, oof=None):
+    # oof: словарь, в который складываются out-of-fold предсказания моделей,
+    # прошедших полную CV на всех данных (для ансамбля)
+    start = time.time()
+    if strategy == "exhaustive":
+        result = exhaustive_selection(
+            models, X_train, y_train, task_type, n_jobs, fold_cache, data_key, folds,
+            model_aware, categorical_features, deadline, oof,
+        )
+    elif strategy == "successive_halving":
+        result = successive_halving(
+            models, X_train, y_train, task_type, eta, min_resources, n_jobs,
+            fold_cache, data_key, folds, model_aware, categorical_features, deadline,
+            oof,
+        )
+    elif strategy == "subsample":
+        # Выборка растёт сразу в eta² раз: каждый раунд — полная 5-fold CV
+        result = subsample_screening(
+            models, X_train, y_train, task_type, confidence, margin, eta ** 2, n_jobs,
+            fold_cache, data_key, folds, model_aware, categorical_features, deadline,
+            oof,
+        )
+    else:
+        raise ValueError(f"Стратегия отбора {strategy} не поддерживается.")
+    best_model_name, report, selection = result
+    selection["ranking"] = ranking(selection)
+    selection["seconds"] = time.time() - start
+    return best_model_name, report, selection
@@ -0,0 +1,207 @@
+# tracking.py
+
+import os
+import time
+import atexit
+import queue
+import shutil
+import tempfile
+import threading
+import urllib.request
+from mlflow.entities import Metric, Param
+from mlflow.tracking.default_experiment import DEFAULT_EXPERIMENT_ID
+from mlflow.tracking import MlflowClient
+
+TRACKING_URI = os.getenv("MLFLOW_TRACKING_URI", "http://mlflow:5000")
+# Если сервер недоступен, запуск пишется в локальный file store
+FALLBACK_URI = os.getenv("MLFLOW_FALLBACK_URI", "file:./mlruns")
+# Клиент MLflow сам ретраит с растущей паузой и на недоступном хосте
+# висит минутами, поэтому сервер проверяется одним коротким запросом
+PROBE_TIMEOUT = 2.0
+# Тег запуска в локальном store, если выгрузка на сервер не удалась
+ORIGIN_RUN_TAG = "automl.origin_run_id"
+
+
+def server_reachable(uri, timeout=PROBE_TIMEOUT):
+    if not uri.startswith(("http://", "https://")):
+        return True
+    try:
+        with urllib.request.urlopen(uri.rstrip("/") + "/health", timeout=timeout) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+def write_artifacts(directory, artifacts):
+    # Значение — bytes, str или функция, которая их возвращает (например,
+    # отрисовка графика), чтобы тяжёлая часть тоже шла в фоне
+    for name, content in artifacts.items():
+        if callable(content):
+            content = content()
+        mode = "wb" if isinstance(content, bytes) else "w"
+        with open(os.path.join(directory, name), mode) as f:
+            f.write(content)
+
+
+class RunLogger:
+    # Синхронно только проверка сервера и create_run (нужен run_id для
+    # отчёта). Метрики и параметры уходят одним log_batch, артефакты
+    # и модель — через log_artifacts, всё в фоновом потоке.
+
+    def __init__(self, tracking_uri=TRACKING_URI, fallback_uri=FALLBACK_URI):
+        self.tracking_uri = tracking_uri
+        self.fallback_uri = fallback_uri
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.fallbacks = 0
+        self.uploaded = 0
+        self.failed = 0
+
+    def _client(self):
+        if server_reachable(self.tracking_uri):
+            try:
+                return MlflowClient(tracking_uri=self.tracking_uri), self.tracking_uri
+            except Exception as e:
+                print(f"MLflow at {self.tracking_uri} failed: {e}")
+        print(f"MLflow at {self.tracking_uri} is unreachable, logging to {self.fallback_uri}")
+        self.fallbacks += 1
+        return MlflowClient(tracking_uri=self.fallback_uri), self.fallback_uri
+
+    def _create_run(self, run_name, tags):
+        client, uri = self._client()
+        try:
+            run = client.create_run(
+                DEFAULT_EXPERIMENT_ID, tags=tags, run_name=run_name
+            )
+        except Exception as e:
+            if uri == self.fallback_uri:
+                raise
+            # Сервер ответил на проверку, но запуск не создал
+            print(f"MLflow at {uri} failed: {e}, logging to {self.fallback_uri}")
+            self.fallbacks += 1
+            client, uri = MlflowClient(tracking_uri=self.fallback_uri), self.fallback_uri
+            run = client.create_run(
+                DEFAULT_EXPERIMENT_ID, tags=tags, run_name=run_name
+            )
+        return client, uri, run
+
+    def log_run(self, metrics, params, tags=None, artifacts=None, model_path=None,
+                run_name=None):
+        tags = tags or {}
+        client, uri, run = self._create_run(run_name, tags)
+        run_id = run.info.run_id
+        metrics = {name: float(value) for name, value in metrics.items()}
+        params = {name: str(value) for name, value in params.items()}
+        # Модель не сериализуется второй раз: выгружается каталог, который
+        # пайплайн уже сохранил
+        self._submit(client, uri, run_id, run_name, tags, metrics, params,
+                     artifacts or {}, model_path)
+        self.runs += 1
+        # Отчёт собирается из того, что и так известно, без get_run
+        return {
+            "run_id": run_id,
+            "tracking_uri": uri,
+            "metrics": metrics,
+            "params": params,
+            "tags": dict(run.data.tags),
+        }
+
+    def _submit(self, *task):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, daemon=True)
+                self._thread.start()
+        self._queue.put(task)
+
+    def _worker(self):
+        while True:
+            client, uri, run_id, run_name, tags, metrics, params, artifacts, model_path = (
+                self._queue.get()
+            )
+            try:
+                self._upload(client, run_id, metrics, params, artifacts, model_path)
+                self.uploaded += 1
+            except Exception as e:
+                print(f"MLflow upload for run {run_id} failed: {e}")
+                if uri == self.fallback_uri:
+                    self.failed += 1
+                else:
+                    self._upload_fallback(run_id, run_name, tags, metrics, params,
+                                          artifacts, model_path)
+            finally:
+                self._queue.task_done()
+
+    def _upload_fallback(self, run_id, run_name, tags, metrics, params, artifacts,
+                         model_path):
+        # Запуск на сервере уже помечен FAILED; метрики и модель
+        # не теряются — тот же запуск целиком пишется в локальный store
+        self.fallbacks += 1
+        try:
+            client = MlflowClient(tracking_uri=self.fallback_uri)
+            run = client.create_run(
+                DEFAULT_EXPERIMENT_ID, tags={**tags, ORIGIN_RUN_TAG: run_id}, run_name=run_name
+            )
+            self._upload(client, run.info.run_id, metrics, params, artifacts, model_path)
+            self.uploaded += 1
+            print(f"MLflow run {run_id} logged to {self.fallback_uri} as {run.info.run_id}")
+        except Exception as e:
+            self.failed += 1
+            print(f"MLflow upload for run {run_id} to {self.fallback_uri} failed: {e}")
+
+    def _upload(self, client, run_id, metrics, params, artifacts, model_path):
+        # Запуск завершается в любом случае: при ошибке он FAILED, а не
+        # висит на сервере в RUNNING
+        status = "FAILED"
+        try:
+            timestamp = int(time.time() * 1000)
+            client.log_batch(
+                run_id,
+                metrics=[Metric(name, value, timestamp, 0) for name, value in metrics.items()],
+                params=[Param(name, value) for name, value in params.items()],
+            )
+            if artifacts:
+                # Не TemporaryDirectory: её финализатор при выходе из процесса
+                # может удалить каталог раньше, чем atexit дождётся выгрузки
+                directory = tempfile.mkdtemp(prefix="mlflow_artifacts_")
+                try:
+                    write_artifacts(directory, artifacts)
+                    client.log_artifacts(run_id, directory)
+                finally:
+                    shutil.rmtree(directory, ignore_errors=True)
+            if model_path is not None:
+                # Каталог версии, уже записанный пайплайном, — без повторной
+                # сериализации
+                client.log_artifacts(run_id, model_path, "model")
+            status = "FINISHED"
+        finally:
+            try:
+                client.set_terminated(run_id, status)
+            except Exception as e:
+                print(f"MLflow run {run_id} could not be marked {status}: {e}")
+
+    def flush(self, timeout=None):
+        # Ждёт, пока фоновый поток выгрузит всё поставленное в очередь
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def stats(self):
+        return {
+            "runs": self.runs,
+            "fallbacks": self.fallbacks,
+            "uploaded": self.uploaded,
+            "failed": self.failed,
+            "pending": self._queue.unfinished_tasks,
+        }
+
+
+run_logger = RunLogger()
+# Процесс задачи не завершается, пока очередь не выгружена
+atexit.register(run_logger.flush)
@@ -0,0 +1,463 @@
+# tuning.py
+
+import os
+import time
+import multiprocessing
+import numpy as np
+import optuna
+from optuna.study import MaxTrialsCallback
+from sklearn.base import clone
+from sklearn.metrics import get_scorer
+from xgboost import XGBModel
+from xgboost.callback import TrainingCallback
+from lightgbm import LGBMModel
+from threadpoolctl import threadpool_limits
+from .utils import get_cv, take_rows
+from .resources import available_cores, set_estimator_threads
+from .fold_cache import fold_keys, cv_spec
+from .folds import FoldSet
+from .search_space import search_space, suggest_params, scaled_trials, contains, describe
+
+try:
+    from optuna.storages.journal import JournalFileBackend, JournalStorage
+except ImportError:  # optuna < 4.0
+    from optuna.storages import JournalFileStorage as JournalFileBackend
+    from optuna.storages import JournalStorage
+
+# Шаги промежуточных отчётов бустинга: fold * ROUND_STRIDE + номер итерации,
+# чтобы итерации разных фолдов не пересекались.
+ROUND_STRIDE = 10000
+# Бустинг останавливается, если метрика на отложенной части фолда не
+# улучшалась столько итераций подряд
+EARLY_STOPPING_ROUNDS = 20
+
+
+def pruner_for(pruner, boosting=False):
+    # Hyperband считает номер шага ресурсом, а у бустинга шаги идут с
+    # разрывами (fold * ROUND_STRIDE + итерация): max_resource="auto"
+    # получается ~40000, и ступени попадают туда, где никто не отчитывается.
+    # Для бустинга вместо него — MedianPruner.
+    if pruner == "hyperband" and boosting:
+        return "median"
+    return pruner
+
+
+def create_pruner(pruner="median", boosting=False, n_warm=0):
+    pruner = pruner_for(pruner, boosting)
+    if pruner == "median":
+        # Бустинг отчитывается каждой итерацией — первые итерации шумные,
+        # остальные модели отчитываются по фолдам (всего 5 шагов).
+        n_warmup_steps = 10 if boosting else 1
+        # Триалы warm start завершены, но промежуточных значений у них нет:
+        # в n_startup_trials считаются только реально отчитавшиеся триалы
+        return optuna.pruners.MedianPruner(
+            n_startup_trials=5 + n_warm, n_warmup_steps=n_warmup_steps
+        )
+    if pruner == "hyperband":
+        return optuna.pruners.HyperbandPruner(
+            min_resource=1, max_resource="auto", reduction_factor=3
+        )
+    if pruner in (None, "none"):
+        return optuna.pruners.NopPruner()
+    raise ValueError(f"Pruner {pruner} не поддерживается.")
+
+
+def report_or_prune(trial, value, step):
+    trial.report(value, step)
+    if trial.should_prune():
+        raise optuna.TrialPruned()
+
+
+class XGBoostPruningCallback(TrainingCallback):
+    def __init__(self, trial, step_offset=0):
+        super().__init__()
+        self.trial = trial
+        self.step_offset = step_offset
+
+    def after_iteration(self, model, epoch, evals_log):
+        metrics = next(iter(evals_log.values()), None)
+        if metrics:
+            value = list(metrics.values())[-1][-1]
+            if isinstance(value, tuple):
+                value = value[0]
+            report_or_prune(self.trial, float(value), self.step_offset + epoch)
+        return False
+
+
+def lightgbm_pruning_callback(trial, step_offset=0):
+    def _callback(env):
+        if not env.evaluation_result_list:
+            return
+        _, _, value, is_higher_better = env.evaluation_result_list[0][:4]
+        if is_higher_better:
+            value = -value
+        report_or_prune(trial, float(value), step_offset + env.iteration)
+
+    return _callback
+
+
+def is_boosting_model(model):
+    return isinstance(model, (XGBModel, LGBMModel))
+
+
+def early_stopping_params(model):
+    if isinstance(model, XGBModel):
+        return {"early_stopping_rounds": EARLY_STOPPING_ROUNDS, "tree_method": "hist"}
+    if isinstance(model, LGBMModel):
+        return {"early_stopping_round": EARLY_STOPPING_ROUNDS, "verbose": -1}
+    return {}
+
+
+def fitted_iterations(model):
+    # Число деревьев до лучшей итерации (у XGBoost best_iteration — индекс)
+    if isinstance(model, XGBModel):
+        return int(model.best_iteration) + 1
+    return int(model.best_iteration_) or model.n_estimators
+
+
+def early_stopping_split(X, y, task_type):
+    # Отложенная часть берётся из обучающей части фолда: валидационная
+    # часть фолда остаётся только для оценки
+    cv, _ = get_cv(task_type, n_splits=1)
+    fit_idx, stop_idx = next(cv.split(X, y))
+    return (
+        take_rows(X, fit_idx), take_rows(y, fit_idx),
+        take_rows(X, stop_idx), take_rows(y, stop_idx),
+    )
+
+
+def fit_fold(model, X_tr, y_tr, X_val, y_val, trial, fold_idx, task_type):
+    # Данные фолда уже отмасштабированы (FoldSet) — учим саму модель
+    if not is_boosting_model(model):
+        return model.fit(X_tr, y_tr)
+
+    # Бустингу нужен eval_set для ранней остановки и pruning-колбэка
+    X_fit, y_fit, X_stop, y_stop = early_stopping_split(X_tr, y_tr, task_type)
+    step_offset = fold_idx * ROUND_STRIDE
+    model.set_params(**early_stopping_params(model))
+    if isinstance(model, XGBModel):
+        model.set_params(callbacks=[XGBoostPruningCallback(trial, step_offset)])
+        model.fit(X_fit, y_fit, eval_set=[(X_stop, y_stop)], verbose=False)
+        model.set_params(callbacks=None)
+    else:
+        model.fit(
+            X_fit,
+            y_fit,
+            eval_set=[(X_stop, y_stop)],
+            callbacks=[lightgbm_pruning_callback(trial, step_offset)],
+        )
+    return model
+
+
+def study_cache_key(data_key, model_name, task_type, kind, model):
+    cv, scoring = get_cv(task_type)
+    key = f"{data_key}:{kind}|{cv_spec(cv, scoring)}|{model_name}"
+    # Триалы бустинга без ранней остановки оценены иначе — не смешиваем
+    if is_boosting_model(model):
+        key += f"|early_stopping={EARLY_STOPPING_ROUNDS}"
+    return key
+
+
+def objective(trial, model_name, base_model, X_train, y_train, task_type, n_jobs=1,
+              fold_cache=None, data_key=None, folds=None, distributions=None):
+    if folds is None:
+        folds = FoldSet(X_train, y_train, task_type)
+        try:
+            return objective(
+                trial, model_name, base_model, X_train, y_train, task_type, n_jobs,
+                fold_cache, data_key, folds, distributions,
+            )
+        finally:
+            folds.close()
+
+    if distributions is None:
+        distributions = search_space(model_name)
+    params = suggest_params(trial, distributions)
+    # Фолды идут последовательно — потоки отдаём самой модели.
+    model = set_estimator_threads(clone(base_model).set_params(**params), n_jobs)
+
+    cv, scoring = get_cv(task_type)
+    scorer = get_scorer(scoring)
+    boosting = is_boosting_model(model)
+
+    kind = folds.kind_for(model)
+    # Ранняя остановка входит в ключ кэша: оценки без неё не переиспользуются
+    cache_model = clone(model).set_params(**early_stopping_params(model))
+    keys, cached, cached_iterations = None, {}, {}
+    if fold_cache is not None and data_key is not None:
+        keys = fold_keys(f"{data_key}:{kind}", cv, scoring, cache_model, cv.get_n_splits())
+        cached = fold_cache.get_many(keys)
+        if boosting:
+            cached_iterations = fold_cache.get_iterations(list(cached))
+    trial.set_user_attr("cached_folds", len(cached))
+
+    scores, iterations = [], []
+    for fold_idx, fold in enumerate(folds.folds(kind)):
+        if keys is not None and keys[fold_idx] in cached:
+            scores.append(cached[keys[fold_idx]])
+            if keys[fold_idx] in cached_iterations:
+                iterations.append(cached_iterations[keys[fold_idx]])
+        else:
+            fitted = fit_fold(
+                clone(model), fold["X_train"], fold["y_train"],
+                fold["X_val"], fold["y_val"], trial, fold_idx, task_type,
+            )
+            scores.append(scorer(fitted, fold["X_val"], fold["y_val"]))
+            if boosting:
+                iterations.append(fitted_iterations(fitted))
+            if keys is not None:
+                fold_cache.put_many(
+                    {keys[fold_idx]: scores[-1]},
+                    iterations={keys[fold_idx]: iterations[-1]} if boosting else None,
+                )
+
+        # Бустинг уже отчитывается по итерациям, остальные модели — по фолдам.
+        # Оба скоринга "больше — лучше", а study минимизирует.
+        if not boosting:
+            report_or_prune(trial, -float(np.mean(scores)), fold_idx)
+
+    value = -float(np.mean(scores))
+    if iterations:
+        # Среднее по фолдам — число деревьев для финального обучения
+        trial.set_user_attr("best_iteration", int(round(np.mean(iterations))))
+    if fold_cache is not None and data_key is not None:
+        fold_cache.add_trial(
+            study_cache_key(data_key, model_name, task_type, kind, model),
+            trial.params,
+            {
+                name: optuna.distributions.distribution_to_json(dist)
+                for name, dist in trial.distributions.items()
+            },
+            value,
+            best_iteration=trial.user_attrs.get("best_iteration"),
+        )
+    return value
+
+
+def warm_start_study(study, fold_cache, study_key, limit=100, space=None):
+    # Завершённые триалы прошлых запусков на тех же данных добавляются
+    # в study как готовые — сэмплер сразу знает удачные области
+    trials = []
+    for params, distributions, value, iteration in fold_cache.load_trials(study_key, limit):
+        distributions = {
+            name: optuna.distributions.json_to_distribution(dist)
+            for name, dist in distributions.items()
+        }
+        if space is not None:
+            # Пространство поиска зависит от размера данных: триалы вне
+            # текущих диапазонов не переносим
+            if not contains(space, params):
+                continue
+            distributions = space
+        try:
+            trials.append(optuna.trial.create_trial(
+                params=params,
+                distributions=distributions,
+                value=value,
+                user_attrs=(
+                    {"warm_start": True, "best_iteration": iteration}
+                    if iteration is not None else {"warm_start": True}
+                ),
+            ))
+        except ValueError:
+            # Параметры вне текущего пространства поиска — пропускаем
+            continue
+    study.add_trials(trials)
+    return len(trials)
+
+
+def create_storage(storage, storage_dir, study_name):
+    if storage in (None, "memory"):
+        return None
+    os.makedirs(storage_dir, exist_ok=True)
+    if storage == "journal":
+        path = os.path.join(storage_dir, f"{study_name}.log")
+        return JournalStorage(JournalFileBackend(path))
+    if storage == "sqlite":
+        path = os.path.abspath(os.path.join(storage_dir, f"{study_name}.db"))
+        return f"sqlite:///{path}"
+    raise ValueError(f"Хранилище {storage} не поддерживается.")
+
+
+def split_cores(n_workers, n_cores=None):
+    n_cores = n_cores or available_cores()
+    n_workers = max(1, min(n_workers, n_cores))
+    return n_workers, max(1, n_cores // n_workers)
+
+
+def run_trials(study, model_name, base_model, X_train, y_train, task_type,
+               n_trials, timeout, n_jobs, fold_cache=None, data_key=None,
+               folds=None, distributions=None):
+    # Бюджет общий на все воркеры: считаем триалы во всех состояниях,
+    # включая запущенные соседями.
+    study.optimize(
+        lambda trial: objective(
+            trial, model_name, base_model, X_train, y_train, task_type, n_jobs,
+            fold_cache, data_key, folds, distributions,
+        ),
+        timeout=timeout,
+        callbacks=[MaxTrialsCallback(n_trials, states=None)],
+    )
+
+
+def _run_trials_worker(study_name, storage_kind, storage_dir, pruner, n_warm, model_name,
+                       base_model, X_train, y_train, task_type, n_trials, timeout,
+                       n_jobs, fold_cache=None, data_key=None, folds=None,
+                       distributions=None):
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    study = optuna.load_study(
+        study_name=study_name,
+        storage=create_storage(storage_kind, storage_dir, study_name),
+        pruner=create_pruner(pruner, boosting=is_boosting_model(base_model), n_warm=n_warm),
+    )
+    with threadpool_limits(limits=n_jobs):
+        run_trials(
+            study, model_name, base_model, X_train, y_train, task_type,
+            n_trials, timeout, n_jobs, fold_cache, data_key, folds, distributions,
+        )
+
+
+def _run_study(study, study_name, storage, storage_dir, pruner, n_warm, n_workers, args):
+    if n_workers == 1:
+        run_trials(study, *args)
+        return
+    # spawn, а не fork: OpenMP-пулы XGBoost/LightGBM не переживают fork.
+    ctx = multiprocessing.get_context("spawn")
+    workers = [
+        ctx.Process(
+            target=_run_trials_worker,
+            args=(study_name, storage, storage_dir, pruner, n_warm) + args,
+            # daemon: при отмене задачи воркеры завершаются вместе с ней
+            daemon=True,
+        )
+        for _ in range(n_workers)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    failed = [w.exitcode for w in workers if w.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"Воркеры Optuna завершились с ошибкой: {failed}")
+
+
+def tune_hyperparameters(model_name, base_model, X_train, y_train, task_type,
+                         n_trials=50, pruner="median", n_workers=1, timeout=None,
+                         n_cores=None, storage="journal", storage_dir="studies",
+                         study_name=None, fold_cache=None, data_key=None,
+                         warm_start=True, folds=None, shape=None):
+    # shape=(n_rows, n_features) масштабирует диапазоны и число триалов,
+    # None — фиксированное пространство и ровно n_trials
+    distributions = search_space(model_name, shape)
+    n_requested = n_trials
+    if shape is not None:
+        n_trials = scaled_trials(n_trials, distributions, shape)
+    n_workers, n_jobs = split_cores(n_workers, n_cores)
+    if n_workers == 1:
+        storage = "memory"
+    study_name = study_name or f"{model_name}_{int(time.time())}"
+
+    study = optuna.create_study(
+        study_name=study_name,
+        storage=create_storage(storage, storage_dir, study_name),
+        direction="minimize",
+        pruner=create_pruner(pruner, boosting=is_boosting_model(base_model)),
+        load_if_exists=True,
+    )
+
+    own_folds = folds is None
+    if own_folds:
+        folds = FoldSet(X_train, y_train, task_type)
+    # Нужный модели вариант фолдов готовится до запуска воркеров
+    kind = folds.kind_for(base_model)
+    folds.prepare(kind)
+
+    n_warm = 0
+    if warm_start and fold_cache is not None and data_key is not None:
+        n_warm = warm_start_study(
+            study, fold_cache,
+            study_cache_key(data_key, model_name, task_type, kind, base_model),
+            space=distributions,
+        )
+        print(f"Warm start: {n_warm} trials from previous runs")
+        study.pruner = create_pruner(
+            pruner, boosting=is_boosting_model(base_model), n_warm=n_warm
+        )
+
+    # Добавленные триалы не расходуют бюджет новых. Сами данные воркерам
+    # не нужны — фолды открываются с диска.
+    args = (model_name, base_model, None, None, task_type,
+            n_trials + n_warm, timeout, n_jobs, fold_cache, data_key, folds,
+            distributions)
+    start = time.time()
+    try:
+        _run_study(study, study_name, storage, storage_dir, pruner, n_warm, n_workers, args)
+    finally:
+        if own_folds:
+            folds.close()
+    if n_workers > 1:
+        study = optuna.load_study(
+            study_name=study_name,
+            storage=create_storage(storage, storage_dir, study_name),
+        )
+    wall_clock = time.time() - start
+
+    summary = tuning_summary(study, pruner_for(pruner, is_boosting_model(base_model)), wall_clock)
+    summary.update({
+        "n_workers": n_workers,
+        "threads_per_trial": n_jobs,
+        "storage": storage,
+        "study_name": study_name,
+        "trial_budget": n_trials,
+        "trials_requested": n_requested,
+        "search_space": describe(distributions),
+        "timeout": timeout,
+        "stopped_by": "timeout" if summary["n_trials"] < n_trials + n_warm else "trial_budget",
+        "n_warm_start": n_warm,
+        "best_iteration": best_iteration(study),
+        "cached_folds": sum(
+            t.user_attrs.get("cached_folds", 0) for t in study.get_trials(deepcopy=False)
+        ),
+    })
+    return study, summary
+
+
+def best_iteration(study):
+    # None — модель без ранней остановки (или триал warm start из кэша,
+    # записанного до того, как в нём появилось число итераций)
+    complete = study.get_trials(
+        deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,)
+    )
+    if not complete:
+        return None
+    return study.best_trial.user_attrs.get("best_iteration")
+
+
+def tuning_summary(study, pruner, wall_clock):
+    complete = study.get_trials(
+        deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,)
+    )
+    pruned = study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.PRUNED,))
+    # Триалы warm start не обучались в этом запуске (длительность нулевая)
+    fresh = [t for t in complete if not t.user_attrs.get("warm_start")]
+
+    # Экономия — сколько ещё стоили бы обрезанные триалы при средней
+    # длительности завершённого триала.
+    complete_durations = [t.duration.total_seconds() for t in fresh if t.duration]
+    mean_complete = float(np.mean(complete_durations)) if complete_durations else 0.0
+    saved = sum(
+        max(mean_complete - t.duration.total_seconds(), 0.0)
+        for t in pruned
+        if t.duration
+    ) if pruned else 0.0
+
+    return {
+        "pruner": pruner,
+        "n_trials": len(study.trials),
+        "n_complete": len(fresh),
+        "n_pruned": len(pruned),
+        "best_value": study.best_value if complete else None,
+        "wall_clock_seconds": wall_clock,
+        "mean_complete_trial_seconds": mean_complete,
+        "estimated_seconds_saved": saved,
+    }
@@ -1,14 +1,34 @@
 import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder
+from sklearn.model_selection import (
+    train_test_split,
+    StratifiedKFold,
+    KFold,
+    StratifiedShuffleSplit,
+    ShuffleSplit,
+)
+from sklearn.pipeline import Pipeline
 from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
 from sklearn.linear_model import LogisticRegression, LinearRegression
 from xgboost import XGBClassifier, XGBRegressor
 from lightgbm import LGBMClassifier, LGBMRegressor
+from .preprocessing import (
+    FeatureEncoder, CategoricalCaster, Float32Scaler, encode_target, NULL_VALUES,
+)
+
+TREE_MODELS = (
+    RandomForestClassifier, RandomForestRegressor,
+    XGBClassifier, XGBRegressor,
+    LGBMClassifier, LGBMRegressor,
+)
+NATIVE_CATEGORICAL_MODELS = (XGBClassifier, XGBRegressor, LGBMClassifier, LGBMRegressor)
 
 
 def load_data(file_path, column_names=None, sep=','):
-    data = pd.read_parquet(file_path) if 'parquet' in file_path else pd.read_csv(file_path, sep=sep) 
+    # Пропуски в CSV — те же NULL_VALUES, что и при конвертации в Parquet:
+    # колонка с "?" получается числовой при любом пути чтения
+    data = pd.read_parquet(file_path, memory_map=True) if 'parquet' in file_path else pd.read_csv(
+        file_path, sep=sep, na_values=NULL_VALUES, keep_default_na=False
+    )
     # data = pd.read_csv(file_path, sep=sep)
 
     if column_names is not None:
@@ -19,25 +39,26 @@ def load_data(file_path, column_names=None, sep=','):
     return data
 
 
-def preprocess_data(data, target_column):
+def split_data(X, y):
+    return train_test_split(X, y, test_size=0.2, random_state=42)
+
+
+def preprocess_data(data, target_column, return_encoders=False):
     print(data)
     X = data.drop(target_column, axis=1)
     y = data[target_column]
 
-    for col in X.select_dtypes(include=['object']).columns:
-        le = LabelEncoder()
-        X[col] = le.fit_transform(X[col].astype(str))
+    # Кодировщики обучаются один раз и сохраняются вместе с моделью
+    encoder = FeatureEncoder().fit(X)
+    X = encoder.transform(X)
+    y, target_classes = encode_target(y)
 
-    if y.dtype == 'object':
-        le = LabelEncoder()
-        y = le.fit_transform(y.astype(str))
-        
     print(y)
 
-    X_train, X_val, y_train, y_val = train_test_split(
-        X, y, test_size=0.2, random_state=42
-    )
+    X_train, X_val, y_train, y_val = split_data(X, y)
 
+    if return_encoders:
+        return X_train, X_val, y_train, y_val, encoder, target_classes
     return X_train, X_val, y_train, y_val
 
 
@@ -46,14 +67,57 @@ def get_models(task_type='classification'):
         models = {
             'Random Forest': RandomForestClassifier(random_state=42),
             'Logistic Regression': LogisticRegression(max_iter=1000, random_state=42),
-            'XGBoost': XGBClassifier(use_label_encoder=False, eval_metric='logloss', random_state=42),
+            'XGBoost': XGBClassifier(use_label_encoder=False, tree_method='hist', enable_categorical=True, random_state=42),
             'LightGBM': LGBMClassifier(random_state=42)
         }
     else:
         models = {
             'Random Forest': RandomForestRegressor(random_state=42),
             'Linear Regression': LinearRegression(),
-            'XGBoost': XGBRegressor(random_state=42),
+            'XGBoost': XGBRegressor(tree_method='hist', enable_categorical=True, random_state=42),
             'LightGBM': LGBMRegressor(random_state=42)
         }
     return models
+
+
+def take_rows(data, idx):
+    return data.iloc[idx] if hasattr(data, 'iloc') else data[idx]
+
+
+def is_tree_model(model):
+    return isinstance(model, TREE_MODELS)
+
+
+def supports_native_categorical(model):
+    return isinstance(model, NATIVE_CATEGORICAL_MODELS)
+
+
+def create_pipeline(model, model_aware=False, categorical_features=None, sparse=False):
+    # model_aware: деревьям масштабирование не нужно, а LightGBM/XGBoost
+    # получают категориальные колонки как pandas category.
+    # sparse: признаки — CSR из SparseOneHotEncoder, центрировать нельзя
+    pipeline_steps = []
+    if not model_aware or not is_tree_model(model):
+        pipeline_steps.append(("scaler", Float32Scaler(with_mean=not sparse)))
+    elif categorical_features and supports_native_categorical(model):
+        pipeline_steps.append(("categorical", CategoricalCaster(categorical_features)))
+    pipeline_steps.append(("model", model))
+    pipeline = Pipeline(steps=pipeline_steps)
+    return pipeline
+
+
+def get_cv(task_type='classification', n_splits=5):
+    # n_splits=1 — одно разбиение train/holdout для быстрых предварительных оценок
+    if task_type == 'classification':
+        if n_splits == 1:
+            cv = StratifiedShuffleSplit(n_splits=1, test_size=0.2, random_state=42)
+        else:
+            cv = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
+        scoring = 'accuracy'
+    else:
+        if n_splits == 1:
+            cv = ShuffleSplit(n_splits=1, test_size=0.2, random_state=42)
+        else:
+            cv = KFold(n_splits=n_splits, shuffle=True, random_state=42)
+        scoring = 'neg_root_mean_squared_error'
+    return cv, scoring
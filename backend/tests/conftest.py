@@ -0,0 +1,11 @@
+# conftest.py
+
+import os
+import tempfile
+
+# src.database создаёт engine при импорте: тестам Postgres не нужен,
+# им хватает SQLite во временном каталоге
+os.environ.setdefault(
+    "DATABASE_URL",
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='automl_tests_'), 'automl.db')}",
+)
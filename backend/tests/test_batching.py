@@ -0,0 +1,78 @@
+# test_batching.py
+
+import asyncio
+import numpy as np
+from src.batching import MicroBatcher
+
+
+class RowSumModel:
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, X):
+        self.calls.append(len(X))
+        return X.sum(axis=1)
+
+
+def test_batch_results_go_back_to_their_callers():
+    model = RowSumModel()
+    batcher = MicroBatcher(max_wait=0.05, max_rows=1000)
+    requests = [
+        [[1.0, 2.0]],
+        [[10.0, 20.0], [30.0, 40.0], [50.0, 60.0]],
+        [[100.0, 200.0], [300.0, 400.0]],
+    ]
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit("m", model, rows) for rows in requests))
+
+    results = asyncio.run(run())
+
+    # Один вызов predict на все запросы, каждому — его строки по порядку
+    assert model.calls == [6]
+    for rows, result in zip(requests, results):
+        np.testing.assert_array_equal(result, np.asarray(rows).sum(axis=1))
+    assert batcher.stats()["batches"] == 1
+    assert batcher.stats()["rows"] == 6
+
+
+def test_batch_flushes_at_max_rows_and_splits_by_width():
+    model = RowSumModel()
+    batcher = MicroBatcher(max_wait=10, max_rows=4)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.submit("m", model, [[1.0, 1.0]] * 2),
+            batcher.submit("m", model, [[2.0, 2.0]] * 2),
+            # Другое число признаков — отдельный батч
+            batcher.submit("m", model, [[1.0, 1.0, 1.0]] * 4),
+        )
+
+    first, second, wide = asyncio.run(run())
+    # max_wait не дождались: оба батча ушли по max_rows
+    assert sorted(model.calls) == [4, 4]
+    assert list(first) == [2.0, 2.0]
+    assert list(second) == [4.0, 4.0]
+    assert list(wide) == [3.0] * 4
+
+
+def test_failing_request_does_not_fail_the_batch():
+    class StrictModel(RowSumModel):
+        def predict(self, X):
+            if np.isnan(X).any():
+                raise ValueError("NaN in input")
+            return super().predict(X)
+
+    model = StrictModel()
+    batcher = MicroBatcher(max_wait=0.05, max_rows=1000)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.submit("m", model, [[1.0, 2.0]]),
+            batcher.submit("m", model, [[np.nan, 2.0]]),
+            return_exceptions=True,
+        )
+
+    ok, failed = asyncio.run(run())
+    assert list(ok) == [3.0]
+    assert isinstance(failed, ValueError)
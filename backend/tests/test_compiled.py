@@ -0,0 +1,60 @@
+# test_compiled.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.compiled import compile_pipeline, PARITY_TOLERANCE
+from src.utils import get_models, create_pipeline
+
+TREE_MODELS = ("Random Forest", "XGBoost", "LightGBM")
+TASKS = ("binary", "multiclass", "regression")
+# Число уровней закодированных категорий (коды FeatureEncoder)
+CATEGORICAL_FEATURES = {"cat0": 4, "cat1": 12}
+
+
+def make_data(task, n_rows=600, seed=0):
+    # Числовые признаки с пропусками и две категории; в части для
+    # предсказания есть неизвестная категория (-1)
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({f"num{i}": rng.normal(size=n_rows) for i in range(4)})
+    for col, n_levels in CATEGORICAL_FEATURES.items():
+        X[col] = rng.integers(0, n_levels, n_rows)
+    signal = X["num0"] + X["num1"] * X["num2"] + (X["cat0"] % 2) - (X["cat1"] % 3) * 0.5
+    X.loc[rng.random(n_rows) < 0.1, "num0"] = np.nan
+    X.loc[rng.random(n_rows) < 0.1, "num3"] = np.nan
+    if task == "binary":
+        y = (signal > signal.median()).astype(int).to_numpy()
+    elif task == "multiclass":
+        y = np.digitize(signal, np.quantile(signal, [0.33, 0.66]))
+    else:
+        y = signal.to_numpy() + rng.normal(scale=0.1, size=n_rows)
+
+    X_test = X.sample(200, random_state=seed).reset_index(drop=True)
+    X_test.loc[:9, "cat1"] = -1
+    return X, y, X_test
+
+
+@pytest.mark.parametrize("model_aware", [False, True])
+@pytest.mark.parametrize("task", TASKS)
+@pytest.mark.parametrize("model_name", TREE_MODELS)
+def test_compiled_matches_pipeline(model_name, task, model_aware):
+    X, y, X_test = make_data(task)
+    task_type = "regression" if task == "regression" else "classification"
+    model = get_models(task_type)[model_name].set_params(n_estimators=30)
+    pipeline = create_pipeline(
+        model, model_aware=model_aware, categorical_features=CATEGORICAL_FEATURES,
+    ).fit(X, y)
+    compiled = compile_pipeline(pipeline)
+    if model_aware and model_name != "Random Forest":
+        # Категории уходят в модель нативно, а не кодами
+        assert "categorical" in pipeline.named_steps
+
+    if task_type == "classification":
+        expected = pipeline.predict_proba(X_test)
+        np.testing.assert_allclose(compiled.predict_proba(X_test), expected,
+                                   atol=PARITY_TOLERANCE, rtol=0)
+        np.testing.assert_array_equal(compiled.predict(X_test), pipeline.predict(X_test))
+    else:
+        expected = pipeline.predict(X_test)
+        np.testing.assert_allclose(compiled.predict(X_test), expected,
+                                   atol=PARITY_TOLERANCE * np.std(expected), rtol=0)
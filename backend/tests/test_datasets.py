@@ -0,0 +1,75 @@
+# test_datasets.py
+
+import io
+import os
+import time
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.models import Base
+from src.datasets import register_upload, list_dataset_page
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # Загрузки пишутся в data/ относительно рабочего каталога
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    import app
+    return TestClient(app.app)
+
+
+def upload(client, name, content):
+    response = client.post("/upload_data", files={"file": (name, io.BytesIO(content))})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_same_content_is_stored_once(client, tmp_path):
+    content = f"a,b\n1,2\n3,{time.time_ns()}\n".encode()
+    first = upload(client, "train.csv", content)
+    again = upload(client, "copy.csv", content)
+    other = upload(client, "train.csv", content + b"5,6\n")
+
+    assert not first["deduplicated"]
+    # Тот же хэш — тот же file_id, второй файл на диск не пишется
+    assert again["deduplicated"]
+    assert again["file_id"] == first["file_id"]
+    assert again["filename"] == "train.csv"
+    assert not other["deduplicated"]
+    assert other["content_hash"] != first["content_hash"]
+    uploads = [name for name in os.listdir(tmp_path / "data") if not name.startswith(".")]
+    assert len(uploads) == 2
+
+    info = client.get("/get_dataset_info", params={"file_id": first["file_id"]}).json()
+    assert info["content_hash"] == first["content_hash"]
+
+
+def test_list_datasets_pages_newest_first(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'datasets.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    for i in range(5):
+        path = tmp_path / f"{i}.csv"
+        path.write_text(f"a\n{i}\n")
+        register_upload(db, f"id{i}", f"{i}.csv", str(path), f"hash{i}")
+
+    total, rows = list_dataset_page(db, offset=1, limit=2)
+    assert total == 5
+    assert [d.file_id for d in rows] == ["id3", "id2"]
+    total, rows = list_dataset_page(db, offset=4, limit=2)
+    assert [d.file_id for d in rows] == ["id0"]
+    assert list_dataset_page(db, offset=5, limit=2) == (5, [])
+    db.close()
+    engine.dispose()
+
+
+def test_list_datasets_endpoint_validates_page(client):
+    response = client.get("/list_datasets", params={"offset": 0, "limit": 1})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["limit"] == 1
+    assert len(body["datasets"]) <= 1
+    assert client.get("/list_datasets", params={"limit": 0}).status_code == 422
+    assert client.get("/list_datasets", params={"offset": -1}).status_code == 422
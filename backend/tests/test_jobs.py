@@ -0,0 +1,107 @@
+# test_jobs.py
+
+import threading
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.models import Base, Report
+from src.jobs import (
+    QUEUED, RUNNING, CANCELLED,
+    enqueue_job, claim_next_job, cancel_job, requeue_stale_jobs,
+)
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'queue.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def test_claim_follows_priority_then_age(sessions):
+    db = sessions()
+    low = enqueue_job(db, "data/a.csv", {}, priority=0)
+    high = enqueue_job(db, "data/b.csv", {}, priority=10)
+    mid = enqueue_job(db, "data/c.csv", {}, priority=5)
+    newer_mid = enqueue_job(db, "data/d.csv", {}, priority=5)
+
+    claimed = [claim_next_job(db, "w1").id for _ in range(4)]
+    assert claimed == [high.id, mid.id, newer_mid.id, low.id]
+    assert claim_next_job(db, "w1") is None
+    db.close()
+
+
+def test_job_is_claimed_once_by_concurrent_workers(sessions):
+    db = sessions()
+    job_ids = {enqueue_job(db, f"data/{i}.csv", {}).id for i in range(8)}
+    db.close()
+
+    claims = []
+    lock = threading.Lock()
+
+    def worker(worker_id):
+        session = sessions()
+        try:
+            while True:
+                job = claim_next_job(session, worker_id)
+                if job is None:
+                    return
+                with lock:
+                    claims.append((job.id, worker_id))
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=worker, args=(f"w{i}",)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # Каждая задача захвачена ровно одним воркером
+    assert sorted(job_id for job_id, _ in claims) == sorted(job_ids)
+    db = sessions()
+    for job_id, worker_id in claims:
+        job = db.query(Report).filter(Report.id == job_id).first()
+        assert job.status == RUNNING
+        assert job.worker_id == worker_id
+    db.close()
+
+
+def test_cancel_queued_and_running_jobs(sessions):
+    db = sessions()
+    running = enqueue_job(db, "data/a.csv", {}, priority=1)
+    queued = enqueue_job(db, "data/b.csv", {})
+    assert claim_next_job(db, "w1").id == running.id
+
+    # Задача в очереди отменяется сразу, запущенная — только получает флаг
+    assert cancel_job(db, queued.task_id).status == CANCELLED
+    job = cancel_job(db, running.task_id)
+    assert job.status == RUNNING
+    assert job.cancel_requested
+    assert cancel_job(db, "missing") is None
+    assert claim_next_job(db, "w1") is None
+    db.close()
+
+
+def test_stale_running_jobs_are_requeued(sessions):
+    db = sessions()
+    stale = enqueue_job(db, "data/a.csv", {}, priority=1)
+    alive = enqueue_job(db, "data/b.csv", {})
+    claim_next_job(db, "dead")
+    claim_next_job(db, "alive")
+    db.query(Report).filter(Report.id == stale.id).update(
+        {Report.heartbeat_at: datetime.utcnow() - timedelta(seconds=600)}
+    )
+    db.commit()
+
+    assert requeue_stale_jobs(db, stale_after=60) == 1
+    db.expire_all()
+    assert db.query(Report).filter(Report.id == alive.id).first().status == RUNNING
+    job = db.query(Report).filter(Report.id == stale.id).first()
+    assert job.status == QUEUED
+    assert job.worker_id is None
+    # Возвращённую задачу снова может взять другой воркер
+    assert claim_next_job(db, "w2").id == stale.id
+    db.close()
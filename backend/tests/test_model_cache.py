@@ -0,0 +1,91 @@
+# test_model_cache.py
+
+import os
+import threading
+import time
+from src.model_cache import ModelCache
+from src.model_store import META_FILE
+
+
+def write_model_dir(path, size=100):
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, META_FILE), "wb") as f:
+        f.write(b"0" * size)
+    return str(path)
+
+
+def bump_version(path):
+    # Новая версия на диске — более позднее время изменения метафайла
+    marker = os.path.join(path, META_FILE)
+    mtime = os.stat(marker).st_mtime_ns + 10 ** 9
+    os.utime(marker, ns=(mtime, mtime))
+
+
+class CountingLoader:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, path):
+        time.sleep(self.delay)
+        self.calls.append(path)
+        return object()
+
+
+def test_changed_version_is_reloaded(tmp_path):
+    path = write_model_dir(tmp_path / "model")
+    loader = CountingLoader()
+    cache = ModelCache(loader=loader)
+
+    first = cache.get(path)
+    assert cache.get(path) is first
+    assert cache.get_cached(path) is first
+
+    bump_version(path)
+    # Устаревшая запись не отдаётся даже без загрузки
+    assert cache.get_cached(path) is None
+    second = cache.get(path)
+    assert second is not first
+    assert len(loader.calls) == 2
+
+    cache.invalidate(path)
+    assert cache.get_cached(path) is None
+    stats = cache.stats()
+    assert stats["invalidations"] == 2
+    assert stats["misses"] == 2
+    assert stats["entries"] == 0
+
+
+def test_least_recently_used_model_is_evicted(tmp_path):
+    a, b, c = (write_model_dir(tmp_path / name, size=100) for name in "abc")
+    loader = CountingLoader()
+    cache = ModelCache(max_bytes=250, loader=loader)
+
+    cache.get(a)
+    cache.get(b)
+    cache.get(a)
+    cache.get(c)
+
+    stats = cache.stats()
+    assert stats["models"] == [a, c]
+    assert stats["evictions"] == 1
+    assert stats["current_bytes"] == 200
+    cache.get(b)
+    assert loader.calls == [a, b, c, b]
+
+
+def test_concurrent_misses_load_once(tmp_path):
+    path = write_model_dir(tmp_path / "model")
+    loader = CountingLoader(delay=0.2)
+    cache = ModelCache(loader=loader)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(path))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(loader.calls) == 1
+    assert len({id(model) for model in results}) == 1
+    assert cache.stats()["misses"] == 1
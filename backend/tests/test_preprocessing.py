@@ -0,0 +1,44 @@
+# test_preprocessing.py
+
+import numpy as np
+import pandas as pd
+from src.preprocessing import FeatureEncoder
+
+
+def train_frame():
+    return pd.DataFrame({
+        "color": ["red", "green", "blue", "green"],
+        "size": [1.0, 2.0, 3.0, 4.0],
+        "shape": ["round", "square", "round", "round"],
+    })
+
+
+def test_codes_are_sorted_and_unseen_category_is_minus_one():
+    encoder = FeatureEncoder().fit(train_frame())
+    X = pd.DataFrame({
+        "color": ["blue", "green", "red", "purple"],
+        "size": [1.0, 2.0, 3.0, 4.0],
+        "shape": ["round", "square", "triangle", "round"],
+    })
+
+    encoded = encoder.transform(X)
+    # Коды как у LabelEncoder: blue=0, green=1, red=2
+    assert list(encoded["color"]) == [0, 1, 2, -1]
+    assert list(encoded["shape"]) == [0, 1, -1, 0]
+    assert list(encoded["size"]) == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_columns_are_matched_by_name_or_by_position():
+    encoder = FeatureEncoder().fit(train_frame())
+    expected = encoder.transform(train_frame())
+
+    # По имени: порядок колонок не важен, лишние отбрасываются
+    shuffled = train_frame()[["shape", "size", "color"]].assign(extra=1)
+    by_name = encoder.transform(shuffled)
+    pd.testing.assert_frame_equal(by_name, expected)
+    assert list(by_name.columns) == ["color", "size", "shape"]
+
+    # Без имён: строки в порядке колонок обучения, числа могут быть строками
+    rows = [["red", "1", "round"], ["green", 2, "square"], ["blue", 3.0, "round"], ["green", 4, "round"]]
+    by_position = encoder.transform(rows)
+    np.testing.assert_array_equal(by_position.to_numpy(dtype=float), expected.to_numpy(dtype=float))
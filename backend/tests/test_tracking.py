@@ -0,0 +1,68 @@
+# test_tracking.py
+
+import os
+import mlflow.sklearn
+from mlflow.tracking import MlflowClient
+from sklearn.linear_model import LogisticRegression
+from src.model_store import save_model
+from src.tracking import RunLogger, ORIGIN_RUN_TAG
+
+# Порт, на котором никто не слушает: проверка сервера сразу получает отказ
+UNREACHABLE_URI = "http://127.0.0.1:9"
+
+
+def fitted_model():
+    return LogisticRegression().fit([[0.0], [1.0], [2.0], [3.0]], [0, 0, 1, 1])
+
+
+def test_unreachable_server_logs_to_file_store(tmp_path):
+    fallback_uri = f"file:{tmp_path / 'mlruns'}"
+    model_path = str(tmp_path / "models" / "model")
+    save_model(fitted_model(), model_path, fmt="mlflow")
+
+    logger = RunLogger(tracking_uri=UNREACHABLE_URI, fallback_uri=fallback_uri)
+    result = logger.log_run(
+        {"accuracy": 0.9}, {"model": "LogisticRegression"},
+        artifacts={"report.json": "{}"}, model_path=model_path,
+    )
+    assert logger.flush(timeout=60)
+
+    assert result["tracking_uri"] == fallback_uri
+    assert logger.stats()["fallbacks"] == 1
+    assert logger.stats()["uploaded"] == 1
+    run = MlflowClient(tracking_uri=fallback_uri).get_run(result["run_id"])
+    assert run.info.status == "FINISHED"
+    assert run.data.metrics == {"accuracy": 0.9}
+    # Каталог версии уходит в run как есть — это уже MLflow-модель
+    model = mlflow.sklearn.load_model(os.path.join(run.info.artifact_uri, "model"))
+    assert list(model.predict([[0.0], [3.0]])) == [0, 1]
+
+
+def test_failed_upload_is_marked_and_relogged(tmp_path):
+    primary_uri = f"file:{tmp_path / 'server'}"
+    fallback_uri = f"file:{tmp_path / 'mlruns'}"
+    calls = []
+
+    def flaky_plot():
+        # Первая отрисовка падает посреди выгрузки, повторная проходит
+        calls.append(1)
+        if len(calls) == 1:
+            raise OSError("connection reset")
+        return "plot"
+
+    logger = RunLogger(tracking_uri=primary_uri, fallback_uri=fallback_uri)
+    result = logger.log_run({"rmse": 1.5}, {"model": "XGBoost"},
+                            tags={"dataset": "boston"}, artifacts={"plot.txt": flaky_plot})
+    assert logger.flush(timeout=60)
+
+    assert result["tracking_uri"] == primary_uri
+    assert MlflowClient(tracking_uri=primary_uri).get_run(result["run_id"]).info.status == "FAILED"
+
+    fallback = MlflowClient(tracking_uri=fallback_uri)
+    (run,) = fallback.search_runs(["0"])
+    assert run.info.status == "FINISHED"
+    assert run.data.metrics == {"rmse": 1.5}
+    assert run.data.tags[ORIGIN_RUN_TAG] == result["run_id"]
+    assert run.data.tags["dataset"] == "boston"
+    assert [f.path for f in fallback.list_artifacts(run.info.run_id)] == ["plot.txt"]
+    assert logger.stats()["failed"] == 0
@@ -0,0 +1,85 @@
+# test_tuning.py
+
+import optuna
+import pandas as pd
+from sklearn.datasets import make_classification
+from src.fold_cache import FoldCache, data_fingerprint
+from src.pipeline import refit_model
+from src.tuning import objective, best_iteration
+from src.utils import get_models
+
+optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+
+def make_data(n_rows=300):
+    X, y = make_classification(n_samples=n_rows, n_features=6, random_state=0)
+    return pd.DataFrame(X, columns=[f"f{i}" for i in range(X.shape[1])]), y
+
+
+def run_objective(study, model_name, X, y, fold_cache):
+    base_model = get_models("classification")[model_name]
+    study.optimize(
+        lambda trial: objective(
+            trial, model_name, base_model, X, y, "classification",
+            fold_cache=fold_cache, data_key=data_fingerprint(X, y),
+        ),
+        n_trials=1,
+    )
+    return study.trials[-1]
+
+
+def test_repeated_trial_reads_folds_from_cache(tmp_path):
+    X, y = make_data()
+    fold_cache = FoldCache(path=str(tmp_path / "folds.db"))
+    study = optuna.create_study(direction="minimize")
+    params = {"n_estimators": 50, "max_depth": 3, "max_features": "sqrt"}
+
+    study.enqueue_trial(params)
+    cold = run_objective(study, "Random Forest", X, y, fold_cache)
+    assert cold.user_attrs["cached_folds"] == 0
+    assert (fold_cache.hits, fold_cache.misses) == (0, 5)
+
+    # Те же параметры на тех же данных — все фолды из кэша
+    study.enqueue_trial(params)
+    warm = run_objective(study, "Random Forest", X, y, fold_cache)
+    assert warm.user_attrs["cached_folds"] == 5
+    assert warm.value == cold.value
+    assert (fold_cache.hits, fold_cache.misses) == (5, 5)
+
+    # Другие данные — другой ключ, снова промахи
+    X_other, y_other = make_data(n_rows=301)
+    study.enqueue_trial(params)
+    run_objective(study, "Random Forest", X_other, y_other, fold_cache)
+    assert (fold_cache.hits, fold_cache.misses) == (5, 10)
+    assert fold_cache.stats()["folds"] == 10
+
+
+def test_best_iteration_is_used_for_refit(tmp_path):
+    X, y = make_data()
+    fold_cache = FoldCache(path=str(tmp_path / "folds.db"))
+    study = optuna.create_study(direction="minimize")
+    params = {"n_estimators": 200, "learning_rate": 0.3, "max_depth": 3}
+
+    study.enqueue_trial(params)
+    trial = run_objective(study, "XGBoost", X, y, fold_cache)
+    iterations = trial.user_attrs["best_iteration"]
+    # Ранняя остановка срабатывает раньше верхней границы n_estimators
+    assert 0 < iterations < params["n_estimators"]
+    assert best_iteration(study) == iterations
+
+    base_model = get_models("classification")["XGBoost"]
+    model = refit_model(base_model, study.best_params, {"best_iteration": iterations}, n_jobs=1)
+    assert model.get_params()["n_estimators"] == iterations
+    assert model.get_params()["learning_rate"] == params["learning_rate"]
+    # Без ранней остановки (Random Forest) число деревьев — из best_params
+    forest = refit_model(
+        get_models("classification")["Random Forest"], {"n_estimators": 70},
+        {"best_iteration": None}, n_jobs=1,
+    )
+    assert forest.get_params()["n_estimators"] == 70
+
+    # Число деревьев сохраняется в кэше и доступно при повторе триала
+    study.enqueue_trial(params)
+    repeat = run_objective(study, "XGBoost", X, y, fold_cache)
+    assert repeat.user_attrs["cached_folds"] == 5
+    assert repeat.user_attrs["best_iteration"] == iterations
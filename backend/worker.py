@@ -0,0 +1,22 @@
+# worker.py
+
+import argparse
+from src.database import engine, sync_schema
+from src.models import Base
+from src.jobs import WorkerPool
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AutoML pipeline worker pool")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--stale-after", type=float, default=60.0)
+    parser.add_argument("--cores-per-job", type=int, default=None)
+    args = parser.parse_args()
+
+    sync_schema(Base, engine)
+    WorkerPool(
+        concurrency=args.concurrency,
+        poll_interval=args.poll_interval,
+        stale_after=args.stale_after,
+        cores_per_job=args.cores_per_job,
+    ).run_forever()
@@ -97,6 +97,10 @@ def pipelines_status_page():
     else:
         st.error("Failed to list pipelines.")
 
+def parse_predictions(resp):
+    # /apply_model отвечает потоком NDJSON: одна строка — одно предсказание
+    return [json.loads(line) for line in resp.iter_lines() if line]
+
 def apply_model_page():
     st.title("Apply Model")
 
@@ -128,13 +132,15 @@ def apply_model_page():
     mode = st.radio("Input Mode", ["Upload File", "Enter JSON"])
 
     if mode == "Upload File":
-        uploaded_file = st.file_uploader("Upload new data for prediction", type=["json"])
+        uploaded_file = st.file_uploader(
+            "Upload new data for prediction", type=["csv", "parquet", "json", "jsonl"]
+        )
         if uploaded_file and st.button("Get Predictions"):
-            files = {'file': (uploaded_file.name, uploaded_file, 'text/csv')}
+            files = {'file': (uploaded_file.name, uploaded_file, 'application/octet-stream')}
             data = {'report_id': report_id}
-            pred_resp = requests.post(f"{API_BASE}/apply_model", files=files, data=data)
+            pred_resp = requests.post(f"{API_BASE}/apply_model", files=files, data=data, stream=True)
             if pred_resp.status_code == 200:
-                preds = pred_resp.json()
+                preds = parse_predictions(pred_resp)
                 st.write("Predictions:")
                 st.json(preds)
             else:
@@ -147,9 +153,9 @@ def apply_model_page():
             except json.JSONDecodeError:
                 st.error("Invalid JSON")
                 return
-            pred_resp = requests.post(f"{API_BASE}/apply_model", json={"report_id": report_id, "data": json_data})
+            pred_resp = requests.post(f"{API_BASE}/apply_model", json={"report_id": report_id, "data": json_data}, stream=True)
             if pred_resp.status_code == 200:
-                preds = pred_resp.json()
+                preds = parse_predictions(pred_resp)
                 st.write("Predictions:")
                 st.json(preds)
             else: